@@ -0,0 +1,151 @@
+"""
+Collision-free access codes without a database round trip
+
+A code is a counter value run through a keyed permutation of all 36^6
+six-character codes: distinct counter values always give distinct codes,
+and without the key the codes a candidate has seen tell nothing about the
+counter or about anyone else's code.  The permutation is an 8-round
+Feistel network on the two 3-character halves of a code (36^3 x 36^3 is
+exactly the code space, so every value stays in range), with BLAKE2b keyed
+by the access-code key as the round function.
+
+Counter values are reserved from the database in blocks of CODE_BLOCK_SIZE
+(a Postgres sequence, a counter row on SQLite), each in a transaction of its
+own that commits before any of its values is used, so no block is ever
+reserved twice.  Each worker hands out codes from its block in memory and
+reserves the next one in the background once half of it is used, so
+creating a session costs no extra round trip.  Whatever a worker leaves of
+a block when it exits is skipped; the code space lasts for over two
+million blocks.
+
+Codes from before this scheme (random ones) or from a different key can
+still coincide with new ones; the insert skips such codes and
+create_sessions() takes fresh ones.
+
+Environment:
+    ACCESS_CODE_KEY   permutation key, identical on every worker and kept
+                      across deploys (default: a random key stored in the
+                      database on first start)
+"""
+
+import hashlib
+import os
+import secrets
+import string
+import threading
+
+ALPHABET = string.ascii_uppercase + string.digits
+CODE_LENGTH = 6
+HALF_SPACE = len(ALPHABET) ** (CODE_LENGTH // 2)
+CODE_SPACE = HALF_SPACE * HALF_SPACE
+
+# Block b holds counter values [b * CODE_BLOCK_SIZE, (b + 1) * CODE_BLOCK_SIZE);
+# changing the size on a live database would hand out values again
+CODE_BLOCK_SIZE = 1000
+FEISTEL_ROUNDS = 8
+KEY_SETTING = 'access_code_key'
+
+
+def permute(value, key):
+    """Keyed bijection of range(CODE_SPACE) onto itself"""
+    left, right = divmod(value, HALF_SPACE)
+    for round_number in range(FEISTEL_ROUNDS):
+        digest = hashlib.blake2b(right.to_bytes(2, 'big') + bytes([round_number]),
+                                 key=key, digest_size=4).digest()
+        left, right = right, (left + int.from_bytes(digest, 'big')) % HALF_SPACE
+    return left * HALF_SPACE + right
+
+
+def encode(value):
+    """Six-character code for a value in range(CODE_SPACE)"""
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def init_key(store):
+    """Store a random key on first start (a no-op once any worker has stored one)"""
+    if not os.environ.get('ACCESS_CODE_KEY'):
+        with store.transaction() as tx:
+            tx.setting(KEY_SETTING, secrets.token_hex(32))
+
+
+class CodeAllocator:
+    """Per-worker source of unique access codes, drawing on reserved counter blocks"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def take(self, count):
+        """
+        `count` new codes.  Call it outside any transaction: blocks are
+        reserved in their own, committed transaction, so a rollback of the
+        caller's work can never hand the same block out again.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # Values inherited across fork() are the parent's to hand out
+                self._pid = os.getpid()
+                self._key = None
+                self._next = self._end = 0
+                self._spare = None
+                self._refilling = False
+            if self._key is None:
+                self._key = self._load_key()
+
+            values = []
+            while len(values) < count:
+                if self._next >= self._end:
+                    if self._spare is not None:
+                        (self._next, self._end), self._spare = self._spare, None
+                    else:
+                        self._next, self._end = self._reserve()
+                taken = min(count - len(values), self._end - self._next)
+                values.extend(range(self._next, self._next + taken))
+                self._next += taken
+
+            if (self._end - self._next < CODE_BLOCK_SIZE // 2 and self._spare is None
+                    and not self._refilling):
+                self._refilling = True
+                threading.Thread(target=self._refill, args=(self._pid,),
+                                 name='access-code-blocks', daemon=True).start()
+            key = self._key
+        return [encode(permute(value, key)) for value in values]
+
+    def _load_key(self):
+        secret = os.environ.get('ACCESS_CODE_KEY')
+        if not secret:
+            with self.store.transaction(write=False) as tx:
+                secret = tx.setting(KEY_SETTING)
+        if not secret:
+            raise RuntimeError('No access code key: set ACCESS_CODE_KEY or initialize the database')
+        return hashlib.sha256(secret.encode('utf-8')).digest()
+
+    def _reserve(self):
+        """Counter range of a newly reserved block, committed before any value is used"""
+        with self.store.transaction() as tx:
+            block = tx.reserve_code_block()
+        return _block_range(block)
+
+    def _refill(self, pid):
+        """Reserve the next block ahead of time"""
+        try:
+            spare = self._reserve()
+        except Exception as e:
+            spare = None
+            print(f"❌ Access code block reservation failed: {str(e)}")
+        with self._lock:
+            if self._pid == pid:
+                self._spare = spare
+                self._refilling = False
+
+
+def _block_range(block):
+    start = block * CODE_BLOCK_SIZE
+    if start + CODE_BLOCK_SIZE > CODE_SPACE:
+        raise RuntimeError('All access codes have been handed out')
+    return start, start + CODE_BLOCK_SIZE
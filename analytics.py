@@ -0,0 +1,272 @@
+"""
+Item analysis across all graded sessions
+
+For every question of a bank version we keep running counters, summed over
+a few shards per row key:
+
+    attempts, answered, correct                  -> difficulty (share correct)
+    score_sum, score_sq_sum, correct_score_sum   -> discrimination
+    picks per choice                             -> option distribution
+
+plus per-version session count and score sums for the average score.  The
+counters are additive, so submit_quiz and the sweeper add each graded
+session's deltas in their own transaction (record()) and the analytics page
+only sums a few hundred rows.
+
+Discrimination is the corrected item-total (point-biserial) correlation:
+correctness on the question against the score on the *other* questions,
+which is computable from the sums above without touching any session.
+
+rebuild() recomputes every counter from the packed results stored with each
+session (after a regrade, or to start counting on an existing database).  It
+aggregates in a read-only snapshot and then, under a brief lock, adds the
+difference to the counters, so submits keep adding their own deltas while
+it scans.  It does not touch outcomes one by one in Python: outcomes are
+grouped by (question, answer, flags, session score) with C-level counting
+and every counter is derived from the group sizes, the same reduction
+record() uses.
+
+Sessions without a bank version (legacy question snapshots) are not counted.
+"""
+
+import json
+import math
+import os
+import random
+import secrets
+import time
+from collections import Counter
+from itertools import repeat
+from operator import and_, itemgetter
+
+from scoring import _ANSWERED, _CORRECT
+from storage import ItemStats
+
+STATS_SHARDS = int(os.environ.get('STATS_SHARDS', 8))
+
+# Changed by every rebuild, so concurrent rebuilds don't both apply a difference
+REBUILD_SETTING = 'item_stats_generation'
+
+# Option keys for answers that are not an option index
+BLANK = 'blank'
+TEXT_CORRECT = 'correct'
+TEXT_OTHER = 'other'
+
+# Fields of a packed outcome [question_id, answer, flags, seconds]
+_QUESTION_ID, _ANSWER, _FLAGS = itemgetter(0), itemgetter(1), itemgetter(2)
+
+
+def choice_key(answered, answer, is_correct):
+    """Option-distribution key: the option index, or blank / correct / other for text answers"""
+    if not answered:
+        return BLANK
+    if type(answer) is int:
+        return str(answer)
+    return TEXT_CORRECT if is_correct else TEXT_OTHER
+
+
+def _reduce(outcomes, sessions):
+    """
+    ItemStats from grouped counts:
+
+        outcomes  {(bank_version, question_id, answer, flags, session score): n}
+        sessions  {(bank_version, session score, question count): n}
+    """
+    banks, questions, options = {}, {}, {}
+    for (version, score, total), n in sessions.items():
+        counters = banks.setdefault(version, [0, 0, 0, 0])
+        counters[0] += n
+        counters[1] += n * score
+        counters[2] += n * score * score
+        counters[3] += n * total
+
+    for (version, qid, answer, flags, score), n in outcomes.items():
+        counters = questions.setdefault((version, qid), [0, 0, 0, 0, 0, 0])
+        counters[0] += n
+        counters[3] += n * score
+        counters[4] += n * score * score
+        if flags & _ANSWERED:
+            counters[1] += n
+        if flags & _CORRECT:
+            counters[2] += n
+            counters[5] += n * score
+        key = (version, qid, choice_key(flags & _ANSWERED, answer, flags & _CORRECT))
+        options[key] = options.get(key, 0) + n
+    return ItemStats(banks, questions, options)
+
+
+def collect(graded):
+    """ItemStats deltas for [(bank_version, outcomes)] graded sessions"""
+    outcomes, sessions = Counter(), Counter()
+    for version, session_outcomes in graded:
+        if version is None:
+            continue
+        score = sum(1 for outcome in session_outcomes if outcome.is_correct)
+        sessions[(version, score, len(session_outcomes))] += 1
+        for outcome in session_outcomes:
+            flags = (_ANSWERED if outcome.answered else 0) | (_CORRECT if outcome.is_correct else 0)
+            outcomes[(version, outcome.question_id, _hashable(outcome.answer), flags, score)] += 1
+    return _reduce(outcomes, sessions)
+
+
+def _hashable(answer):
+    # Clients may send lists or objects; those only ever count as text answers
+    return answer if isinstance(answer, (int, float, str, type(None))) else json.dumps(answer)
+
+
+def record(tx, graded):
+    """Add graded sessions to the counters inside the caller's transaction"""
+    stats = collect(graded)
+    if stats.banks:
+        tx.add_item_stats(stats, random.randrange(STATS_SHARDS))
+
+
+def group_results(rows, outcomes, sessions):
+    """
+    Add stored results ([{'bank_version', 'results'}]) to the grouped counts.
+
+    Each session is parsed once and its outcomes are counted as tuples by
+    Counter.update, so the per-outcome work runs in C; only the few thousand
+    distinct groups are reduced in Python afterwards.
+    """
+    for row in rows:
+        packed = json.loads(row['results'])
+        version = row['bank_version']
+        flags = list(map(_FLAGS, packed))
+        score = sum(map(and_, flags, repeat(_CORRECT)))
+        sessions[(version, score, len(packed))] += 1
+
+        answers = tuple(map(_ANSWER, packed))
+        try:
+            hash(answers)
+        except TypeError:
+            answers = tuple(map(_hashable, answers))
+        outcomes.update(zip(repeat(version), map(_QUESTION_ID, packed), answers, flags, repeat(score)))
+
+
+def rebuild(store, batch_size=5000):
+    """Recompute every counter from stored results; returns a report dict"""
+    started = time.monotonic()
+    while True:
+        outcomes, sessions = Counter(), Counter()
+        last_code = ''
+        # Results and counters from one snapshot, without holding up submits:
+        # a session graded after it is in neither, so the difference between
+        # them is exactly what the counters are missing or have wrong
+        with store.transaction(write=False) as tx:
+            tx.read_snapshot()
+            generation = tx.setting(REBUILD_SETTING)
+            counted = ItemStats({}, {}, {})
+            for version, _ in tx.item_stats_versions():
+                for merged, part in zip(counted, tx.item_stats(version)):
+                    merged.update(part)
+            while True:
+                rows = tx.graded_after(last_code, batch_size)
+                if not rows:
+                    break
+                last_code = rows[-1]['access_code']
+                group_results([row for row in rows if row['bank_version'] is not None], outcomes, sessions)
+        stats = _reduce(outcomes, sessions)
+
+        with store.transaction() as tx:
+            tx.lock_item_stats()
+            # A rebuild that finished since our snapshot already applied its
+            # own difference; ours would count it twice
+            if tx.setting(REBUILD_SETTING) == generation:
+                tx.add_item_stats(_difference(stats, counted), 0)
+                tx.save_setting(REBUILD_SETTING, secrets.token_hex(8))
+                break
+
+    return {
+        'sessions': sum(sessions.values()),
+        'versions': len(stats.banks),
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+def _difference(stats, counted):
+    """ItemStats deltas that turn the counted totals into stats"""
+    banks, questions, options = {}, {}, {}
+    for target, new, old in zip((banks, questions), stats, counted):
+        for key in new.keys() | old.keys():
+            delta = [a - b for a, b in zip(new.get(key, repeat(0)), old.get(key, repeat(0)))]
+            if any(delta):
+                target[key] = delta
+    for key in stats.options.keys() | counted.options.keys():
+        delta = stats.options.get(key, 0) - counted.options.get(key, 0)
+        if delta:
+            options[key] = delta
+    return ItemStats(banks, questions, options)
+
+
+def discrimination(attempts, correct, score_sum, score_sq_sum, correct_score_sum):
+    """
+    Corrected point-biserial correlation between answering a question
+    correctly and the score on the remaining questions; None when undefined
+    (fewer than two sessions, everyone right or wrong, or no score spread).
+    """
+    if attempts < 2 or correct in (0, attempts):
+        return None
+    # Rest score = score minus this question's 0/1
+    rest_sum = score_sum - correct
+    rest_sq_sum = score_sq_sum - 2 * correct_score_sum + correct
+    mean = rest_sum / attempts
+    variance = rest_sq_sum / attempts - mean * mean
+    if variance <= 1e-12:
+        return None
+    rest_correct = correct_score_sum - correct
+    mean_correct = rest_correct / correct
+    mean_wrong = (rest_sum - rest_correct) / (attempts - correct)
+    p = correct / attempts
+    return (mean_correct - mean_wrong) / math.sqrt(variance) * math.sqrt(p * (1 - p))
+
+
+def _percent(part, whole):
+    return round(part / whole * 100, 1) if whole else 0
+
+
+def summarize(bank, stats):
+    """Per-question report for the analytics page, in bank order"""
+    version = bank.version
+    sessions, score_sum, score_sq_sum, total_sum = stats.banks.get(version, (0, 0, 0, 0))
+    average = score_sum / sessions if sessions else 0
+    spread = math.sqrt(max(score_sq_sum / sessions - average * average, 0)) if sessions else 0
+
+    questions = []
+    for qid, source in bank.source.items():
+        attempts, answered, correct, q_score, q_score_sq, q_correct_score = \
+            stats.questions.get((version, qid), (0, 0, 0, 0, 0, 0))
+        r = discrimination(attempts, correct, q_score, q_score_sq, q_correct_score)
+
+        if source.get('type') == 'text_input':
+            choices = [(TEXT_CORRECT, 'Accepted answer', True), (TEXT_OTHER, 'Other answer', False)]
+        else:
+            choices = [(str(i), option, i == source.get('correct'))
+                       for i, option in enumerate(source.get('options', []))]
+        choices.append((BLANK, 'No answer', False))
+        options = [{
+            'label': label,
+            'is_correct': is_correct,
+            'picks': stats.options.get((version, qid, key), 0),
+            'percentage': _percent(stats.options.get((version, qid, key), 0), attempts),
+        } for key, label, is_correct in choices]
+
+        questions.append({
+            'id': qid,
+            'question': source.get('question', ''),
+            'type': source.get('type', 'multiple_choice'),
+            'attempts': attempts,
+            'difficulty': _percent(correct, attempts),
+            'answered': _percent(answered, attempts),
+            'discrimination': round(r, 2) if r is not None else None,
+            'options': options,
+        })
+
+    return {
+        'version': version,
+        'sessions': sessions,
+        'average_score': round(average, 2),
+        'average_percentage': _percent(score_sum, total_sum),
+        'score_spread': round(spread, 2),
+        'questions': questions,
+    }
@@ -0,0 +1,269 @@
+"""
+Write-behind answer log with group commit
+
+By default every /submit_answer is its own database transaction.  With
+ANSWER_LOG_DIR set, answers are instead appended (and fsynced) to a local
+log file and acknowledged as soon as they are on disk.  A background
+flusher in each worker then writes everything logged since its last flush
+in one transaction, every ANSWER_FLUSH_MS milliseconds, or sooner once
+ANSWER_FLUSH_ROWS answers are waiting.
+
+The log is a series of segments, answers-<pid>-<n>.log, each holding one
+JSON line per acknowledged batch and held under an exclusive flock by the
+worker writing it.  A flush seals the current segment (new answers go to a
+fresh one) and deletes the sealed ones only after their transaction has
+committed.  Segments whose lock can be taken belong to a worker that died,
+so every flush also replays and removes those: a kill -9 or a crash loses
+nothing that was acknowledged.  Replaying is safe because answers carry
+their seq and a stored answer is only replaced by an equal or newer one.
+
+Before logging, the route checks in the database (not the session cache)
+that the session is still open.  A session completed between that check
+and the append may miss the answer; the flush then counts it as dropped
+(stats()['dropped_answers']) instead of writing it, which is why the
+acknowledgement says "logged" rather than "saved".
+
+Every path that completes a session (submit_quiz and expiry on page load;
+the sweeper, which cannot know its sessions before claiming them, takes
+every logged answer) first writes that session's logged answers inside its
+own transaction, reading the segments of every worker, so grading and the
+results page never miss a buffered answer.  All workers that can serve a
+session must therefore share the directory: one host, or sticky routing
+per host.
+
+Environment:
+    ANSWER_LOG_DIR      directory for the log (unset = write each answer directly)
+    ANSWER_FLUSH_MS     group commit interval in milliseconds (default 50)
+    ANSWER_FLUSH_ROWS   flush early once this many answers are waiting (default 500)
+    ANSWER_LOG_FSYNC    0 = don't fsync each append (survives worker crashes, not power loss)
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+ANSWER_LOG_DIR = os.environ.get('ANSWER_LOG_DIR')
+ANSWER_FLUSH_MS = int(os.environ.get('ANSWER_FLUSH_MS', 50))
+ANSWER_FLUSH_ROWS = int(os.environ.get('ANSWER_FLUSH_ROWS', 500))
+ANSWER_LOG_FSYNC = os.environ.get('ANSWER_LOG_FSYNC', '1') != '0'
+
+SEGMENT_PREFIX = 'answers-'
+SEGMENT_SUFFIX = '.log'
+
+
+def read_segment(path, codes=None):
+    """Logged batches of a segment as (access_code, answered_at, [[question_id, answer, seq]])"""
+    try:
+        with open(path, 'rb') as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return []
+    batches = []
+    for line in lines:
+        # A batch cut short by a crash was never acknowledged
+        if not line.endswith(b'\n'):
+            continue
+        try:
+            access_code, answered_at, answers = json.loads(line)
+        except ValueError:
+            continue
+        if codes is None or access_code in codes:
+            batches.append((access_code, datetime.fromisoformat(answered_at), answers))
+    return batches
+
+
+def answer_rows(batches):
+    """Reduce logged batches to one (access_code, question_id, answer, answered_at, seq) per question"""
+    latest = {}
+    for access_code, answered_at, answers in batches:
+        for question_id, answer, seq in answers:
+            key = (access_code, question_id)
+            if key not in latest or seq >= latest[key][4]:
+                latest[key] = (access_code, question_id, answer, answered_at, seq)
+    return list(latest.values())
+
+
+class AnswerLog:
+    """One worker's write-behind log in a directory shared by all workers"""
+
+    def __init__(self, directory, flush_ms=ANSWER_FLUSH_MS, flush_rows=ANSWER_FLUSH_ROWS,
+                 fsync=ANSWER_LOG_FSYNC):
+        self.directory = directory
+        self.interval = flush_ms / 1000.0
+        self.flush_rows = flush_rows
+        self.fsync = fsync
+        self._pid = None
+        self._store = None
+
+    def start(self, store):
+        """Recover dead workers' segments and start this worker's flusher once (after fork)"""
+        if self._pid == os.getpid():
+            return
+        with _start_lock:
+            if self._pid == os.getpid():
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            self._store = store
+            self._current = None       # (path, file) being appended to
+            self._sealed = []          # (path, file) waiting for their commit
+            self._pending = 0
+            self._counter = 0
+            self._lock = threading.Lock()
+            self._flush_lock = threading.Lock()
+            self._wake = threading.Event()
+            self.flushes = 0
+            self.flushed_rows = 0
+            self.dropped_rows = 0
+            self._pid = os.getpid()
+
+            recovered = self.flush()
+            if recovered:
+                print(f"♻️ Replayed {recovered} logged answers left by stopped workers")
+            threading.Thread(target=self._run, name='answer-log-flusher', daemon=True).start()
+            atexit.register(self.flush)
+
+    def append(self, access_code, latest, answered_at):
+        """Durably log {question_id: (answer, seq)} for a session; returns once it is on disk"""
+        line = json.dumps([access_code, answered_at.isoformat(),
+                           [[question_id, answer, seq] for question_id, (answer, seq) in latest.items()]],
+                          separators=(',', ':')).encode('utf-8') + b'\n'
+        with self._lock:
+            if self._current is None:
+                self._current = self._open_segment()
+            f = self._current[1]
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self._pending += len(latest)
+            if self._pending >= self.flush_rows:
+                self._wake.set()
+
+    def apply_pending(self, tx, codes=None):
+        """Write the logged answers of these sessions (None = all) from any worker in tx"""
+        codes = set(codes) if codes is not None else None
+        batches = []
+        for path in self._segment_paths():
+            batches.extend(read_segment(path, codes))
+        rows = answer_rows(batches)
+        if not rows:
+            return {}
+        return tx.upsert_answers_many(rows)
+
+    def flush(self):
+        """Commit every sealed segment plus any left by dead workers; returns the answers written"""
+        with self._flush_lock:
+            with self._lock:
+                if self._current is not None:
+                    self._sealed.append(self._current)
+                    self._current = None
+                    self._pending = 0
+            self._sealed.extend(self._claim_orphans())
+            if not self._sealed:
+                return 0
+
+            batches = []
+            for path, _ in self._sealed:
+                batches.extend(read_segment(path))
+            rows = answer_rows(batches)
+            with self._store.transaction() as tx:
+                written = tx.upsert_answers_many(rows) if rows else {}
+                for access_code, (saved, answered_count) in written.items():
+                    tx.publish({'type': 'answered', 'access_code': access_code, 'answered': answered_count})
+                # Nothing written is normal for replayed answers, not for a closed session
+                closed = {access_code for access_code in {row[0] for row in rows} - written.keys()
+                          if not tx.session_is_open(access_code)}
+            dropped = sum(1 for row in rows if row[0] in closed)
+            if dropped:
+                self.dropped_rows += dropped
+                print(f"⚠️ Dropped {dropped} logged answers for {len(closed)} sessions closed before the flush")
+
+            # Committed: the segments are no longer needed for recovery
+            for path, f in self._sealed:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                f.close()
+            self._sealed = []
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+            return len(rows)
+
+    def stats(self):
+        return {
+            'directory': self.directory,
+            'pending': self._pending,
+            'sealed_segments': len(self._sealed),
+            'flushes': self.flushes,
+            'flushed_answers': self.flushed_rows,
+            'dropped_answers': self.dropped_rows,
+        }
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Answer log flush error: {str(e)}")
+                time.sleep(self.interval)
+
+    def _open_segment(self):
+        self._counter += 1
+        name = f"{SEGMENT_PREFIX}{self._pid}-{time.time_ns()}-{self._counter}{SEGMENT_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        # Locked under a temporary name first, so no other worker can take
+        # the new segment for a dead worker's
+        f = open(path + '.new', 'ab')
+        fcntl.flock(f, fcntl.LOCK_EX)
+        os.rename(path + '.new', path)
+        return path, f
+
+    def _segment_paths(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+
+    def _claim_orphans(self):
+        """Lock every segment no live worker holds: (path, file) pairs to replay"""
+        own = {path for path, _ in self._sealed}
+        claimed = []
+        for path in self._segment_paths():
+            if path in own:
+                continue
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # Still the same file, not one already replayed and removed
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    claimed.append((path, f))
+                    continue
+            except OSError:
+                pass
+            f.close()
+        return claimed
+
+
+_start_lock = threading.Lock()
+
+# This worker's log, or None when answers are written directly
+ANSWER_LOG = AnswerLog(ANSWER_LOG_DIR) if ANSWER_LOG_DIR else None
+
+
+def apply_pending(tx, codes=None):
+    """
+    Write these sessions' (None = every session's) logged answers in tx,
+    before they are closed and graded; no-op when the log is disabled
+    """
+    if ANSWER_LOG is not None:
+        ANSWER_LOG.apply_pending(tx, codes)
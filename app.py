@@ -3,415 +3,318 @@ FINAL WORKING Professional Quiz Platform in Python Flask with Postgres Database
 ALL ISSUES FIXED: Scoring, Duration Tracking, Redirects, Answer Saving
 """
 
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response
+import click
+import csv
+import gzip
+import io
 import json
 import time
 from datetime import datetime, timedelta
 import secrets
 import os
 import random
-import string
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import urllib.parse
-import re
+from scoring import compile_bank, pack_outcomes, unpack_outcomes
+from events import SessionEventHub, sse_snapshot, sse_stream
+from storage import create_storage, latest_answers
+import sweeper
+import regrade
+from bank_registry import BankError, BankRegistry
+import analytics
+import export
+import history
+import retention
+import answer_log
+import access_codes
+from answer_log import ANSWER_LOG
+from cache import SESSION_CACHE
+import logging
+import logs
+import metrics
+from metrics import SCORING_SECONDS
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
-# Database connection
-def get_db_connection():
-    """Get database connection using Heroku DATABASE_URL"""
-    database_url = os.environ.get('DATABASE_URL')
-    if database_url:
-        url = urllib.parse.urlparse(database_url)
-        conn = psycopg2.connect(
-            database=url.path[1:],
-            user=url.username,
-            password=url.password,
-            host=url.hostname,
-            port=url.port,
-            cursor_factory=RealDictCursor
-        )
-        return conn
-    else:
-        return None
+# Session/answer persistence (Postgres, embedded SQLite or in-memory; see storage/)
+STORE = create_storage()
 
 def init_database():
-    """Initialize database tables"""
+    """Create or migrate the schema and record every registered question bank"""
     try:
-        conn = get_db_connection()
-        if conn:
-            cur = conn.cursor()
-            
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS quiz_sessions (
-                    access_code VARCHAR(10) PRIMARY KEY,
-                    start_time TIMESTAMP NOT NULL,
-                    questions_data TEXT NOT NULL,
-                    answers_data TEXT DEFAULT '{}',
-                    completed BOOLEAN DEFAULT FALSE,
-                    end_time TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    score INTEGER DEFAULT 0,
-                    total_questions INTEGER DEFAULT 0
-                )
-            """)
-            
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_quiz_sessions_completed 
-                ON quiz_sessions(completed, start_time)
-            """)
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            print("✅ Database initialized successfully")
-            return True
+        default = REGISTRY.get()
+        STORE.init_schema(default.bank, default.data)
+        access_codes.init_key(STORE)
+        record_banks(REGISTRY.snapshot)
+        print(f"✅ Database initialized successfully ({STORE.name})")
+        return True
     except Exception as e:
         print(f"❌ Database initialization error: {str(e)}")
         return False
 
-# Initialize database on app start
-init_database()
+MAX_ANSWERS_PER_BATCH = 200
 
-# Helper function to check text answers
-def check_text_answer(user_answer, correct_answers):
-    """Check if user's text answer matches any of the correct answers"""
-    if not user_answer:
-        return False
-    
-    user_answer = str(user_answer).strip().lower()
+def save_answers(access_code, answers):
+    """
+    Upsert a batch of {'question_id', 'answer', 'seq'} dicts in a transaction of its own.
+
+    Only the highest seq per question is sent, and an existing row is only
+    overwritten by an equal or newer seq, so retried or out-of-order batches
+    never clobber a later answer. The session's answered_count and
+    last_activity are maintained in the same write. Returns the number
+    of rows written. With ANSWER_LOG_DIR set the batch is only logged (see
+    answer_log.py) once the database says the session is open, and the
+    number of answers logged is returned.
+    """
+    latest = latest_answers(answers)
+    if not latest:
+        return 0
     
-    for correct in correct_answers:
-        correct = str(correct).strip().lower()
-        
-        # Exact match
-        if user_answer == correct:
-            return True
-        
-        # Remove common formatting
-        user_clean = re.sub(r'[%\s]', '', user_answer)
-        correct_clean = re.sub(r'[%\s]', '', correct)
-        
-        if user_clean == correct_clean:
-            return True
+    if ANSWER_LOG is not None:
+        # Write-behind: acknowledged once logged, committed by the flusher.
+        # The open check reads the database: another worker or the sweeper
+        # may have closed the session since this worker cached it
+        with STORE.transaction(write=False) as tx:
+            if not tx.session_is_open(access_code):
+                return 0
+        ANSWER_LOG.append(access_code, latest, datetime.now())
+        return len(latest)
     
-    return False
-
-# Quiz data - All 25 questions
-QUIZ_DATA = {
-    "title": "Accounting & Finance Assessment",
-    "description": "Professional interview evaluation - 45 minutes",
-    "time_limit": 2700,  # 45 minutes in seconds
-    "questions": [
-        {
-            "id": 1,
-            "type": "multiple_choice",
-            "question": "Out of following which is not capital item?",
-            "options": [
-                "(a) Computer set purchased",
-                "(b) Freight charges incurred for purchase of machinery",
-                "(c) Compensation paid to employees who are retrenched",
-                "(d) Installed family planning center"
-            ],
-            "correct": 2
-        },
-        {
-            "id": 2,
-            "type": "multiple_choice",
-            "question": "Salary paid to Mohan is debited to Mohan A/c. This error is",
-            "options": [
-                "(a) Principle error",
-                "(b) Compensation error",
-                "(c) Omission error",
-                "(d) No error at all"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 3,
-            "type": "multiple_choice",
-            "question": "XYZ Co. failed to agree and the difference was put into suspense account. Pass the rectifying entry:",
-            "options": [
-                "(a) Dr. Suspense A/c. 3000, Cr. Discount received A/c. 2000, Cr. Discount allowed a/c. 1000",
-                "(b) Dr. Discount received A/c. 2000, Dr. Discount allowed a/c. 1000, Cr. Suspense A/c. 3000",
-                "(c) No entry is required",
-                "(d) Any entry a or b"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 4,
-            "type": "multiple_choice",
-            "question": "Calculate the operating profit: Sales Rs. 10,00,000, Opening stock Rs. 1,00,000, Purchases Rs. 6,50,000, Closing stock Rs. 1,50,000, Office rent Rs. 45,000, Salaries Rs. 90,000",
-            "options": [
-                "(a) Rs. 4,65,000",
-                "(b) Rs. 5,50,000",
-                "(c) Rs. 4,30,000",
-                "(d) Rs. 4,75,000"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 5,
-            "type": "multiple_choice",
-            "question": "Salaries due for the month of March will appear",
-            "options": [
-                "(a) On the receipt side of the cash book",
-                "(b) On the payment side of the cash book",
-                "(c) As a contra entry",
-                "(d) Nowhere in cash book"
-            ],
-            "correct": 3
-        },
-        {
-            "id": 6,
-            "type": "multiple_choice",
-            "question": "From the following information, determine amounts to be transferred to Income & Expenditure A/c: Subscription received Rs. 5,000, Subscription outstanding Rs. 2,500",
-            "options": [
-                "(a) Rs. 2,500",
-                "(b) Rs. 2,000",
-                "(c) Rs. 500",
-                "(d) Rs. 3,000"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 7,
-            "type": "multiple_choice",
-            "question": "Opening balance: Proprietor's A/c. Rs. 50,000, Current year profit Rs. 4,50,000, Drawings Rs. 1,00,000. Calculate closing balance of Proprietor's A/c.",
-            "options": [
-                "(a) Rs. 5,00,000",
-                "(b) Rs. 4,00,000",
-                "(c) Rs. 6,00,000",
-                "(d) Rs. 7,00,000"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 8,
-            "type": "multiple_choice",
-            "question": "Goods worth Rs.18,800 are destroyed by fire and the insurance company admits the claim for Rs.15,000. Loss by fire account will be",
-            "options": [
-                "(a) debited by Rs.18,800",
-                "(b) debited by Rs.3,800",
-                "(c) credited by Rs.18,800",
-                "(d) credited by Rs.3,800"
-            ],
-            "correct": 1
-        },
-        {
-            "id": 9,
-            "type": "multiple_choice",
-            "question": "Which one is correct?",
-            "options": [
-                "(a) Assets + Liabilities = Owner's equity",
-                "(b) Assets – Liabilities = Owner's equity",
-                "(c) Owner's equity + Assets = Liability",
-                "(d) None of the above"
-            ],
-            "correct": 1
-        },
-        {
-            "id": 10,
-            "type": "multiple_choice",
-            "question": "Advances given to Govt. Authority is shown as",
-            "options": [
-                "(a) Current assets",
-                "(b) Fixed assets",
-                "(c) Liability",
-                "(d) Capital"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 11,
-            "type": "multiple_choice",
-            "question": "Health Club has 1,000 members. Annual fees for each member Rs.1,000. Rs.2 L received in advance, Rs.1 L in arrears. Amount to be credited to Income & Expenditure A/c:",
-            "options": [
-                "(a) Rs.8 L",
-                "(b) Rs.6 L",
-                "(c) Rs.10 L",
-                "(d) Rs.12 L"
-            ],
-            "correct": 1
-        },
-        {
-            "id": 12,
-            "type": "multiple_choice",
-            "question": "When sales Rs.300000, Purchase Rs.200000, Opening stock Rs.10000, Closing stock Rs.40000, what is gross profit?",
-            "options": [
-                "(a) Rs. 50,000",
-                "(b) Rs. 20,000",
-                "(c) Rs. 36,000",
-                "(d) Rs. 60,000"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 13,
-            "type": "multiple_choice",
-            "question": "From the information, Vimal Ltd received from its branch: Goods sent to branch Rs. 5,00,000, Cash received from branch Rs. 2,00,000, Expenses of branch Rs. 1,00,000, Closing stock at branch Rs. 1,00,000. Branch adjustment account will show:",
-            "options": [
-                "(a) Rs. 3,00,000",
-                "(b) Rs. 2,00,000",
-                "(c) Rs. 1,00,000",
-                "(d) Rs. 4,00,000"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 14,
-            "type": "multiple_choice",
-            "question": "What amount will be credited in income expenditure account for subscription: Subscription received Rs.10 L, Subscription due for previous year Rs.1 L, Subscription due for current year Rs.3 L, Subscription received in advance Rs.1 L",
-            "options": [
-                "(a) Rs. 10 L",
-                "(b) Rs. 12 L",
-                "(c) Rs. 14 L",
-                "(d) Rs. 11 L"
-            ],
-            "correct": 3
-        },
-        {
-            "id": 15,
-            "type": "multiple_choice",
-            "question": "Following information provided by ABC Club: Subscription received current year Rs.5 L, Subscription outstanding beginning Rs.2 L, Subscription outstanding end Rs.1 L, Subscription received in advance beginning Rs.1 L, Subscription received in advance end Rs.2 L. Amount to be credited:",
-            "options": [
-                "(a) Rs. 4 L",
-                "(b) Rs. 5 L",
-                "(c) Rs. 3 L",
-                "(d) Rs. 9 L"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 16,
-            "type": "true_false",
-            "question": "Drawing decrease the assets and decrease the liability. Evaluate this statement as True or False.",
-            "options": ["True", "False"],
-            "correct": 1
-        },
-        {
-            "id": 17,
-            "type": "true_false",
-            "question": "A, B, C started joint venture. A brought rs.10000, B Rs.20000, C Rs.30000 and opened joint bank account. Rs.10000 will be credited in joint bank a/c. on the name of A. Evaluate this statement as True or False.",
-            "options": ["True", "False"],
-            "correct": 0
-        },
-        {
-            "id": 18,
-            "type": "true_false",
-            "question": "It is true receipts and payment is like a cash book. Evaluate this statement as True or False.",
-            "options": ["True", "False"],
-            "correct": 0
-        },
-        {
-            "id": 19,
-            "type": "true_false",
-            "question": "Cash discount is never recorded in the books of accounts. Evaluate this statement as True or False.",
-            "options": ["True", "False"],
-            "correct": 1
-        },
-        {
-            "id": 20,
-            "type": "true_false",
-            "question": "The software development expenses for a company engaging in software business is capital expenses if it is for sale. Evaluate this statement as True or False.",
-            "options": ["True", "False"],
-            "correct": 1
-        },
-        {
-            "id": 21,
-            "type": "true_false",
-            "question": "It is not compulsory to record all the business transaction in the books of accounts. Evaluate this statement as True or False.",
-            "options": ["True", "False"],
-            "correct": 1
-        },
-        {
-            "id": 22,
-            "type": "multiple_choice",
-            "question": "If person invest Rs.2,00,000 in our investment which pays 12% compounded annually. What will be the future value after 10 years?",
-            "options": [
-                "(a) Rs. 6,21,200",
-                "(b) Rs. 5,00,000",
-                "(c) Rs. 6,42,200",
-                "(d) Rs. 8,10,500"
-            ],
-            "correct": 0
-        },
-        {
-            "id": 23,
-            "type": "multiple_choice",
-            "question": "PAT of the project is Rs.50 Lac, initial investment is Rs.500 Lac. What is the accounting rate of return (ARR)?",
-            "options": [
-                "(a) 5%",
-                "(b) 20%",
-                "(c) 10%",
-                "(d) 2%"
-            ],
-            "correct": 2
-        },
-        {
-            "id": 24,
-            "type": "multiple_choice",
-            "question": "Which of the following is a solvency ratio?",
-            "options": [
-                "(a) Liquidity Ratio",
-                "(b) Operating Ratio",
-                "(c) Capital Gearing Ratio",
-                "(d) Net Profit Ratio"
-            ],
-            "correct": 2
-        },
-        {
-            "id": 25,
-            "type": "text_input",
-            "question": "Calculate the Proprietary Ratio from the following Balance Sheet Data: Equity Share: Rs. 500,000, Pref. Shares: Rs. 200,000, General Reserve: Rs. 300,000, Secured Loan: Rs. 500,000, Creditors: Rs. 500,000, Total Liabilities: Rs. 2,000,000, Fixed Assets: Rs. 1,000,000, Stock: Rs. 200,000, Debtors: Rs. 600,000, Cash: Rs. 200,000, Total Assets: Rs. 2,000,000. Enter your answer as a decimal (e.g., 0.5) or percentage (e.g., 50%):",
-            "correct_answers": ["0.5", "50%", "50", "0.50", "50.0%", "50.0"],
-            "explanation": "Proprietary Ratio = Owner's Equity / Total Assets = (500,000 + 200,000 + 300,000) / 2,000,000 = 1,000,000 / 2,000,000 = 0.5 or 50%"
-        }
-    ]
-}
+    with STORE.transaction() as tx:
+        saved, answered_count = tx.upsert_answers(access_code, latest, datetime.now())
+        if saved:
+            tx.publish({'type': 'answered', 'access_code': access_code, 'answered': answered_count})
+    return saved
+
+def session_known_closed(access_code):
+    """True if this worker already knows the session is completed (no DB access)"""
+    cached = SESSION_CACHE.get(access_code)
+    return cached is not None and cached['completed']
+
+def session_is_open(access_code):
+    """
+    True if the session exists and has not been completed. A cached
+    completion is final; a cached open session may have been closed by
+    another worker since, so that is checked in SQL.
+    """
+    if session_known_closed(access_code):
+        return False
+    with STORE.transaction(write=False) as tx:
+        return tx.session_is_open(access_code)
+
+# Question banks from banks/*.json, compiled once and hot-reloaded when the
+# files change (see bank_registry.py)
+REGISTRY = BankRegistry()
+
+# Banks by version that are no longer (or not yet) in the registry, loaded
+# from question_banks on demand
+_BANKS = {}
+
+def record_banks(snapshot):
+    """Store every bank of a registry snapshot so any worker can resolve its version"""
+    with STORE.transaction() as tx:
+        for loaded in snapshot.banks.values():
+            tx.save_bank(loaded.bank.version, json.dumps(loaded.data))
+
+def banks_reloaded(snapshot):
+    try:
+        record_banks(snapshot)
+    except Exception as e:
+        print(f"❌ ERROR recording reloaded banks: {str(e)}")
+
+REGISTRY.add_listener(banks_reloaded)
+
+def get_bank(tx, version):
+    """
+    Compiled bank for a version id, or None if it was never recorded.
+
+    tx may be None when the caller holds no transaction; one is opened
+    only if the version is not loaded yet.
+    """
+    loaded = REGISTRY.by_version(version)
+    if loaded is not None:
+        return loaded.bank
+    bank = _BANKS.get(version)
+    if bank is None and version:
+        if tx is None:
+            with STORE.transaction(write=False) as tx:
+                return get_bank(tx, version)
+        bank_data = tx.load_bank(version)
+        if bank_data:
+            bank = _BANKS.setdefault(version, compile_bank(json.loads(bank_data)))
+    return bank
+
+def fetch_session(tx, access_code):
+    """Read session metadata from the database and cache it (misses are not cached)"""
+    session = tx.fetch_session(access_code)
+    if session:
+        SESSION_CACHE.set(access_code, session)
+    return session
+
+def session_questions(tx, session):
+    """
+    Resolve a session row to (bank, question dicts in display order).
+
+    Rows created before question_order existed fall back to their stored
+    questions_data copy, graded against the default bank.
+    """
+    if session['question_order'] is not None:
+        bank = get_bank(tx, session['bank_version'])
+        if bank is not None:
+            return bank, bank.ordered(session['question_order'])
+    return REGISTRY.get().bank, json.loads(session['questions_data'])
+
+def session_bank(tx, bank_version):
+    """Bank a session is timed against; rows without a recorded bank use the default bank"""
+    return get_bank(tx, bank_version) or REGISTRY.get().bank
+
+def time_limits(tx):
+    """({bank version: time limit} for every recorded bank, limit for sessions without one)"""
+    limits = {version: session_bank(tx, version).time_limit for version in tx.bank_versions()}
+    return limits, REGISTRY.get().bank.time_limit
+
+def longest_time_limit(tx):
+    """No open session started longer ago than this can still be running"""
+    limits, default_limit = time_limits(tx)
+    return max([default_limit, *limits.values()])
+
+def bank_limits(bank_version):
+    bank = session_bank(None, bank_version)
+    return bank.time_limit, len(bank.questions)
+
+# Live admin view of active sessions (per worker, fed by pg_notify, or
+# in-process by embedded backends)
+def load_active_sessions():
+    with STORE.transaction(write=False) as tx:
+        return tx.active_sessions(datetime.now() - timedelta(seconds=longest_time_limit(tx)), 100000)
+
+if STORE.cross_process_events:
+    EVENT_HUB = SessionEventHub(bank_limits)
+else:
+    EVENT_HUB = SessionEventHub(bank_limits, local_seed=load_active_sessions)
+    STORE.add_event_listener(EVENT_HUB.apply)
+
+# Initialize database on app start
+init_database()
+
+def route_label():
+    """Low-cardinality route name for metrics (the URL rule, not the raw path)"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_request_metrics():
+    metrics.begin_request()
+
+@app.after_request
+def record_request_metrics(response):
+    metrics.end_request(route_label(), request.method, response.status_code)
+    return response
+
+@app.teardown_request
+def record_failed_request(exc):
+    # Only teardown sees the unhandled exception itself, so errors are counted
+    # here.  end_request() is a no-op once after_request has timed the
+    # request; it only closes the timing when the exception was propagated
+    # (PROPAGATE_EXCEPTIONS) or raised in response processing
+    if exc is not None:
+        metrics.REQUEST_ERRORS.inc(route_label())
+        metrics.end_request(route_label(), request.method, 500)
+
+@app.before_request
+def start_background_jobs():
+    """Start per-worker background threads lazily (after gunicorn has forked)"""
+    sweeper.ensure_sweeper(STORE, time_limits, session_questions)
+    if ANSWER_LOG is not None:
+        ANSWER_LOG.start(STORE)
+
+@app.before_request
+def reload_question_banks():
+    """Pick up edited bank files (a stat() of the bank directory every few seconds)"""
+    REGISTRY.maybe_reload()
+
+@app.before_request
+def maintain_partitions():
+    """Keep next months' session partitions created (checked hourly, Postgres only)"""
+    retention.maybe_ensure_partitions(STORE)
 
 @app.route('/')
 def home():
     """Home page for creating quiz sessions"""
     print("🏠 HOME PAGE accessed")
-    return render_template('index.html')
+    return render_template('index.html', bank=REGISTRY.get().bank)
+
+MAX_BULK_SESSIONS = 5000
+
+# Unique, unguessable codes from reserved counter blocks (see access_codes.py)
+ACCESS_CODES = access_codes.CodeAllocator(STORE)
+
+def requested_bank(name):
+    """Compiled bank registered under name (the default bank when empty), or None"""
+    snapshot = REGISTRY.snapshot
+    loaded = snapshot.banks.get(name or snapshot.default)
+    return loaded.bank if loaded else None
+
+def create_sessions(count, bank, max_attempts=5):
+    """
+    Insert `count` new sessions on `bank` in one batch and return their codes.
+
+    New codes never repeat; one that matches a row from before the current
+    code scheme is skipped by the store and replaced in another round, so
+    it never aborts the batch. Codes are taken before each round's
+    transaction opens, since reserving them commits on its own.
+    """
+    created = []
+    start_time = datetime.now()
+    
+    for _ in range(max_attempts):
+        remaining = count - len(created)
+        if remaining <= 0:
+            break
+        
+        rows = []
+        for code in ACCESS_CODES.take(remaining):
+            question_order = [q.id for q in bank.questions]
+            random.shuffle(question_order)
+            rows.append((code, start_time, bank.version, question_order, len(question_order)))
+        
+        with STORE.transaction() as tx:
+            inserted = tx.insert_sessions(rows)
+            if inserted:
+                tx.publish({'type': 'started', 'codes': inserted, 'start_time': start_time.timestamp(),
+                            'time_limit': bank.time_limit, 'total': len(bank.questions)})
+        created.extend(inserted)
+    
+    if len(created) < count:
+        raise RuntimeError(f"Could only allocate {len(created)} of {count} unique access codes")
+    
+    return created
+
+def sessions_csv(sessions):
+    """Render [{'access_code', 'quiz_url'}] as CSV text"""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=['access_code', 'quiz_url'])
+    writer.writeheader()
+    writer.writerows(sessions)
+    return out.getvalue()
 
 @app.route('/start_quiz', methods=['POST'])
 def start_quiz():
-    """Create a new quiz session"""
+    """Create a new quiz session: optional {bank: name}"""
     try:
-        access_code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
-        
-        questions = QUIZ_DATA['questions'].copy()
-        random.shuffle(questions)
-        
-        conn = get_db_connection()
-        if conn:
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO quiz_sessions (access_code, start_time, questions_data, total_questions)
-                VALUES (%s, %s, %s, %s)
-            """, (access_code, datetime.now(), json.dumps(questions), len(questions)))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
-            print(f"✅ CREATED QUIZ SESSION: {access_code}")
-            
-            return jsonify({
-                'success': True,
-                'access_code': access_code,
-                'quiz_url': request.url_root + 'quiz/' + access_code
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'error': 'Database connection failed'
-            })
+        bank_name = (request.get_json(silent=True) or {}).get('bank')
+        bank = requested_bank(bank_name)
+        if bank is None:
+            return jsonify({'success': False, 'error': f'Unknown question bank: {bank_name}'}), 400
+        
+        access_code = create_sessions(1, bank)[0]
+        
+        print(f"✅ CREATED QUIZ SESSION: {access_code}")
+        
+        return jsonify({
+            'success': True,
+            'access_code': access_code,
+            'quiz_url': request.url_root + 'quiz/' + access_code
+        })
         
     except Exception as e:
         print(f"❌ ERROR creating quiz session: {str(e)}")
@@ -420,68 +323,208 @@ def start_quiz():
             'error': f'Failed to create quiz session: {str(e)}'
         })
 
+@app.route('/bulk_start_quiz', methods=['POST'])
+def bulk_start_quiz():
+    """Create many quiz sessions in one batch: {count, format: json|csv, bank}"""
+    try:
+        data = request.get_json(silent=True) or request.form
+        count = int(data.get('count', 0))
+        output_format = data.get('format', 'json')
+        
+        if count < 1 or count > MAX_BULK_SESSIONS:
+            return jsonify({'success': False, 'error': f'count must be between 1 and {MAX_BULK_SESSIONS}'}), 400
+        bank = requested_bank(data.get('bank'))
+        if bank is None:
+            return jsonify({'success': False, 'error': f"Unknown question bank: {data.get('bank')}"}), 400
+        
+        codes = create_sessions(count, bank)
+        
+        print(f"✅ CREATED {len(codes)} QUIZ SESSIONS")
+        
+        sessions = [{'access_code': code, 'quiz_url': request.url_root + 'quiz/' + code} for code in codes]
+        if output_format == 'csv':
+            return Response(sessions_csv(sessions), mimetype='text/csv',
+                            headers={'Content-Disposition': 'attachment; filename=quiz_sessions.csv'})
+        return jsonify({'success': True, 'count': len(sessions), 'sessions': sessions})
+        
+    except Exception as e:
+        print(f"❌ ERROR creating quiz sessions: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to create quiz sessions: {str(e)}'
+        })
+
+@app.cli.command('create-sessions')
+@click.argument('count', type=int)
+@click.option('--format', 'output_format', type=click.Choice(['json', 'csv']), default='csv')
+@click.option('--base-url', default=lambda: os.environ.get('BASE_URL', 'http://localhost:5000/'),
+              help='Public URL prefix for quiz links')
+@click.option('--bank', 'bank_name', default=None, help='Question bank name (default: DEFAULT_BANK)')
+def create_sessions_command(count, output_format, base_url, bank_name):
+    """Create COUNT quiz sessions in one batch and print codes and URLs"""
+    bank = requested_bank(bank_name)
+    if bank is None:
+        raise click.BadParameter(f'unknown question bank {bank_name!r}', param_hint='--bank')
+    codes = create_sessions(count, bank)
+    
+    base_url = base_url.rstrip('/') + '/'
+    sessions = [{'access_code': code, 'quiz_url': base_url + 'quiz/' + code} for code in codes]
+    if output_format == 'csv':
+        click.echo(sessions_csv(sessions), nl=False)
+    else:
+        click.echo(json.dumps(sessions, indent=2))
+
+@app.cli.command('expire-sessions')
+@click.option('--batch-size', default=500, show_default=True)
+def expire_sessions_command(batch_size):
+    """Expire and auto-score every session past its bank's time limit"""
+    report = sweeper.sweep(STORE, time_limits, session_questions, batch_size=batch_size)
+    if not report['success']:
+        raise click.ClickException(report['error'])
+    click.echo(json.dumps(report))
+
+@app.cli.command('regrade')
+@click.option('--from-version', default=None,
+              help='Grade sessions pinned to this bank version against the current bank and re-pin them')
+@click.option('--bank', 'bank_name', default=None,
+              help='Bank whose current version --from-version sessions move to (default: DEFAULT_BANK)')
+@click.option('--missing-only', is_flag=True, help='Only sessions without stored results')
+@click.option('--batch-size', default=500, show_default=True)
+def regrade_command(from_version, bank_name, missing_only, batch_size):
+    """Re-grade completed sessions and store their scores and per-question results"""
+    target_bank = requested_bank(bank_name)
+    if target_bank is None:
+        raise click.BadParameter(f'unknown question bank {bank_name!r}', param_hint='--bank')
+    if from_version == target_bank.version:
+        raise click.ClickException(f'{from_version} is already the current bank version')
+    report = regrade.regrade(STORE, session_questions, target_bank=target_bank, from_version=from_version,
+                             missing_only=missing_only, batch_size=batch_size)
+    if report['regraded']:
+        # Counters were added with the old outcomes
+        report['item_stats'] = analytics.rebuild(STORE)
+    click.echo(json.dumps(report))
+
+@app.cli.command('export-sessions')
+@click.option('--format', 'output_format', type=click.Choice(sorted(export.FORMATS)), default='csv')
+@click.option('--from', 'start_from', help='Sessions started on or after this ISO date/datetime')
+@click.option('--to', 'start_to', help='Sessions started before this datetime (a date includes the whole day)')
+@click.option('--min-score', type=int)
+@click.option('--max-score', type=int)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output')
+@click.option('--output', '-o', default='-', help='Output file (default: stdout)')
+def export_sessions_command(output_format, start_from, start_to, min_score, max_score, compress, output):
+    """Stream completed sessions as CSV or JSON lines"""
+    try:
+        filters = export.parse_filters({'from': start_from, 'to': start_to,
+                                        'min_score': min_score, 'max_score': max_score})
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    with click.open_file(output, 'wb') as out:
+        for chunk in export.stream(STORE, output_format, filters, compress=compress):
+            out.write(chunk)
+
+@app.cli.command('rebuild-item-stats')
+@click.option('--batch-size', default=5000, show_default=True)
+def rebuild_item_stats_command(batch_size):
+    """Recompute item-analysis counters from every graded session"""
+    click.echo(json.dumps(analytics.rebuild(STORE, batch_size=batch_size)))
+
+@app.cli.command('archive-sessions')
+@click.option('--months', type=int, default=lambda: retention.ARCHIVE_AFTER_MONTHS or None,
+              help='Archive sessions created before the start of the month this many months ago '
+                   '(default: ARCHIVE_AFTER_MONTHS)')
+@click.option('--batch-size', default=1000, show_default=True)
+def archive_sessions_command(months, batch_size):
+    """Move old completed sessions into session_archive and drop emptied partitions"""
+    if not months or months < 1:
+        raise click.BadParameter('give a number of months (1 or more)', param_hint='--months')
+    retention.ensure_partitions(STORE)
+    report = retention.archive(STORE, time_limits, session_questions, months, batch_size=batch_size)
+    click.echo(json.dumps(report))
+
 @app.route('/quiz/<access_code>')
 def quiz_interface(access_code):
     """CANDIDATE QUIZ INTERFACE - Shows quiz questions to candidates"""
-    print(f"🎯 CANDIDATE ACCESS: /quiz/{access_code}")
-    
     try:
-        conn = get_db_connection()
-        if not conn:
-            print("❌ Database connection failed")
-            return "Database connection failed", 500
-            
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT access_code, start_time, questions_data, completed
-            FROM quiz_sessions 
-            WHERE access_code = %s
-        """, (access_code,))
-        
-        session_data = cur.fetchone()
-        cur.close()
-        conn.close()
+        # Repeat loads are served from the session cache without a DB round trip
+        session_data = SESSION_CACHE.get(access_code)
+        if session_data is None:
+            with STORE.transaction(write=False) as tx:
+                session_data = fetch_session(tx, access_code)
         
         if not session_data:
-            print(f"❌ Session not found: {access_code}")
+            logs.log(logging.DEBUG, 'quiz_page', access_code=access_code, status='not_found')
             return f"Invalid access code: {access_code}", 404
         
         if session_data['completed']:
-            print(f"⚠️ Quiz already completed: {access_code}")
+            logs.log(logging.DEBUG, 'quiz_page', access_code=access_code, status='completed')
             return f"Quiz session {access_code} has already been completed.", 410
         
-        # Check if time expired
+        # Check if time expired (against the time limit of the session's own bank)
+        bank, questions = session_questions(None, session_data)
         elapsed = datetime.now() - session_data['start_time']
-        if elapsed.total_seconds() > QUIZ_DATA['time_limit']:
-            print(f"⏰ Quiz expired: {access_code}")
-            conn = get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                cur.execute("""
-                    UPDATE quiz_sessions 
-                    SET completed = TRUE, end_time = %s 
-                    WHERE access_code = %s
-                """, (datetime.now(), access_code))
-                conn.commit()
-                cur.close()
-                conn.close()
+        if elapsed.total_seconds() > bank.time_limit:
+            logs.log(logging.DEBUG, 'quiz_page', access_code=access_code, status='expired')
+            with STORE.transaction() as tx:
+                sweeper.expire_session(tx, access_code, bank.time_limit, session_questions)
+            SESSION_CACHE.invalidate(access_code)
             
             return f"Quiz session {access_code} has expired.", 410
         
-        questions = json.loads(session_data['questions_data'])
+        question_order = [q['id'] for q in questions if q['id'] in bank.by_id]
         
-        print(f"✅ LOADING QUIZ for candidate: {access_code}")
-        print(f"📝 Questions: {len(questions)}")
+        logs.log(logging.DEBUG, 'quiz_page', access_code=access_code, status='loaded',
+                 questions=len(question_order))
         
+        # The page only carries the ordering and clock; question text comes
+        # from the long-cached /quiz_bank/<version>.json asset
         return render_template('quiz.html', 
-                             quiz_data=QUIZ_DATA,
-                             questions=questions,
+                             quiz_title=bank.title,
+                             bank_url=f"/quiz_bank/{bank.version}.json",
+                             question_order=question_order,
+                             time_limit=bank.time_limit,
+                             time_remaining=max(0, int(bank.time_limit - elapsed.total_seconds())),
                              access_code=access_code)
                              
     except Exception as e:
         print(f"❌ ERROR loading quiz: {str(e)}")
         return f"Error loading quiz: {str(e)}", 500
 
+# Pre-serialized public bank payloads by version: (json bytes, gzip bytes)
+_BANK_ASSETS = {}
+
+def bank_asset(bank):
+    """Serialize and gzip a bank's public payload once per version"""
+    asset = _BANK_ASSETS.get(bank.version)
+    if asset is None:
+        body = json.dumps(bank.public_payload(), separators=(',', ':')).encode('utf-8')
+        asset = _BANK_ASSETS.setdefault(bank.version, (body, gzip.compress(body, mtime=0)))
+    return asset
+
+@app.route('/quiz_bank/<version>.json')
+def quiz_bank_asset(version):
+    """Immutable, versioned question payload (no answer keys) with strong ETags"""
+    bank = get_bank(None, version)
+    if bank is None:
+        return jsonify({'success': False, 'error': f'Unknown question bank: {version}'}), 404
+    
+    body, body_gz = bank_asset(bank)
+    use_gzip = 'gzip' in request.accept_encodings
+    etag = f"{bank.version}-gz" if use_gzip else bank.version
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'public, max-age=31536000, immutable',
+        'Vary': 'Accept-Encoding'
+    }
+    
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+    
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(body_gz, mimetype='application/json', headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
 @app.route('/submit_answer', methods=['POST'])
 def submit_answer():
     """Save candidate's answer to database"""
@@ -491,143 +534,136 @@ def submit_answer():
         question_id = data.get('question_id')
         answer = data.get('answer')
         
-        print(f"💾 SAVING ANSWER: {access_code} - Q{question_id}: {answer}")
+        if session_known_closed(access_code):
+            return jsonify({'success': False, 'error': 'Invalid session or quiz already completed'})
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'success': False, 'error': 'Database connection failed'})
-            
-        cur = conn.cursor()
-        
-        # Get current answers
-        cur.execute("""
-            SELECT answers_data FROM quiz_sessions 
-            WHERE access_code = %s AND completed = FALSE
-        """, (access_code,))
-        
-        result = cur.fetchone()
-        if not result:
-            cur.close()
-            conn.close()
+        # Legacy single-answer clients carry no seq; server time orders them
+        saved = save_answers(access_code, [{
+            'question_id': question_id,
+            'answer': answer,
+            'seq': data.get('seq') or int(time.time() * 1000)
+        }])
+        
+        if not saved:
+            return jsonify({'success': False, 'error': 'Invalid session or quiz already completed'})
+        
+        logs.debug('answer_saved', access_code=access_code, question_id=question_id, answer=answer)
+        return jsonify({'success': True, 'logged' if ANSWER_LOG is not None else 'saved': saved})
+        
+    except Exception as e:
+        print(f"❌ ERROR saving answer: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/submit_answers', methods=['POST'])
+def submit_answers():
+    """Save a coalesced batch of answers: {access_code, answers: [{question_id, answer, seq}]}"""
+    try:
+        data = request.get_json(force=True)
+        access_code = data.get('access_code')
+        answers = data.get('answers') or []
+        
+        if not isinstance(answers, list) or len(answers) > MAX_ANSWERS_PER_BATCH:
+            return jsonify({'success': False, 'error': f'answers must be a list of at most {MAX_ANSWERS_PER_BATCH} items'}), 400
+        
+        if session_known_closed(access_code):
             return jsonify({'success': False, 'error': 'Invalid session or quiz already completed'})
         
-        # Update answers
-        current_answers = json.loads(result['answers_data'] or '{}')
-        current_answers[str(question_id)] = answer
+        saved = save_answers(access_code, answers)
         
-        cur.execute("""
-            UPDATE quiz_sessions 
-            SET answers_data = %s 
-            WHERE access_code = %s
-        """, (json.dumps(current_answers), access_code))
+        # Nothing written is fine for a replayed batch, but not for a closed session
+        closed = not saved and answers and not session_is_open(access_code)
         
-        conn.commit()
-        cur.close()
-        conn.close()
+        if closed:
+            return jsonify({'success': False, 'error': 'Invalid session or quiz already completed'})
         
-        print(f"✅ Answer saved successfully: {access_code} - Q{question_id}")
-        return jsonify({'success': True})
+        acked_seq = max((int(item.get('seq') or 0) for item in answers), default=0)
+        logs.debug('answers_saved', access_code=access_code, received=len(answers), saved=saved)
+        # Logged answers are only verified against the database when flushed
+        return jsonify({'success': True, 'logged' if ANSWER_LOG is not None else 'saved': saved,
+                        'acked_seq': acked_seq})
         
     except Exception as e:
-        print(f"❌ ERROR saving answer: {str(e)}")
+        print(f"❌ ERROR saving answers: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/submit_quiz', methods=['POST'])
 def submit_quiz():
-    """Submit completed quiz and calculate score"""
+    """
+    Submit completed quiz and calculate score.
+
+    Idempotent: a repeated or concurrent submit (double click, timer plus
+    button, a retry after a network error) gets the stored result instead
+    of an error, and only the first one is graded into the statistics.
+    """
     try:
         data = request.json
         access_code = data.get('access_code')
         
-        print(f"📤 SUBMITTING QUIZ: {access_code}")
-        
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'success': False, 'error': 'Database connection failed'})
+        with STORE.transaction() as tx:
+            # Answers still in the write-behind log are graded too
+            answer_log.apply_pending(tx, [access_code])
+            # Session and answers in one read
+            result, answers = tx.fetch_submission(access_code)
+            if not result:
+                return jsonify({'success': False, 'error': 'Invalid session'})
             
-        cur = conn.cursor()
-        
-        # Get session data
-        cur.execute("""
-            SELECT questions_data, answers_data, completed, start_time
-            FROM quiz_sessions 
-            WHERE access_code = %s
-        """, (access_code,))
-        
-        result = cur.fetchone()
-        if not result:
-            cur.close()
-            conn.close()
-            return jsonify({'success': False, 'error': 'Invalid session'})
-        
-        if result['completed']:
-            cur.close()
-            conn.close()
-            return jsonify({'success': False, 'error': 'Quiz already completed'})
-        
-        # Calculate score
-        questions = json.loads(result['questions_data'])
-        answers = json.loads(result['answers_data'] or '{}')
-        
-        print(f"🔢 Calculating score for {access_code}")
-        print(f"📊 Questions: {len(questions)}, Answers: {len(answers)}")
-        
-        score = 0
-        total = len(questions)
-        
-        for question in questions:
-            question_id = str(question['id'])
-            
-            if question_id in answers:
-                user_answer = answers[question_id]
+            completed_now = False
+            if not result['completed']:
+                # Calculate score
+                bank, questions = session_questions(tx, result)
+                with SCORING_SECONDS.time('submit_quiz'):
+                    result_score = bank.score(questions, answers)
+                end_time = datetime.now()
                 
-                if question.get('type') == 'text_input':
-                    # Check text input answers
-                    correct_answers = question.get('correct_answers', [])
-                    if check_text_answer(user_answer, correct_answers):
-                        score += 1
-                        print(f"✅ Q{question_id}: Text answer correct - '{user_answer}'")
-                    else:
-                        print(f"❌ Q{question_id}: Text answer incorrect - '{user_answer}' (expected: {correct_answers})")
+                # Store score plus the graded outcomes (so the results page never
+                # has to grade again) only if the session is still open
+                completed_now = tx.complete_session(
+                    access_code, end_time, result_score.score, result_score.total,
+                    pack_outcomes(result_score, answers.answered_at, result['start_time']))
+                if completed_now:
+                    analytics.record(tx, [(result['bank_version'], result_score.outcomes)])
+                    result = dict(result, completed=True, end_time=end_time,
+                                  score=result_score.score, total_questions=result_score.total)
                 else:
-                    # Handle multiple choice and true/false
-                    correct_answer = question['correct']
-                    if user_answer == correct_answer:
-                        score += 1
-                        print(f"✅ Q{question_id}: Multiple choice correct - {user_answer}")
-                    else:
-                        print(f"❌ Q{question_id}: Multiple choice incorrect - {user_answer} (correct: {correct_answer})")
-            else:
-                print(f"⚠️ Q{question_id}: No answer provided")
+                    # Another submit got there first; report what it stored
+                    result = tx.fetch_session(access_code)
+            
+            score = result['score'] or 0
+            total = result['total_questions'] or 0
+            percentage = round((score/total)*100, 1) if total > 0 else 0
+            
+            if completed_now:
+                # Per-question detail only for a sampled fraction of submissions
+                if logs.sampled():
+                    for outcome in result_score.outcomes:
+                        logs.log(logging.DEBUG, 'question_graded', access_code=access_code,
+                                 question_id=outcome.question_id, answered=outcome.answered,
+                                 answer=outcome.answer, correct=outcome.is_correct)
+                tx.publish({
+                    'type': 'completed',
+                    'access_code': access_code,
+                    'start_time': result['start_time'].timestamp(),
+                    'end_time': result['end_time'].timestamp(),
+                    'score': score,
+                    'total': total,
+                    'percentage': percentage
+                })
+        SESSION_CACHE.invalidate(access_code)
         
         # Calculate duration
-        end_time = datetime.now()
-        duration_seconds = (end_time - result['start_time']).total_seconds()
-        duration_minutes = int(duration_seconds // 60)
-        
-        # Mark as completed and store score
-        cur.execute("""
-            UPDATE quiz_sessions 
-            SET completed = TRUE, end_time = %s, score = %s, total_questions = %s
-            WHERE access_code = %s
-        """, (end_time, score, total, access_code))
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        end_time = result['end_time'] or datetime.now()
+        duration_minutes = int((end_time - result['start_time']).total_seconds() // 60)
         
-        percentage = round((score/total)*100, 1) if total > 0 else 0
-        
-        print(f"✅ QUIZ COMPLETED: {access_code}")
-        print(f"📊 Final Score: {score}/{total} ({percentage}%)")
-        print(f"⏱️ Duration: {duration_minutes} minutes")
+        logs.log(logging.DEBUG, 'quiz_submitted', access_code=access_code, score=score, total=total,
+                 percentage=percentage, duration_minutes=duration_minutes, already_completed=not completed_now)
         
         return jsonify({
             'success': True,
             'score': score,
             'total': total,
             'percentage': percentage,
-            'duration_minutes': duration_minutes
+            'duration_minutes': duration_minutes,
+            'already_completed': not completed_now
         })
         
     except Exception as e:
@@ -636,54 +672,38 @@ def submit_quiz():
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)})
 
+ACTIVE_SESSIONS_LIMIT = 500
+
 @app.route('/admin')
 def admin_dashboard():
     """ADMIN DASHBOARD - Monitor quiz sessions"""
     print("👑 ADMIN ACCESS: /admin")
     
     try:
-        conn = get_db_connection()
-        if not conn:
-            return "Database connection failed", 500
-            
-        cur = conn.cursor()
-        
-        # Get active sessions
-        cur.execute("""
-            SELECT access_code, start_time, answers_data
-            FROM quiz_sessions 
-            WHERE completed = FALSE 
-            ORDER BY start_time DESC
-        """)
-        
-        active_sessions_data = cur.fetchall()
-        
-        # Get completed sessions with better error handling
-        cur.execute("""
-            SELECT access_code, start_time, end_time, score, total_questions
-            FROM quiz_sessions 
-            WHERE completed = TRUE 
-            ORDER BY COALESCE(end_time, start_time) DESC
-            LIMIT 20
-        """)
-        
-        completed_sessions_data = cur.fetchall()
-        cur.close()
-        conn.close()
-        
-        # Process active sessions
+        with STORE.transaction(write=False) as tx:
+            # Get active sessions
+            active_sessions_data = tx.active_sessions(
+                datetime.now() - timedelta(seconds=longest_time_limit(tx)), ACTIVE_SESSIONS_LIMIT)
+        
+            # Get completed sessions with better error handling
+            completed_sessions_data = tx.completed_sessions(20)
+        
+        # Process active sessions (each against its own bank's time limit)
         active_sessions = []
         for session in active_sessions_data:
+            time_limit, total = bank_limits(session['bank_version'])
             elapsed = datetime.now() - session['start_time']
-            time_remaining = QUIZ_DATA['time_limit'] - elapsed.total_seconds()
+            time_remaining = time_limit - elapsed.total_seconds()
             
             if time_remaining > 0:
-                answers = json.loads(session['answers_data'] or '{}')
                 active_sessions.append({
                     'access_code': session['access_code'],
                     'start_time': session['start_time'].strftime('%H:%M:%S'),
+                    'start_epoch': session['start_time'].timestamp(),
+                    'time_limit': time_limit,
                     'time_remaining': max(0, int(time_remaining)),
-                    'questions_answered': len(answers)
+                    'questions_answered': session['answered_count'],
+                    'total': session['total_questions'] or total
                 })
         
         # Process completed sessions with better duration calculation
@@ -712,7 +732,7 @@ def admin_dashboard():
                 'end_time': session['end_time'].strftime('%Y-%m-%d %H:%M') if session['end_time'] else 'N/A',
                 'duration': duration,
                 'score': session['score'] if session['score'] is not None else 0,
-                'total': session['total_questions'] if session['total_questions'] else 25,
+                'total': session['total_questions'] or len(REGISTRY.get().bank.questions),
                 'percentage': percentage
             })
         
@@ -720,7 +740,8 @@ def admin_dashboard():
         
         return render_template('admin.html', 
                              active_sessions=active_sessions, 
-                             completed_sessions=completed_sessions)
+                             completed_sessions=completed_sessions,
+                             bank=REGISTRY.get().bank)
         
     except Exception as e:
         print(f"❌ ERROR loading admin: {str(e)}")
@@ -728,27 +749,155 @@ def admin_dashboard():
         traceback.print_exc()
         return f"Error loading admin: {str(e)}", 500
 
+@app.route('/admin/events')
+def admin_events():
+    """Server-sent event stream: snapshot of active sessions, then incremental changes"""
+    # A single-threaded worker (gunicorn sync) can't afford a long-lived
+    # stream per admin tab; it answers with the snapshot and the page polls
+    body = sse_stream(EVENT_HUB) if request.environ.get('wsgi.multithread') else sse_snapshot(EVENT_HUB)
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/admin/analytics')
+def admin_analytics():
+    """Item analysis per question: difficulty, discrimination, option distribution"""
+    print("📈 ADMIN ACCESS: /admin/analytics")
+    
+    try:
+        version = request.args.get('version') or REGISTRY.get().bank.version
+        with STORE.transaction(write=False) as tx:
+            bank = get_bank(tx, version)
+            if bank is None:
+                return f"Unknown bank version: {version}", 404
+            stats = tx.item_stats(version)
+            versions = tx.item_stats_versions()
+        
+        report = analytics.summarize(bank, stats)
+        return render_template('analytics.html', report=report, versions=versions,
+                             current_version=REGISTRY.get().bank.version)
+        
+    except Exception as e:
+        print(f"❌ ERROR loading analytics: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return f"Error loading analytics: {str(e)}", 500
+
+@app.route('/admin/analytics/rebuild', methods=['POST'])
+def admin_analytics_rebuild():
+    """Recompute the item-analysis counters from stored results"""
+    try:
+        report = analytics.rebuild(STORE)
+        print(f"🔁 Rebuilt item statistics from {report['sessions']} sessions in {report['seconds']}s")
+        return jsonify({'success': True, **report})
+    except Exception as e:
+        print(f"❌ ERROR rebuilding item statistics: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/admin/history')
+def admin_history():
+    """Completed sessions, newest first: ?from, to, min_score, max_score, code, cursor, format=json"""
+    try:
+        filters = history.parse_search(request.args)
+        page_size = int(request.args.get('page_size', history.HISTORY_PAGE_SIZE))
+        rows, next_cursor = history.search(STORE, filters, request.args.get('cursor'), page_size)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid search: {str(e)}'}), 400
+    except Exception as e:
+        print(f"❌ ERROR searching history: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+    sessions = []
+    for row in rows:
+        total = row['total_questions'] or 0
+        sessions.append({
+            'access_code': row['access_code'],
+            'start_time': row['start_time'].strftime('%Y-%m-%d %H:%M:%S') if row['start_time'] else None,
+            'finished_at': row['finished_at'].strftime('%Y-%m-%d %H:%M:%S'),
+            'score': row['score'],
+            'total_questions': total,
+            'percentage': round(row['score'] / total * 100, 1) if total and row['score'] is not None else 0,
+            'bank_version': row['bank_version']
+        })
+
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'sessions': sessions, 'next_cursor': next_cursor})
+
+    search_args = {key: value for key, value in request.args.items()
+                   if key in ('from', 'to', 'min_score', 'max_score', 'code') and value}
+    return render_template('history.html', sessions=sessions, next_cursor=next_cursor,
+                         search=search_args, paged=bool(request.args.get('cursor')))
+
+def banks_payload(snapshot):
+    return {
+        'default': snapshot.default,
+        'loaded_at': snapshot.loaded_at,
+        'banks': [{
+            'name': name,
+            'version': loaded.bank.version,
+            'title': loaded.bank.title,
+            'questions': len(loaded.bank.questions),
+            'time_limit': loaded.bank.time_limit
+        } for name, loaded in snapshot.banks.items()]
+    }
+
+@app.route('/admin/banks')
+def admin_banks():
+    """Registered question banks and their current versions (this worker)"""
+    return jsonify({'success': True, **banks_payload(REGISTRY.snapshot)})
+
+@app.route('/admin/banks/reload', methods=['POST'])
+def admin_banks_reload():
+    """Reload bank files now; other workers follow within BANK_RELOAD_INTERVAL"""
+    try:
+        snapshot = REGISTRY.reload()
+        print(f"🔁 Reloaded question banks: {', '.join(snapshot.banks)}")
+        return jsonify({'success': True, **banks_payload(snapshot)})
+    except BankError as e:
+        print(f"❌ ERROR reloading question banks: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/admin/export/<output_format>')
+def admin_export(output_format):
+    """Stream completed sessions as CSV or JSONL: ?from, to, min_score, max_score"""
+    if output_format not in export.FORMATS:
+        return jsonify({'success': False, 'error': f'Unknown export format: {output_format}'}), 404
+    try:
+        filters = export.parse_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'Invalid filter: {str(e)}'}), 400
+    
+    print(f"📦 EXPORT: {output_format} {filters}")
+    mimetype, extension = export.FORMATS[output_format]
+    use_gzip = 'gzip' in request.accept_encodings
+    headers = {
+        'Content-Disposition': f'attachment; filename=quiz_sessions.{extension}',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
+    }
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        headers['Vary'] = 'Accept-Encoding'
+    return Response(export.stream(STORE, output_format, filters, compress=use_gzip),
+                    mimetype=mimetype, headers=headers)
+
 @app.route('/results/<access_code>')
 def quiz_results(access_code):
     """ADMIN ONLY - Detailed results for completed quiz sessions"""
     print(f"📊 ADMIN VIEWING RESULTS: /results/{access_code}")
     
     try:
-        conn = get_db_connection()
-        if not conn:
-            return "Database connection failed", 500
-            
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT access_code, start_time, end_time, score, total_questions, 
-                   questions_data, answers_data, completed
-            FROM quiz_sessions 
-            WHERE access_code = %s
-        """, (access_code,))
-        
-        session = cur.fetchone()
-        cur.close()
-        conn.close()
+        with STORE.transaction(write=False) as tx:
+            # Sessions moved out by flask archive-sessions keep their graded results
+            session = tx.fetch_session(access_code) or tx.fetch_archived(access_code)
+            if session and session['question_order'] is None and session['questions_data'] is None:
+                return f"Quiz session {access_code} was archived without its questions", 410
+            if session and session['completed']:
+                bank, questions = session_questions(tx, session)
+                # Sessions graded before results were stored (see flask regrade)
+                if session['results'] is None:
+                    answers = tx.fetch_answers(access_code)
         
         if not session:
             return f"Quiz session {access_code} not found", 404
@@ -756,21 +905,23 @@ def quiz_results(access_code):
         if not session['completed']:
             return f"Quiz session {access_code} is still active. Results not available yet.", 400
         
-        # Parse data
-        questions = json.loads(session['questions_data'])
-        answers = json.loads(session['answers_data'] or '{}')
+        if session['results'] is not None:
+            outcomes = unpack_outcomes(session['results'])
+        else:
+            with SCORING_SECONDS.time('results'):
+                outcomes = bank.score(questions, answers).outcomes
         
-        # Create detailed results
+        questions_by_id = {q['id']: q for q in questions}
         question_results = []
-        for i, question in enumerate(questions):
-            question_id = str(question['id'])
-            user_answer = answers.get(question_id, -1)
+        for i, outcome in enumerate(outcomes):
+            question = questions_by_id[outcome.question_id]
+            user_answer = outcome.answer if outcome.answered else -1
+            is_correct = outcome.is_correct
             
             # Handle different question types
             if question.get('type') == 'text_input':
                 # Text input question
                 correct_answers = question.get('correct_answers', [])
-                is_correct = check_text_answer(user_answer, correct_answers)
                 user_answer_text = str(user_answer) if user_answer != -1 else "Not answered"
                 correct_answer_text = " or ".join(correct_answers[:3])  # Show first 3 correct answers
                 
@@ -782,12 +933,12 @@ def quiz_results(access_code):
                     'user_answer_text': user_answer_text,
                     'correct_answer_text': correct_answer_text,
                     'is_correct': is_correct,
+                    'answered_after_seconds': outcome.seconds,
                     'explanation': question.get('explanation', '')
                 })
             else:
                 # Multiple choice or true/false
                 correct_answer = question['correct']
-                is_correct = user_answer == correct_answer
                 
                 user_answer_text = "Not answered"
                 correct_answer_text = "N/A"
@@ -807,7 +958,8 @@ def quiz_results(access_code):
                     'user_answer_text': user_answer_text,
                     'correct_answer': correct_answer,
                     'correct_answer_text': correct_answer_text,
-                    'is_correct': is_correct
+                    'is_correct': is_correct,
+                    'answered_after_seconds': outcome.seconds
                 })
         
         print(f"✅ LOADING DETAILED RESULTS for admin: {access_code}")
@@ -827,25 +979,53 @@ def quiz_results(access_code):
 def test():
     """Test route"""
     try:
-        conn = get_db_connection()
-        if conn:
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) as session_count FROM quiz_sessions")
-            result = cur.fetchone()
-            cur.close()
-            conn.close()
-            return f"""
-            <h1>✅ System Working</h1>
-            <p><strong>Time:</strong> {datetime.now()}</p>
-            <p><strong>Sessions in DB:</strong> {result['session_count']}</p>
-            <p><strong>Questions:</strong> {len(QUIZ_DATA['questions'])}</p>
-            <p><a href='/'>Home</a> | <a href='/admin'>Admin</a></p>
-            """
-        else:
-            return f"⚠️ Database connection failed. Time: {datetime.now()}"
+        with STORE.transaction(write=False) as tx:
+            session_count = tx.count_sessions()
+        return f"""
+        <h1>✅ System Working</h1>
+        <p><strong>Time:</strong> {datetime.now()}</p>
+        <p><strong>Storage:</strong> {STORE.name}</p>
+        <p><strong>Sessions in DB:</strong> {session_count}</p>
+        <p><strong>Question banks:</strong> {', '.join(f"{name} ({len(loaded.bank.questions)} questions)" for name, loaded in REGISTRY.snapshot.banks.items())}</p>
+        <p><a href='/'>Home</a> | <a href='/admin'>Admin</a></p>
+        """
     except Exception as e:
         return f"❌ Error: {str(e)}"
 
+@app.route('/pool_stats')
+def pool_stats_route():
+    """Connection pool usage for this worker (in use, waiting, checkout wait time)"""
+    stats = STORE.pool_stats()
+    if stats is None:
+        return jsonify({'success': False, 'error': f'{STORE.name} storage has no connection pool'}), 503
+    return jsonify({'success': True, 'pid': os.getpid(), 'pool': stats})
+
+@app.route('/metrics')
+def metrics_route():
+    """Prometheus text metrics for this worker (latency, DB time, pool wait, scoring)"""
+    gauges = []
+    stats = STORE.pool_stats()
+    if stats is not None:
+        gauges.append(('quiz_db_pool_connections', 'Pooled connections by state',
+                       [({'state': state}, stats[state]) for state in ('in_use', 'idle', 'waiting')]))
+    cache = SESSION_CACHE.stats()
+    gauges.append(('quiz_session_cache_entries', 'Entries in the session metadata cache',
+                   [({}, cache['size'])]))
+    gauges.append(('quiz_session_cache_hit_ratio', 'Session cache hit ratio since worker start',
+                   [({}, cache['hit_ratio'])]))
+    if ANSWER_LOG is not None:
+        log_stats = ANSWER_LOG.stats()
+        gauges.append(('quiz_answer_log_pending', 'Logged answers waiting for the next group commit',
+                       [({}, log_stats['pending'])]))
+        gauges.append(('quiz_answer_log_dropped', 'Logged answers dropped at flush because their session had closed',
+                       [({}, log_stats['dropped_answers'])]))
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache_stats')
+def cache_stats_route():
+    """Session metadata cache hit/miss counters for this worker"""
+    return jsonify({'success': True, 'pid': os.getpid(), 'session_cache': SESSION_CACHE.stats()})
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     print(f"🚀 Starting Flask app on port {port}")
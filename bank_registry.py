@@ -0,0 +1,222 @@
+"""
+Question-bank registry: banks loaded from files, hot-reloaded in place
+
+Every *.json (and *.yaml / *.yml when PyYAML is installed) file in BANKS_DIR
+is one bank, named after the file:
+
+    banks/accounting.json   ->  bank "accounting"
+
+Each file is validated and compiled once into an immutable CompiledBank
+whose version is the hash of its content.  A registry snapshot (all banks of
+one load) is replaced as a whole, so a request that read the snapshot never
+sees half of a reload, and a file that fails validation leaves the previous
+snapshot in place.
+
+Sessions pin the bank version they started with (quiz_sessions.bank_version),
+so editing a file only affects sessions created after the reload; older
+versions stay resolvable from the question_banks table.
+
+Environment:
+    BANKS_DIR               directory with bank files (default: banks/ next to app.py)
+    DEFAULT_BANK            bank used when a request names none (default: first by name)
+    BANK_RELOAD_INTERVAL    seconds between checks for changed files (default 5, 0 = off)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from scoring import compile_bank
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+BANKS_DIR = os.environ.get('BANKS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'banks'))
+DEFAULT_BANK = os.environ.get('DEFAULT_BANK')
+BANK_RELOAD_INTERVAL = float(os.environ.get('BANK_RELOAD_INTERVAL', 5))
+
+QUESTION_TYPES = ('multiple_choice', 'true_false', 'text_input')
+
+# One loaded bank: file name stem, path, raw data (as stored in question_banks) and the compiled bank
+LoadedBank = namedtuple('LoadedBank', 'name path data bank')
+
+# One complete load of the directory
+Snapshot = namedtuple('Snapshot', 'banks by_version default signature loaded_at')
+
+
+class BankError(ValueError):
+    """A bank file that cannot be loaded"""
+
+
+def validate_bank(data, name='bank'):
+    """Raise BankError unless data is a well-formed bank dict"""
+    if not isinstance(data, dict):
+        raise BankError(f"{name}: a bank must be an object")
+    time_limit = data.get('time_limit')
+    if not isinstance(time_limit, int) or isinstance(time_limit, bool) or time_limit <= 0:
+        raise BankError(f"{name}: time_limit must be a positive number of seconds")
+    questions = data.get('questions')
+    if not isinstance(questions, list) or not questions:
+        raise BankError(f"{name}: questions must be a non-empty list")
+
+    seen = set()
+    for position, question in enumerate(questions, 1):
+        where = f"{name}: question {position}"
+        if not isinstance(question, dict):
+            raise BankError(f"{where} must be an object")
+        qid = question.get('id')
+        # Question ids are stored in SMALLINT[] question_order arrays
+        if not isinstance(qid, int) or isinstance(qid, bool) or not 0 < qid < 32768:
+            raise BankError(f"{where}: id must be an integer between 1 and 32767")
+        if qid in seen:
+            raise BankError(f"{where}: duplicate id {qid}")
+        seen.add(qid)
+        if not isinstance(question.get('question'), str) or not question['question'].strip():
+            raise BankError(f"{where}: question text is required")
+
+        question_type = question.get('type', 'multiple_choice')
+        if question_type not in QUESTION_TYPES:
+            raise BankError(f"{where}: unknown type {question_type!r}")
+        if question_type == 'text_input':
+            accepted = question.get('correct_answers')
+            if not isinstance(accepted, list) or not accepted:
+                raise BankError(f"{where}: correct_answers must be a non-empty list")
+        else:
+            options = question.get('options')
+            if not isinstance(options, list) or len(options) < 2:
+                raise BankError(f"{where}: options must list at least two choices")
+            correct = question.get('correct')
+            if not isinstance(correct, int) or isinstance(correct, bool) or not 0 <= correct < len(options):
+                raise BankError(f"{where}: correct must be an index into options")
+
+
+def read_bank_file(path):
+    """Parse one bank file (JSON or YAML) into a dict"""
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            try:
+                return json.load(f)
+            except json.JSONDecodeError as e:
+                raise BankError(f"{os.path.basename(path)}: {e}")
+        try:
+            return yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise BankError(f"{os.path.basename(path)}: {e}")
+
+
+def bank_files(directory):
+    """{name: path} for every loadable bank file in directory"""
+    extensions = ('.json', '.yaml', '.yml') if yaml is not None else ('.json',)
+    files = {}
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        stem, extension = os.path.splitext(entry.name)
+        if entry.is_file() and extension in extensions:
+            if stem in files:
+                raise BankError(f"{entry.name}: bank {stem!r} is defined twice")
+            files[stem] = entry.path
+        elif entry.is_file() and extension in ('.yaml', '.yml'):
+            print(f"⚠️ Skipping {entry.name}: PyYAML is not installed")
+    return files
+
+
+def _signature(files):
+    """Cheap change detector: (name, mtime, size) per file"""
+    signature = []
+    for name, path in sorted(files.items()):
+        stat = os.stat(path)
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class BankRegistry:
+    """Named, versioned banks from a directory; reload() swaps in a new snapshot atomically"""
+
+    def __init__(self, directory=BANKS_DIR, default=DEFAULT_BANK, reload_interval=BANK_RELOAD_INTERVAL):
+        self.directory = directory
+        self.default_name = default
+        self.reload_interval = reload_interval
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._next_check = 0.0
+        self._failed_signature = None
+        self._snapshot = self._load()
+
+    def _load(self):
+        files = bank_files(self.directory)
+        if not files:
+            raise BankError(f"No bank files in {self.directory}")
+        signature = _signature(files)
+
+        banks = {}
+        for name, path in files.items():
+            data = read_bank_file(path)
+            validate_bank(data, os.path.basename(path))
+            banks[name] = LoadedBank(name, path, data, compile_bank(data))
+
+        default = self.default_name or next(iter(banks))
+        if default not in banks:
+            raise BankError(f"DEFAULT_BANK {default!r} is not one of {', '.join(banks)}")
+        by_version = {loaded.bank.version: loaded for loaded in banks.values()}
+        return Snapshot(MappingProxyType(banks), MappingProxyType(by_version), default,
+                        signature, time.time())
+
+    # -- reads (one attribute read each, so always from a single snapshot) --
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def get(self, name=None):
+        """LoadedBank by name (the default bank when name is None); KeyError if unknown"""
+        snapshot = self._snapshot
+        return snapshot.banks[name or snapshot.default]
+
+    def by_version(self, version):
+        """LoadedBank currently registered under a version id, or None"""
+        return self._snapshot.by_version.get(version)
+
+    # -- reloads -------------------------------------------------------------
+
+    def add_listener(self, callback):
+        """callback(snapshot) after every successful reload that changed something"""
+        self._listeners.append(callback)
+
+    def reload(self):
+        """
+        Load the directory again and swap the snapshot in.  Returns the new
+        snapshot; raises BankError (keeping the old snapshot) if any file is invalid.
+        """
+        with self._reload_lock:
+            snapshot = self._load()
+            previous, self._snapshot = self._snapshot, snapshot
+        if set(snapshot.by_version) != set(previous.by_version) or snapshot.default != previous.default:
+            for callback in self._listeners:
+                callback(snapshot)
+        return snapshot
+
+    def maybe_reload(self):
+        """Reload if files changed; checks at most once per reload_interval, never raises"""
+        if self.reload_interval <= 0:
+            return
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        signature = None
+        try:
+            signature = _signature(bank_files(self.directory))
+            if signature in (self._snapshot.signature, self._failed_signature):
+                return
+            snapshot = self.reload()
+        except (BankError, OSError) as e:
+            # Reported once per broken state, not on every check
+            self._failed_signature = signature
+            print(f"❌ Question bank reload failed, keeping previous banks: {str(e)}")
+            return
+        print("🔁 Reloaded question banks: " +
+              ', '.join(f"{name}@{loaded.bank.version}" for name, loaded in snapshot.banks.items()))
@@ -0,0 +1,99 @@
+"""
+Benchmark: rebuilding item-analysis counters from stored results
+
+    python benchmarks/bench_item_stats.py [sessions] [--rebuild]
+
+Grades synthetic submissions once, then aggregates their packed results two
+ways: one Outcome at a time (unpack_outcomes + analytics.collect, the
+straightforward loop) and grouped (analytics.group_results, what rebuild()
+uses).  Both must produce identical counters.  With --rebuild the sessions
+are also written to a temporary SQLite file and the full analytics.rebuild()
+is timed, including the keyset reads.
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import analytics  # noqa: E402
+from app import REGISTRY  # noqa: E402
+from scoring import compile_bank, pack_outcomes, unpack_outcomes  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+QUIZ_DATA = REGISTRY.get().data
+
+
+def make_rows(bank, count, seed=42):
+    rng = random.Random(seed)
+    ids = [q.id for q in bank.questions]
+    rows = []
+    for i in range(count):
+        skill = rng.random()
+        order = ids[:]
+        rng.shuffle(order)
+        answers = {}
+        for qid in order:
+            question = bank.source[qid]
+            if rng.random() < 0.1:
+                continue
+            if question.get('type') == 'text_input':
+                answers[str(qid)] = question['correct_answers'][0] if rng.random() < skill else 'n/a'
+            else:
+                answers[str(qid)] = (question['correct'] if rng.random() < skill
+                                     else rng.randrange(len(question['options'])))
+        result = bank.score(order, answers)
+        rows.append({'access_code': f'{i:08d}', 'bank_version': bank.version,
+                     'order': order, 'score': result.score, 'results': pack_outcomes(result)})
+    return rows
+
+
+def per_outcome(rows):
+    return analytics.collect((row['bank_version'], unpack_outcomes(row['results'])) for row in rows)
+
+
+def grouped(rows):
+    outcomes, sessions = Counter(), Counter()
+    analytics.group_results(rows, outcomes, sessions)
+    return analytics._reduce(outcomes, sessions)
+
+
+def timed(label, function, *args):
+    started = time.perf_counter()
+    value = function(*args)
+    print(f"{label:<28} {time.perf_counter() - started:8.3f} s")
+    return value
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    count = int(args[0]) if args else 200000
+    bank = compile_bank(QUIZ_DATA)
+
+    rows = timed(f'grade {count} sessions', make_rows, bank, count)
+    expected = timed('aggregate per outcome', per_outcome, rows)
+    assert timed('aggregate grouped', grouped, rows) == expected, 'aggregations disagree'
+
+    if '--rebuild' in sys.argv:
+        with tempfile.TemporaryDirectory() as directory:
+            store = SQLiteStorage(os.path.join(directory, 'bench.db'))
+            store.init_schema(bank, QUIZ_DATA)
+            with store.transaction() as tx:
+                now = datetime.now()
+                tx.insert_sessions([(row['access_code'], now, bank.version, row['order'], len(row['order']))
+                                    for row in rows])
+                tx.set_scores([(row['access_code'], row['score'], len(row['order']), row['results'])
+                               for row in rows])
+            report = timed('rebuild (sqlite)', analytics.rebuild, store)
+            print(report)
+            with store.transaction(write=False) as tx:
+                assert tx.item_stats(bank.version) == expected, 'rebuild disagrees'
+
+
+if __name__ == '__main__':
+    main()
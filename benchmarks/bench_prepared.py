@@ -0,0 +1,122 @@
+"""
+Prepared vs. plain statements for the hot Postgres queries
+
+    DATABASE_URL=postgres://... python benchmarks/bench_prepared.py [--calls 2000] [--sessions 200]
+
+Creates --sessions sessions, then for each of the two hottest request paths
+times --calls calls through the storage layer, once sending the statement
+text every time (DB_PREPARE=0) and once through the per-connection prepared
+statements of storage/queries.py:
+
+    submit_answer    one transaction with a single-answer upsert_answers()
+    quiz_interface   one read transaction with fetch_session() (a cache miss)
+
+It also reports the server-side planning time of each statement from
+EXPLAIN (ANALYZE, SUMMARY), for the plain text and for EXECUTE of the
+prepared statement, which after a few executions runs on a cached plan.
+The benchmark sessions are deleted again afterwards.  Prints one JSON report.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+if not os.environ.get('DATABASE_URL', '').startswith(('postgres://', 'postgresql://')):
+    sys.exit('bench_prepared.py needs DATABASE_URL pointing at a Postgres database')
+
+import app  # noqa: E402
+from storage import queries  # noqa: E402
+
+
+def latencies(label, calls, function):
+    samples = []
+    for i in range(calls):
+        started = time.perf_counter()
+        function(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'path': label,
+        'calls': calls,
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'p50_ms': round(samples[len(samples) // 2], 3),
+        'p95_ms': round(samples[int(len(samples) * 0.95)], 3),
+    }
+
+
+def planning_ms(tx, query, params, prepared):
+    """Median planning time of a statement over a few EXPLAIN ANALYZE runs (rolled back)"""
+    sql = query.execute_sql if prepared else query.sql
+    times = []
+    for _ in range(7):
+        tx.cur.execute("SAVEPOINT bench")
+        tx.cur.execute(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {sql}", params)
+        times.append(tx.cur.fetchone()['QUERY PLAN'][0]['Planning Time'])
+        tx.cur.execute("ROLLBACK TO SAVEPOINT bench")
+    return round(statistics.median(times), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=200)
+    options = parser.parse_args()
+
+    bank = app.REGISTRY.get().bank
+    question_id = bank.questions[0].id
+    codes = app.create_sessions(options.sessions, bank)
+
+    def submit_answer(i):
+        with app.STORE.transaction() as tx:
+            tx.upsert_answers(codes[i % len(codes)], {question_id: (0, time.time_ns())}, datetime.now())
+
+    def quiz_interface(i):
+        with app.STORE.transaction(write=False) as tx:
+            tx.fetch_session(codes[i % len(codes)])
+
+    report = {'calls': [], 'planning_ms': []}
+    try:
+        for prepared in (False, True):
+            queries.DB_PREPARE = prepared
+            mode = 'prepared' if prepared else 'plain'
+            # Warm the pool (and, when preparing, every pooled connection)
+            latencies(mode, min(options.calls, 200), submit_answer)
+            latencies(mode, min(options.calls, 200), quiz_interface)
+            for label, function in (('submit_answer', submit_answer), ('quiz_interface', quiz_interface)):
+                report['calls'].append(dict(latencies(label, options.calls, function), mode=mode))
+
+        now = datetime.now()
+        statements = (
+            (queries.SESSION_BY_CODE, (codes[0],)),
+            (queries.SESSION_IS_OPEN, (codes[0],)),
+            (queries.UPSERT_ANSWERS, ([codes[0]], [question_id], ['0'], [now], [10 ** 9])),
+            (queries.ACTIVE_SESSIONS, (now.replace(hour=0), 500)),
+        )
+        with app.STORE.transaction() as tx:
+            for query, params in statements:
+                # Prepared on this connection, and past the custom-plan phase
+                for _ in range(6):
+                    queries.execute(tx.cur, query, params)
+                    tx.cur.fetchall()
+                report['planning_ms'].append({
+                    'statement': query.name,
+                    'plain': planning_ms(tx, query, params, prepared=False),
+                    'prepared': planning_ms(tx, query, params, prepared=True),
+                })
+    finally:
+        with app.STORE.transaction() as tx:
+            tx.cur.execute("DELETE FROM quiz_answers WHERE access_code = ANY(%s)", (codes,))
+            tx.cur.execute("DELETE FROM quiz_sessions WHERE access_code = ANY(%s)", (codes,))
+            tx.cur.execute("DELETE FROM session_codes WHERE access_code = ANY(%s)", (codes,))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
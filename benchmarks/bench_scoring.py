@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: per-submission scoring cost, legacy loop vs compiled bank
+
+    python benchmarks/bench_scoring.py [submissions]
+
+The legacy implementation below is the pre-compilation submit_quiz loop
+(lower-casing and re.sub on the answer and every accepted answer per call),
+kept here only as the baseline.
+"""
+
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import REGISTRY  # noqa: E402
+from scoring import compile_bank  # noqa: E402
+
+QUIZ_DATA = REGISTRY.get().data
+
+
+def legacy_check_text_answer(user_answer, correct_answers):
+    if not user_answer:
+        return False
+    user_answer = str(user_answer).strip().lower()
+    for correct in correct_answers:
+        correct = str(correct).strip().lower()
+        if user_answer == correct:
+            return True
+        user_clean = re.sub(r'[%\s]', '', user_answer)
+        correct_clean = re.sub(r'[%\s]', '', correct)
+        if user_clean == correct_clean:
+            return True
+    return False
+
+
+def legacy_score(questions, answers):
+    score = 0
+    for question in questions:
+        question_id = str(question['id'])
+        if question_id in answers:
+            user_answer = answers[question_id]
+            if question.get('type') == 'text_input':
+                if legacy_check_text_answer(user_answer, question.get('correct_answers', [])):
+                    score += 1
+            elif user_answer == question['correct']:
+                score += 1
+    return score
+
+
+def make_submissions(count, seed=42):
+    rng = random.Random(seed)
+    text_pool = ['0.5', '50 %', ' 50% ', '0.25', 'fifty', '']
+    submissions = []
+    for _ in range(count):
+        questions = QUIZ_DATA['questions'][:]
+        rng.shuffle(questions)
+        answers = {}
+        for question in questions:
+            if rng.random() < 0.1:
+                continue
+            if question['type'] == 'text_input':
+                answers[str(question['id'])] = rng.choice(text_pool)
+            else:
+                answers[str(question['id'])] = rng.randrange(len(question['options']))
+        submissions.append((questions, answers))
+    return submissions
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    submissions = make_submissions(count)
+    bank = compile_bank(QUIZ_DATA)
+
+    # Both implementations must agree before timing means anything
+    for questions, answers in submissions:
+        assert legacy_score(questions, answers) == bank.score(questions, answers).score
+
+    def run_legacy():
+        for questions, answers in submissions:
+            legacy_score(questions, answers)
+
+    def run_compiled():
+        for questions, answers in submissions:
+            bank.score(questions, answers)
+
+    ordered_ids = [([q['id'] for q in questions], answers) for questions, answers in submissions]
+
+    def run_compiled_ids():
+        for question_ids, answers in ordered_ids:
+            bank.score(question_ids, answers)
+
+    compile_cost = min(timeit.repeat(lambda: compile_bank(QUIZ_DATA), number=100, repeat=3)) / 100
+    legacy = min(timeit.repeat(run_legacy, number=5, repeat=5)) / (5 * count)
+    compiled = min(timeit.repeat(run_compiled, number=5, repeat=5)) / (5 * count)
+    compiled_ids = min(timeit.repeat(run_compiled_ids, number=5, repeat=5)) / (5 * count)
+
+    print(f"submissions:           {count} x {len(QUIZ_DATA['questions'])} questions")
+    print(f"compile_bank (once):   {compile_cost * 1e6:8.1f} us")
+    print(f"legacy per submission: {legacy * 1e6:8.1f} us")
+    print(f"compiled, dict order:  {compiled * 1e6:8.1f} us  ({legacy / compiled:.2f}x)")
+    print(f"compiled, id order:    {compiled_ids * 1e6:8.1f} us  ({legacy / compiled_ids:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Slow clients vs. fast requests under sync and gevent workers
+
+Starts gunicorn (using gunicorn.conf.py) once per worker class, opens
+SLOW_CLIENTS connections that trickle a POST body a few bytes at a time, and
+meanwhile times FAST_REQUESTS ordinary /submit_answer calls.  With sync
+workers the trickling clients pin every worker and fast calls queue or time
+out; with gevent they should stay in the low milliseconds.
+
+    python benchmarks/bench_slow_clients.py [--slow 20] [--fast 50] [--workers 2]
+
+Runs against DATABASE_URL, or without one against a fresh embedded SQLite
+file.  BENCH1 is not a session, so each /submit_answer is one session
+lookup and an "invalid session" reply, which still measures the serving
+layer.  Prints one JSON report.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BODY = json.dumps({'access_code': 'BENCH1', 'question_id': 1, 'answer': 0}).encode()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+
+def slow_client(port, seconds, stop):
+    """Send headers, then one byte of body at a time until `seconds` elapse"""
+    try:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=seconds + 5)
+        sock.sendall(
+            b"POST /submit_answer HTTP/1.1\r\nHost: localhost\r\n"
+            b"Content-Type: application/json\r\n"
+            + f"Content-Length: {len(BODY)}\r\n\r\n".encode()
+        )
+        interval = seconds / len(BODY)
+        for byte in BODY:
+            if stop.is_set():
+                break
+            sock.sendall(bytes([byte]))
+            time.sleep(interval)
+        sock.close()
+    except OSError:
+        pass
+
+
+def fast_request(port, timeout):
+    started = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request('POST', '/submit_answer', BODY, {'Content-Type': 'application/json'})
+        conn.getresponse().read()
+        return time.perf_counter() - started
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+def run(worker_class, args):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(args.workers), GUNICORN_TIMEOUT=str(args.slow_seconds + 30))
+    if not env.get('DATABASE_URL'):
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='quiz-bench-'), 'quiz.db')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    stop = threading.Event()
+    try:
+        wait_until_up(port)
+        fast_request(port, 5)   # warm up workers
+
+        slow = [threading.Thread(target=slow_client, args=(port, args.slow_seconds, stop), daemon=True)
+                for _ in range(args.slow)]
+        for thread in slow:
+            thread.start()
+        time.sleep(0.5)         # let the slow clients occupy the workers
+
+        latencies = []
+        timeouts = 0
+        for _ in range(args.fast):
+            elapsed = fast_request(port, args.fast_timeout)
+            if elapsed is None:
+                timeouts += 1
+            else:
+                latencies.append(elapsed)
+    finally:
+        stop.set()
+        server.terminate()
+        server.wait(timeout=10)
+
+    latencies.sort()
+    report = {'worker_class': worker_class, 'fast_requests': args.fast, 'timeouts': timeouts}
+    if latencies:
+        report.update({
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0] * 1000, 2),
+            'max_ms': round(latencies[-1] * 1000, 2),
+        })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--slow', type=int, default=20, help='number of trickling clients')
+    parser.add_argument('--slow-seconds', type=int, default=10, help='how long each slow body takes')
+    parser.add_argument('--fast', type=int, default=50, help='number of timed fast requests')
+    parser.add_argument('--fast-timeout', type=float, default=2.0, help='seconds before a fast call counts as timed out')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--worker-class', action='append', choices=['sync', 'gevent'],
+                        help='repeatable; defaults to both')
+    args = parser.parse_args()
+
+    results = [run(worker_class, args) for worker_class in (args.worker_class or ['sync', 'gevent'])]
+    print(json.dumps({'slow_clients': args.slow, 'workers': args.workers, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""
+Load test of the full candidate flow
+
+Simulates N candidates, each doing
+    POST /start_quiz -> GET /quiz/<code> -> GET question bank
+    -> answer every question with think time (batched or one request each)
+    -> POST /submit_quiz
+while A admins poll /admin.  Reports throughput, p50/p95/p99 latency per
+route and database round trips per candidate (read from /metrics), as JSON,
+so runs of different versions can be compared with --compare.
+
+Against a running server:
+    python benchmarks/loadtest.py --base-url http://localhost:5000 -n 200
+
+Or let the script start gunicorn (gunicorn.conf.py) on a throwaway database;
+without DATABASE_URL it uses a fresh embedded SQLite file:
+    DATABASE_URL=postgres://localhost/quiz_bench \\
+        python benchmarks/loadtest.py --serve --worker-class gevent -n 500
+    python benchmarks/loadtest.py --serve -n 200
+
+Round-trip counts come from the scraped worker only, so they are exact with
+one worker (the --serve default) and a sample otherwise.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CANDIDATE_ROUTES = ('/start_quiz', '/quiz/<access_code>', '/quiz_bank/<version>.json',
+                    '/submit_answer', '/submit_answers', '/submit_quiz')
+
+
+class Recorder:
+    """Thread-safe latency samples per route label"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.completed = 0
+
+    def add(self, route, seconds, ok):
+        with self._lock:
+            self.samples[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def candidate_done(self):
+        with self._lock:
+            self.completed += 1
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            routes[route] = {
+                'requests': len(samples),
+                'errors': self.errors[route],
+                'rps': round(len(samples) / elapsed, 2),
+                'mean_ms': round(sum(samples) / len(samples) * 1000, 2),
+                'p50_ms': percentile(samples, 50),
+                'p95_ms': percentile(samples, 95),
+                'p99_ms': percentile(samples, 99),
+                'max_ms': round(samples[-1] * 1000, 2),
+            }
+        return routes
+
+
+def percentile(ordered, pct):
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return round(ordered[index] * 1000, 2)
+
+
+class Client:
+    """One keep-alive HTTP connection, like a browser tab"""
+
+    def __init__(self, base_url, recorder, timeout):
+        url = urllib.parse.urlsplit(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.recorder = recorder
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, label, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        started = time.perf_counter()
+        status, data = 0, b''
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            status, data = response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+        elapsed = time.perf_counter() - started
+
+        ok = 200 <= status < 400
+        if ok and data[:1] == b'{':
+            data = json.loads(data)
+            ok = data.get('success', True) is not False
+        self.recorder.add(label, elapsed, ok)
+        return ok, data
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def answer_for(question):
+    if question.get('type') == 'text_input':
+        return random.choice(['answer', 'none', 'list'])
+    return random.randrange(len(question['options']))
+
+
+def candidate(args, recorder):
+    client = Client(args.base_url, recorder, args.timeout)
+    try:
+        ok, data = client.request('/start_quiz', 'POST', '/start_quiz', {})
+        if not ok:
+            return
+        code = data['access_code']
+
+        ok, page = client.request('/quiz/<access_code>', 'GET', f'/quiz/{code}')
+        if not ok:
+            return
+        match = re.search(rb'"(/quiz_bank/[^"]+\.json)"', page)
+        ok, bank = client.request('/quiz_bank/<version>.json', 'GET', match.group(1).decode())
+        if not ok:
+            return
+        order = json.loads(re.search(rb'const questionOrder = (\[[^\]]*\]);', page).group(1))
+        by_id = {question['id']: question for question in bank['questions']}
+
+        pending = []
+        for seq, question_id in enumerate(order, 1):
+            time.sleep(random.uniform(0.5, 1.5) * args.think_time)
+            answer = answer_for(by_id[question_id])
+            if args.answer_mode == 'single':
+                client.request('/submit_answer', 'POST', '/submit_answer',
+                               {'access_code': code, 'question_id': question_id, 'answer': answer})
+                continue
+            pending.append({'question_id': question_id, 'answer': answer, 'seq': seq})
+            if len(pending) >= args.flush_every:
+                client.request('/submit_answers', 'POST', '/submit_answers',
+                               {'access_code': code, 'answers': pending})
+                pending = []
+        if pending:
+            client.request('/submit_answers', 'POST', '/submit_answers',
+                           {'access_code': code, 'answers': pending})
+
+        ok, _ = client.request('/submit_quiz', 'POST', '/submit_quiz', {'access_code': code})
+        if ok:
+            recorder.candidate_done()
+    finally:
+        client.close()
+
+
+def admin(args, recorder, stop):
+    client = Client(args.base_url, recorder, args.timeout)
+    while not stop.wait(args.admin_interval):
+        client.request('/admin', 'GET', '/admin')
+    client.close()
+
+
+def scrape_db_round_trips(base_url):
+    """Sum of quiz_db_queries_per_request_sum per route from /metrics"""
+    url = urllib.parse.urlsplit(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=10)
+    try:
+        conn.request('GET', '/metrics')
+        text = conn.getresponse().read().decode()
+    except (OSError, http.client.HTTPException):
+        return {}
+    finally:
+        conn.close()
+    totals = {}
+    for match in re.finditer(r'^quiz_db_queries_per_request_sum\{route="([^"]+)"\} (\S+)$', text, re.M):
+        totals[match.group(1)] = float(match.group(2))
+    return totals
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), GUNICORN_WORKER_CLASS=args.worker_class,
+               WEB_CONCURRENCY=str(args.workers))
+    if not env.get('DATABASE_URL'):
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='quiz-bench-'), 'quiz.db')
+    args.database = env['DATABASE_URL'].split(':', 1)[0]
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return server, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit("gunicorn did not start")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    recorder = Recorder()
+    before = scrape_db_round_trips(args.base_url)
+
+    stop = threading.Event()
+    admins = [threading.Thread(target=admin, args=(args, recorder, stop), daemon=True)
+              for _ in range(args.admins)]
+    for thread in admins:
+        thread.start()
+
+    started = time.perf_counter()
+    candidates = []
+    for _ in range(args.candidates):
+        thread = threading.Thread(target=candidate, args=(args, recorder), daemon=True)
+        thread.start()
+        candidates.append(thread)
+        if args.ramp:
+            time.sleep(args.ramp / args.candidates)
+    for thread in candidates:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in admins:
+        thread.join()
+
+    after = scrape_db_round_trips(args.base_url)
+    round_trips = {route: after.get(route, 0) - before.get(route, 0) for route in CANDIDATE_ROUTES}
+    completed = recorder.completed
+
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'elapsed_seconds': round(elapsed, 2),
+        'candidates_completed': completed,
+        'candidates_per_second': round(completed / elapsed, 3),
+        'requests_per_second': round(sum(len(s) for s in recorder.samples.values()) / elapsed, 2),
+        'db_round_trips_per_candidate': round(sum(round_trips.values()) / completed, 2) if completed else None,
+        'db_round_trips_by_route': round_trips,
+        'routes': recorder.summary(elapsed),
+    }
+
+
+def compare(report, baseline):
+    """p95 and throughput change against a previous report"""
+    lines = [f"vs {baseline.get('git_revision')} ({baseline.get('generated_at')})"]
+    for route, stats in report['routes'].items():
+        old = baseline.get('routes', {}).get(route)
+        if old and old['p95_ms']:
+            change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+            lines.append(f"  {route:28s} p95 {old['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms ({change:+.1f}%)")
+    old_rate, new_rate = baseline.get('candidates_per_second'), report['candidates_per_second']
+    lines.append(f"  candidates/s {old_rate} -> {new_rate}")
+    lines.append(f"  db round trips/candidate {baseline.get('db_round_trips_per_candidate')}"
+                 f" -> {report['db_round_trips_per_candidate']}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the candidate flow')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--base-url', help='server to test, e.g. http://localhost:5000')
+    target.add_argument('--serve', action='store_true',
+                        help='start gunicorn against DATABASE_URL (default: a fresh SQLite file)')
+    parser.add_argument('--worker-class', choices=['sync', 'gevent'], default='sync')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('-n', '--candidates', type=int, default=100)
+    parser.add_argument('--ramp', type=float, default=10.0, help='seconds over which candidates start')
+    parser.add_argument('--think-time', type=float, default=1.0, help='mean seconds per question')
+    parser.add_argument('--answer-mode', choices=['batch', 'single'], default='batch',
+                        help='POST /submit_answers in batches or /submit_answer per question')
+    parser.add_argument('--flush-every', type=int, default=3, help='answers per batch in batch mode')
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--admin-interval', type=float, default=5.0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    parser.add_argument('--compare', help='previous JSON report to compare against')
+    args = parser.parse_args()
+
+    server = None
+    if args.serve:
+        server, args.base_url = start_server(args)
+    try:
+        report = run(args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Live session events for the admin dashboard (server-sent events)
+
+Routes publish small events (started, answered, completed, expired) with
+pg_notify inside their own transaction, so an event is only delivered once
+the change is committed.  Every worker that has an admin watching runs one
+LISTEN thread on a dedicated connection; it seeds an in-memory view of the
+active sessions from the database once, then keeps it current from the
+notifications.  Admin clients receive that view as a snapshot on connect
+and incremental events afterwards, without re-querying quiz_sessions.
+
+Embedded storage backends have no LISTEN/NOTIFY; the hub is then given a
+local_seed function and fed by the backend's in-process event delivery.
+
+Streams are capped at SSE_MAX_STREAM_SECONDS and the browser reconnects.
+A server that handles one request per process at a time (gunicorn's sync
+worker) would be held by every open stream, so there each request gets just
+the current snapshot and the browser polls again every SSE_POLL_SECONDS.
+"""
+
+import json
+import os
+import queue
+import select
+import threading
+import time
+from datetime import datetime
+
+from psycopg2 import extensions
+
+from db import connect
+
+CHANNEL = 'quiz_events'
+
+# pg_notify payloads are limited to 8000 bytes; bulk starts are split
+MAX_CODES_PER_NOTIFY = 500
+
+SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', 25))
+SSE_HEARTBEAT_SECONDS = min(15, SSE_MAX_STREAM_SECONDS)
+SSE_POLL_SECONDS = int(os.environ.get('SSE_POLL_SECONDS', 5))
+
+
+def publish(cur, event):
+    """Queue an event on the caller's transaction; delivered on commit"""
+    if 'codes' in event and len(event['codes']) > MAX_CODES_PER_NOTIFY:
+        codes = event['codes']
+        for i in range(0, len(codes), MAX_CODES_PER_NOTIFY):
+            publish(cur, dict(event, codes=codes[i:i + MAX_CODES_PER_NOTIFY]))
+        return
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, json.dumps(event)))
+
+
+def _epoch(value):
+    return value.timestamp() if isinstance(value, datetime) else value
+
+
+class SessionEventHub:
+    """In-memory aggregate of active sessions plus fan-out to SSE subscribers"""
+
+    def __init__(self, bank_limits, local_seed=None):
+        self.bank_limits = bank_limits  # callable: bank_version -> (time limit, question count)
+        self.local_seed = local_seed   # callable returning active session rows (no LISTEN)
+        self._lock = threading.Lock()
+        self._active = {}          # access_code -> {'start_time', 'answered', 'time_limit', 'total'}
+        self._subscribers = set()
+        self._listener = None
+        self._listener_pid = None
+        self.completed_since_start = 0
+
+    # -- subscribers -----------------------------------------------------
+
+    def subscribe(self):
+        """Register a client; returns its queue, pre-filled with a snapshot"""
+        self._ensure_listener()
+        client = queue.Queue(maxsize=1000)
+        with self._lock:
+            client.put(('snapshot', self._snapshot_locked()))
+            self._subscribers.add(client)
+        return client
+
+    def snapshot(self):
+        """The current view, for clients that poll instead of subscribing"""
+        self._ensure_listener()
+        with self._lock:
+            return self._snapshot_locked()
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._subscribers.discard(client)
+
+    def _broadcast_locked(self, name, data):
+        for client in list(self._subscribers):
+            try:
+                client.put_nowait((name, data))
+            except queue.Full:
+                # A stalled client is dropped; it gets a fresh snapshot on reconnect
+                self._subscribers.discard(client)
+
+    def _snapshot_locked(self):
+        return {
+            'server_time': time.time(),
+            'completed_since_start': self.completed_since_start,
+            'sessions': [
+                dict(info, access_code=code)
+                for code, info in sorted(self._active.items(), key=lambda item: -item[1]['start_time'])
+            ],
+        }
+
+    # -- aggregate updates -------------------------------------------------
+
+    def apply(self, event):
+        """Fold one published event into the aggregate and forward it to clients"""
+        kind = event.get('type')
+        with self._lock:
+            if kind == 'started':
+                info = {'start_time': _epoch(event['start_time']), 'answered': 0,
+                        'time_limit': event['time_limit'], 'total': event['total']}
+                for code in event['codes']:
+                    self._active[code] = dict(info)
+                self._broadcast_locked('started', {
+                    'sessions': [dict(info, access_code=code) for code in event['codes']]
+                })
+
+            elif kind == 'answered':
+                info = self._active.get(event['access_code'])
+                if info is None:
+                    return
+                if info['answered'] != event['answered']:
+                    info['answered'] = event['answered']
+                    self._broadcast_locked('answered', {
+                        'access_code': event['access_code'],
+                        'answered': event['answered']
+                    })
+
+            elif kind == 'completed':
+                self._active.pop(event['access_code'], None)
+                self.completed_since_start += 1
+                self._broadcast_locked('completed', event)
+
+            elif kind == 'expired':
+                for code in event['codes']:
+                    self._active.pop(code, None)
+                self._broadcast_locked('expired', {'codes': event['codes']})
+
+    def expire_overdue(self):
+        """Drop sessions past their time limit from the view (no database write)"""
+        now = time.time()
+        with self._lock:
+            overdue = [code for code, info in self._active.items()
+                       if info['start_time'] + info['time_limit'] < now]
+            if overdue:
+                for code in overdue:
+                    del self._active[code]
+                self._broadcast_locked('expired', {'codes': overdue})
+
+    def _seed(self, conn):
+        """Load the current active sessions; called after LISTEN so nothing is missed"""
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT access_code, start_time, answered_count, bank_version, total_questions
+            FROM quiz_sessions
+            WHERE completed = FALSE
+            ORDER BY start_time DESC
+            LIMIT 100000
+        """)
+        rows = cur.fetchall()
+        cur.close()
+        self._load(rows)
+
+    def _load(self, rows):
+        """Replace the view with session rows, skipping those already past their own limit"""
+        now = time.time()
+        active = {}
+        limits = {}
+        for row in rows:
+            version = row['bank_version']
+            if version not in limits:
+                limits[version] = self.bank_limits(version)
+            time_limit, total = limits[version]
+            start_time = _epoch(row['start_time'])
+            if start_time + time_limit > now:
+                active[row['access_code']] = {'start_time': start_time, 'answered': row['answered_count'],
+                                              'time_limit': time_limit,
+                                              'total': row['total_questions'] or total}
+        with self._lock:
+            self._active = active
+            self._broadcast_locked('snapshot', self._snapshot_locked())
+
+    # -- LISTEN thread -----------------------------------------------------
+
+    def _ensure_listener(self):
+        pid = os.getpid()
+        if self.local_seed is not None:
+            if self._listener_pid != pid:
+                self._listener_pid = pid
+                self._load(self.local_seed())
+            self.expire_overdue()
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive() and self._listener_pid == pid:
+                return
+            self._listener = threading.Thread(target=self._listen_forever, name='quiz-events', daemon=True)
+            self._listener_pid = pid
+            self._listener.start()
+
+    def _listen_forever(self):
+        while True:
+            conn = None
+            try:
+                conn = connect()
+                if conn is None:
+                    return
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {CHANNEL}")
+                cur.close()
+                self._seed(conn)
+                print(f"📡 Listening for {CHANNEL} events")
+
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        self.expire_overdue()
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.apply(json.loads(notify.payload))
+            except Exception as e:
+                print(f"❌ Event listener error, reconnecting: {str(e)}")
+                time.sleep(2)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+def sse_snapshot(hub):
+    """A single-event text/event-stream body; the browser reconnects after SSE_POLL_SECONDS"""
+    data = dict(hub.snapshot(), poll_seconds=SSE_POLL_SECONDS)
+    return f"retry: {SSE_POLL_SECONDS * 1000}\n\nevent: snapshot\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_stream(hub):
+    """Generator of text/event-stream chunks for one admin client"""
+    client = hub.subscribe()
+    deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+    try:
+        yield 'retry: 3000\n\n'
+        while time.monotonic() < deadline:
+            try:
+                name, data = client.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            yield f"event: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+    finally:
+        hub.unsubscribe(client)
@@ -0,0 +1,129 @@
+"""
+Streaming export of completed sessions (CSV or JSON lines)
+
+Rows come from Transaction.export_completed(), which walks a server-side
+cursor (Postgres) or a lazily stepped SQLite cursor, so memory stays flat
+however many sessions match.  The header (or nothing, for JSONL) goes out
+before the query runs, and rows are formatted and optionally gzipped one
+chunk at a time.
+
+    GET /admin/export/csv?from=2026-01-01&to=2026-01-31&min_score=15
+    flask export-sessions --format jsonl --from 2026-01-01 --gzip -o january.jsonl.gz
+
+A browser download holds a pooled connection for its whole duration.  With
+sync gunicorn workers a download must also finish within GUNICORN_TIMEOUT;
+use gevent workers or the CLI for very large exports.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+EXPORT_CHUNK_ROWS = 1000
+
+FIELDS = ('access_code', 'start_time', 'end_time', 'duration_seconds', 'score',
+          'total_questions', 'percentage', 'answered_count', 'bank_version')
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+
+def parse_moment(value, end=False):
+    """ISO date or datetime; with end=True a bare date means the end of that day"""
+    moment = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment
+
+
+def parse_filters(values):
+    """
+    Export filters from request args / CLI options: from, to (ISO dates or
+    datetimes; a bare 'to' date includes that whole day), min_score,
+    max_score.  Raises ValueError for malformed values.
+    """
+    filters = {}
+    for key, name in (('start_from', 'from'), ('start_to', 'to')):
+        if values.get(name):
+            filters[key] = parse_moment(values[name], end=(name == 'to'))
+    for key in ('min_score', 'max_score'):
+        value = values.get(key)
+        if value not in (None, ''):
+            filters[key] = int(value)
+    return filters
+
+
+def _record(row):
+    start_time, end_time = row['start_time'], row['end_time']
+    total = row['total_questions'] or 0
+    return {
+        'access_code': row['access_code'],
+        'start_time': start_time.isoformat(sep=' ', timespec='seconds') if start_time else None,
+        'end_time': end_time.isoformat(sep=' ', timespec='seconds') if end_time else None,
+        'duration_seconds': int((end_time - start_time).total_seconds()) if start_time and end_time else None,
+        'score': row['score'],
+        'total_questions': total,
+        'percentage': round(row['score'] / total * 100, 1) if total and row['score'] is not None else 0,
+        'answered_count': row['answered_count'],
+        'bank_version': row['bank_version'],
+    }
+
+
+def export_rows(store, filters, chunk_size=EXPORT_CHUNK_ROWS):
+    """Export records one at a time, inside one read transaction"""
+    with store.transaction(write=False) as tx:
+        for row in tx.export_completed(filters, chunk_size):
+            yield _record(row)
+
+
+def csv_chunks(records, chunk_rows=EXPORT_CHUNK_ROWS):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=FIELDS)
+    writer.writeheader()
+    # The header goes out before the first row is fetched
+    yield out.getvalue()
+    out.seek(0)
+    out.truncate()
+
+    count = 0
+    for record in records:
+        writer.writerow(record)
+        count += 1
+        if count % chunk_rows == 0:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue()
+
+
+def jsonl_chunks(records, chunk_rows=EXPORT_CHUNK_ROWS):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, separators=(',', ':')))
+        if len(lines) == chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks; each chunk is flushed so the client sees progress"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def stream(store, output_format, filters, compress=False):
+    """Encoded chunks (bytes) of a complete export"""
+    records = export_rows(store, filters)
+    chunks = csv_chunks(records) if output_format == 'csv' else jsonl_chunks(records)
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
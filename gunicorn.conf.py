@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration (loaded automatically from the working directory)
+
+Two supported serving modes, picked with GUNICORN_WORKER_CLASS:
+
+gevent (default)
+    Each worker multiplexes up to GEVENT_WORKER_CONNECTIONS greenlets.  Socket
+    I/O, the connection pool's locks and psycopg2 (via psycogreen) all yield to
+    other greenlets, so slow clients and the admin event streams cost almost
+    nothing.  Size:  WEB_CONCURRENCY = 1-2 per CPU core, DB_POOL_SIZE = 10-20;
+    requests beyond DB_POOL_SIZE wait cooperatively for a connection for up
+    to DB_POOL_TIMEOUT seconds, so the pool (not the worker count) is what
+    bounds load on Postgres.  SSE_MAX_STREAM_SECONDS can be raised freely.
+
+sync
+    One request per worker process at a time.  A slow client (mobile upload)
+    occupies a whole worker until it finishes; the admin dashboard polls a
+    snapshot every SSE_POLL_SECONDS instead of holding an event stream open.
+    Size:  WEB_CONCURRENCY = 2-4 per CPU core, DB_POOL_SIZE = 1-2.
+
+Either way keep  WEB_CONCURRENCY x DB_POOL_SIZE  (+1 per worker with an admin
+event listener, +1 per worker running the sweeper) below Postgres
+max_connections across all dynos.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = 5
+
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GEVENT_WORKER_CONNECTIONS', 1000))
+
+
+def post_fork(server, worker):
+    """Make psycopg2 cooperate with gevent before the app opens any connection"""
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+        server.log.info("psycopg2 patched for gevent in worker %s", worker.pid)
@@ -0,0 +1,78 @@
+"""
+Searchable history of completed sessions for the admin
+
+Results are ordered by when a session finished (end_time, or start_time
+for rows without one), newest first, and paginated by keyset: each page
+carries an opaque cursor holding the last row's (finished_at, access_code),
+and the next page asks for rows strictly below it.  With the matching
+index (idx_quiz_sessions_history) every page is a short index range scan,
+so page 5000 costs the same as page 1; there is no OFFSET to skip over.
+
+    GET /admin/history?from=2026-01-01&to=2026-01-31&min_score=15&code=AB
+    GET /admin/history?...&cursor=<next_cursor from the previous page>
+"""
+
+import base64
+import re
+from datetime import datetime
+
+from export import parse_moment
+
+HISTORY_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_CODE_PREFIX = re.compile(r'^[A-Z0-9]{1,10}$')
+
+
+def parse_search(values):
+    """
+    History filters from request args: from, to (finish date range; a bare
+    'to' date includes that day), min_score, max_score, code (access-code
+    prefix).  Raises ValueError for malformed values.
+    """
+    filters = {}
+    for key, name in (('finished_from', 'from'), ('finished_to', 'to')):
+        if values.get(name):
+            filters[key] = parse_moment(values[name], end=(name == 'to'))
+    for key in ('min_score', 'max_score'):
+        value = values.get(key)
+        if value not in (None, ''):
+            filters[key] = int(value)
+    prefix = (values.get('code') or '').strip().upper()
+    if prefix:
+        if not _CODE_PREFIX.match(prefix):
+            raise ValueError(f"access code prefix must be letters and digits: {prefix!r}")
+        filters['code_prefix'] = prefix
+    return filters
+
+
+def encode_cursor(row):
+    """Opaque page cursor for the row a page ended on"""
+    key = f"{row['finished_at'].isoformat()}|{row['access_code']}"
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(finished_at, access_code) from encode_cursor(); ValueError if tampered with"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        finished_at, access_code = base64.urlsafe_b64decode(padded).decode('utf-8').split('|')
+        finished_at = datetime.fromisoformat(finished_at)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('invalid page cursor')
+    if not _CODE_PREFIX.match(access_code):
+        raise ValueError('invalid page cursor')
+    return finished_at, access_code
+
+
+def search(store, filters, cursor=None, page_size=HISTORY_PAGE_SIZE):
+    """One page of matching sessions: (rows, cursor of the next page or None)"""
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    with store.transaction(write=False) as tx:
+        # One extra row tells whether another page exists
+        rows = tx.search_completed(filters, after, page_size + 1)
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,83 @@
+"""
+Leveled, sampled structured logs for hot-path events
+
+The per-question and per-answer debug lines used to be unconditional
+print() calls inside the request.  They are now DEBUG events that are off by
+default, sampled when enabled, and written as one JSON object per line by a
+background thread so a slow stdout never stalls a request.  Quiz page loads
+and submissions are logged the same way at DEBUG, unsampled.
+
+Environment:
+    LOG_LEVEL          DEBUG / INFO / WARNING / ERROR (default INFO)
+    LOG_SAMPLE_RATE    fraction of DEBUG events kept, 0.0-1.0 (default 0.01)
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+
+LOG_LEVEL = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+if not isinstance(LOG_LEVEL, int):
+    LOG_LEVEL = logging.INFO
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'event': record.getMessage(),
+            'pid': record.process,
+        }
+        entry.update(getattr(record, 'fields', {}))
+        return json.dumps(entry, default=str)
+
+
+logger = logging.getLogger('quiz')
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+
+_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_queue))
+
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def _ensure_listener():
+    """Start this process's writer thread (threads do not survive gunicorn's fork)"""
+    global _listener, _listener_pid
+    pid = os.getpid()
+    if _listener_pid == pid:
+        return
+    with _listener_lock:
+        if _listener_pid != pid:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(JSONFormatter())
+            _listener = logging.handlers.QueueListener(_queue, handler)
+            _listener.start()
+            _listener_pid = pid
+
+
+def log(level, event, **fields):
+    if logger.isEnabledFor(level):
+        _ensure_listener()
+        logger.log(level, event, extra={'fields': fields})
+
+
+def debug(event, **fields):
+    """DEBUG event, kept for a LOG_SAMPLE_RATE fraction of calls"""
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE:
+        log(logging.DEBUG, event, **fields)
+
+
+def sampled():
+    """True when a group of related DEBUG events (e.g. one quiz's grading) should be logged"""
+    return logger.isEnabledFor(logging.DEBUG) and random.random() < LOG_SAMPLE_RATE
@@ -0,0 +1,201 @@
+"""
+In-process request, database and scoring metrics in Prometheus text format
+
+Every worker keeps its own counters and histograms; /metrics renders the
+ones of the worker that serves the scrape (the pid is exported as
+quiz_worker_info so per-worker series can be told apart).  Recording is a
+bisect and a few additions under a lock, cheap enough for every request.
+
+Collected:
+    quiz_http_request_duration_seconds   per route / method / status
+    quiz_db_query_duration_seconds       every cursor.execute()
+    quiz_db_queries_per_request          round trips per request, per route
+    quiz_db_time_per_request_seconds     total query time per request, per route
+    quiz_db_pool_wait_seconds            time spent waiting for a pooled connection
+    quiz_scoring_duration_seconds        grading time, per caller
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from psycopg2.extras import RealDictCursor
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}          # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            cumulative += values[len(self.buckets)]
+            le = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{plain} {_format_value(float(values[-1]))}")
+            lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    'quiz_http_request_duration_seconds', 'Time to produce a response',
+    ('route', 'method', 'status'))
+DB_QUERY_SECONDS = Histogram(
+    'quiz_db_query_duration_seconds', 'Duration of single database statements',
+    buckets=FAST_BUCKETS + (0.25, 1.0, 5.0))
+DB_QUERIES_PER_REQUEST = Histogram(
+    'quiz_db_queries_per_request', 'Database round trips made by one request',
+    ('route',), buckets=COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram(
+    'quiz_db_time_per_request_seconds', 'Total database time spent by one request', ('route',))
+POOL_WAIT_SECONDS = Histogram(
+    'quiz_db_pool_wait_seconds', 'Time spent waiting to check out a pooled connection',
+    buckets=FAST_BUCKETS + (0.25, 1.0, 2.5, 5.0, 10.0))
+SCORING_SECONDS = Histogram(
+    'quiz_scoring_duration_seconds', 'Time spent grading answers', ('caller',), buckets=FAST_BUCKETS)
+REQUEST_ERRORS = Counter(
+    'quiz_http_request_exceptions_total', 'Requests that raised an unhandled exception', ('route',))
+
+METRICS = (REQUEST_SECONDS, DB_QUERY_SECONDS, DB_QUERIES_PER_REQUEST, DB_TIME_PER_REQUEST,
+           POOL_WAIT_SECONDS, SCORING_SECONDS, REQUEST_ERRORS)
+
+
+# -- per-request database accounting ---------------------------------------
+
+_request = threading.local()
+
+
+def begin_request():
+    _request.queries = 0
+    _request.db_seconds = 0.0
+    _request.started = time.perf_counter()
+
+
+def end_request(route, method, status):
+    """Record the current request's latency and database totals"""
+    started = getattr(_request, 'started', None)
+    if started is None:
+        return
+    REQUEST_SECONDS.observe(time.perf_counter() - started, route, method, str(status))
+    DB_QUERIES_PER_REQUEST.observe(_request.queries, route)
+    DB_TIME_PER_REQUEST.observe(_request.db_seconds, route)
+    _request.started = None
+
+
+def record_query(seconds):
+    DB_QUERY_SECONDS.observe(seconds)
+    if getattr(_request, 'started', None) is not None:
+        _request.queries += 1
+        _request.db_seconds += seconds
+
+
+class TimedCursor(RealDictCursor):
+    """RealDictCursor that reports every statement's duration (execute_values included)"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(time.perf_counter() - started)
+
+
+# -- exposition ------------------------------------------------------------
+
+def render(gauges=()):
+    """Prometheus text exposition; gauges are (name, documentation, [(labels dict, value)])"""
+    lines = [
+        "# HELP quiz_worker_info Worker process serving this scrape",
+        "# TYPE quiz_worker_info gauge",
+        f'quiz_worker_info{{pid="{os.getpid()}"}} 1',
+    ]
+    for metric in METRICS:
+        lines.extend(metric.collect())
+    for name, documentation, values in gauges:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values:
+            lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
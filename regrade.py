@@ -0,0 +1,68 @@
+"""
+Re-grading of completed sessions
+
+Grading is final once a submission commits: the score and the packed
+per-question outcomes are stored with the session and the results page only
+reads them.  When an answer key turns out to be wrong, fix it in the bank
+(which gives it a new version) and run
+
+    flask regrade --from-version <old version>
+
+to grade every session pinned to the old version against the current bank
+and re-pin them to it.  Without --from-version each session is graded again
+against its own bank, which backfills results for sessions completed before
+they were stored (--missing-only limits it to those).
+"""
+
+import time
+
+from cache import SESSION_CACHE
+from scoring import pack_outcomes
+
+
+def regrade(store, resolve_questions, target_bank=None, from_version=None,
+            missing_only=False, batch_size=500):
+    """Re-grade completed sessions in keyset batches; returns a report dict"""
+    started = time.monotonic()
+    report = {'regraded': 0, 'changed': 0, 'skipped': 0, 'batches': 0}
+    last_code = ''
+
+    while True:
+        with store.transaction() as tx:
+            sessions = tx.completed_after(last_code, batch_size, bank_version=from_version,
+                                          missing_results=missing_only)
+            if not sessions:
+                break
+            last_code = sessions[-1]['access_code']
+            answers = tx.fetch_answers_many([session['access_code'] for session in sessions])
+
+            scores = []
+            for session in sessions:
+                if from_version:
+                    # Grade against the target bank, by the session's own question order
+                    order = session['question_order']
+                    if order is None or any(qid not in target_bank.by_id for qid in order):
+                        report['skipped'] += 1
+                        continue
+                    bank, questions = target_bank, order
+                else:
+                    bank, questions = resolve_questions(tx, session)
+
+                session_answers = answers[session['access_code']]
+                result = bank.score(questions, session_answers)
+                scores.append((session['access_code'], result.score, result.total,
+                               pack_outcomes(result, session_answers.answered_at, session['start_time'])))
+                if result.score != session['score']:
+                    report['changed'] += 1
+
+            tx.set_scores(scores)
+            codes = [code for code, _, _, _ in scores]
+            if from_version and codes:
+                tx.set_bank_version(codes, target_bank.version)
+
+        SESSION_CACHE.invalidate(*codes)
+        report['regraded'] += len(scores)
+        report['batches'] += 1
+
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
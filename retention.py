@@ -0,0 +1,100 @@
+"""
+Monthly session partitions and archival of old sessions
+
+On Postgres quiz_sessions is range-partitioned by created_at, one partition
+per month (quiz_sessions_p202610, ...), so old months can be dropped whole
+instead of deleted row by row.  Partitions are created ahead of time: at
+schema setup, and by every worker at most once an hour (before_request),
+PARTITION_MONTHS_AHEAD months past the current one.
+
+    flask archive-sessions --months 6
+
+moves every completed session created before the first day of the month six
+months ago into session_archive: one compact row each (score, packed
+per-question results, bank version and question order; no answers and no
+bank copy), then drops the emptied partitions.  Overdue sessions are expired
+and completed sessions that were never graded are graded first, so only a
+month that still holds a running session is left alone.  Archived sessions
+keep their /results page and their place in the item statistics, but no
+longer show up in the dashboard, history or exports.  SQLite has no
+partitions and moves the same rows in batches.
+
+Environment:
+    ARCHIVE_AFTER_MONTHS    default for --months (0 = no default)
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+import analytics
+import regrade
+import sweeper
+from storage import month_bounds, month_start
+
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', 0))
+PARTITION_CHECK_INTERVAL = 3600
+
+_next_check = 0.0
+_check_lock = threading.Lock()
+
+
+def ensure_partitions(store, now=None):
+    """Create any missing partition from this month to PARTITION_MONTHS_AHEAD months ahead"""
+    with store.transaction() as tx:
+        created = tx.ensure_partitions(month_bounds(now or datetime.now()))
+    for name in created:
+        print(f"🗂️ Created session partition {name}")
+    return created
+
+
+def maybe_ensure_partitions(store):
+    """ensure_partitions() at most once per PARTITION_CHECK_INTERVAL; never raises"""
+    global _next_check
+    if not store.partitioned:
+        return
+    now = time.monotonic()
+    if now < _next_check or not _check_lock.acquire(blocking=False):
+        return
+    try:
+        _next_check = now + PARTITION_CHECK_INTERVAL
+        ensure_partitions(store)
+    except Exception as e:
+        print(f"❌ Partition check failed: {str(e)}")
+    finally:
+        _check_lock.release()
+
+
+def archive(store, time_limits, resolve_questions, months, batch_size=1000, now=None):
+    """Archive completed sessions created before the month `months` months ago; returns a report dict"""
+    started = time.monotonic()
+    cutoff = month_start(now or datetime.now(), -months)
+
+    expired = sweeper.sweep(store, time_limits, resolve_questions)
+    # Sessions expired on page load by earlier releases have no stored results yet
+    graded = regrade.regrade(store, resolve_questions, missing_only=True)
+    report = {'cutoff': cutoff.isoformat(), 'expired': expired['expired'], 'graded': graded['regraded'],
+              'archived': 0, 'held': 0, 'batches': 0}
+    if graded['regraded']:
+        # Their outcomes were never added to the item statistics
+        analytics.rebuild(store)
+
+    while True:
+        with store.transaction() as tx:
+            archived, report['held'] = tx.archive_sessions(cutoff, batch_size)
+        if not archived:
+            break
+        report['archived'] += archived
+        report['batches'] += 1
+
+    with store.transaction(write=False) as tx:
+        report['partitions'] = [
+            {'name': p['name'],
+             'from': p['lower'].date().isoformat() if p['lower'] else None,
+             'to': p['upper'].date().isoformat() if p['upper'] else None,
+             'estimated_rows': p['estimated_rows']}
+            for p in tx.session_partitions()
+        ]
+    report['seconds'] = round(time.monotonic() - started, 3)
+    return report
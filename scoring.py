@@ -0,0 +1,204 @@
+"""
+Compiled question bank and scoring engine
+
+compile_bank() turns the QUIZ_DATA dict into an immutable structure once at
+startup: questions indexed by id, answer keys, and pre-normalized sets of
+accepted text answers.  CompiledBank.score() then grades a submission in a
+single pass of dict / set lookups and is shared by the routes and any bulk
+re-grading job.  pack_outcomes() turns a graded submission into the compact
+form stored with the session, so result pages never grade again.
+"""
+
+import hashlib
+import json
+import re
+from collections import namedtuple
+from types import MappingProxyType
+
+_FORMATTING = re.compile(r'[%\s]')
+
+# Fields safe to ship to candidates (no answer keys or explanations)
+PUBLIC_QUESTION_FIELDS = ('id', 'type', 'question', 'options')
+_MISSING = object()
+
+CompiledQuestion = namedtuple('CompiledQuestion', 'id key type correct accepted')
+Outcome = namedtuple('Outcome', 'question_id answered answer is_correct seconds', defaults=(None,))
+
+# Flag bits in a packed outcome
+_CORRECT = 1
+_ANSWERED = 2
+
+
+class ScoreResult:
+    """Score plus per-question correctness; Outcome objects are built on demand"""
+
+    __slots__ = ('score', 'total', 'question_ids', 'correct', '_answers')
+
+    def __init__(self, score, total, question_ids, correct, answers):
+        self.score = score
+        self.total = total
+        self.question_ids = question_ids
+        self.correct = correct
+        self._answers = answers
+
+    @property
+    def outcomes(self):
+        answers = self._answers
+        return tuple(
+            Outcome(qid, str(qid) in answers, answers.get(str(qid)), ok)
+            for qid, ok in zip(self.question_ids, self.correct)
+        )
+
+
+def normalize_text_answer(value):
+    """Canonical text form: trimmed, lower-case, without % signs or whitespace"""
+    return _FORMATTING.sub('', str(value).strip().lower())
+
+
+def check_text_answer(user_answer, accepted):
+    """True if user_answer matches one of the pre-normalized accepted answers"""
+    if not user_answer:
+        return False
+    return normalize_text_answer(user_answer) in accepted
+
+
+def compile_question(question):
+    """Compile one question dict; text answers become a frozenset of normalized forms"""
+    question_type = question.get('type', 'multiple_choice')
+    if question_type == 'text_input':
+        accepted = frozenset(normalize_text_answer(a) for a in question.get('correct_answers', []))
+        return CompiledQuestion(question['id'], str(question['id']), question_type, None, accepted)
+    return CompiledQuestion(question['id'], str(question['id']), question_type, question['correct'], None)
+
+
+def bank_version(quiz_data):
+    """Content hash identifying a bank; identical content always gets the same id"""
+    canonical = json.dumps(quiz_data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:12]
+
+
+def grade(question, user_answer):
+    """Grade a single answer against a CompiledQuestion"""
+    if question.accepted is not None:
+        return check_text_answer(user_answer, question.accepted)
+    return user_answer == question.correct
+
+
+class CompiledBank:
+    """Immutable, indexed view of a question bank"""
+
+    __slots__ = ('version', 'title', 'description', 'time_limit', 'questions', 'by_id',
+                 'source', '_index')
+
+    def __init__(self, quiz_data):
+        questions = tuple(compile_question(q) for q in quiz_data['questions'])
+        set_ = object.__setattr__
+        set_(self, 'version', bank_version(quiz_data))
+        set_(self, 'title', quiz_data.get('title', ''))
+        set_(self, 'description', quiz_data.get('description', ''))
+        set_(self, 'time_limit', quiz_data.get('time_limit', 0))
+        set_(self, 'questions', questions)
+        index = {q.id: q for q in questions}
+        set_(self, '_index', index)
+        set_(self, 'by_id', MappingProxyType(index))
+        set_(self, 'source', MappingProxyType({q['id']: q for q in quiz_data['questions']}))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CompiledBank is immutable')
+
+    def public_payload(self):
+        """Candidate-facing bank content, with answer keys stripped"""
+        return {
+            'version': self.version,
+            'title': self.title,
+            'description': self.description,
+            'time_limit': self.time_limit,
+            'questions': [
+                {field: q[field] for field in PUBLIC_QUESTION_FIELDS if field in q}
+                for q in self.source.values()
+            ],
+        }
+
+    def ordered(self, question_ids):
+        """Original question dicts in the given (per-session) order"""
+        source = self.source
+        return [source[qid] for qid in question_ids]
+
+    def score(self, questions, answers):
+        """
+        Grade a submission in one pass.
+
+        questions: the session's questions in display order, as ids or dicts
+        answers:   {question_id (str): answer} as stored for the session
+
+        Question dicts that differ from the bank's own copy (e.g. stored
+        from an older bank) are compiled on the fly, so legacy sessions are
+        graded against the answer key they were shown with.
+        """
+        index = self._index
+        source = self.source
+        missing = _MISSING
+        ids = []
+        correct = []
+
+        for question in questions:
+            if question.__class__ is dict:
+                qid = question['id']
+                original = source.get(qid)
+                if original is question or (original is not None and original == question):
+                    compiled = index[qid]
+                else:
+                    compiled = compile_question(question)
+            else:
+                compiled = index[question]
+
+            user_answer = answers.get(compiled.key, missing)
+            if user_answer is missing:
+                is_correct = False
+            elif compiled.accepted is None:
+                is_correct = user_answer == compiled.correct
+            else:
+                is_correct = check_text_answer(user_answer, compiled.accepted)
+            ids.append(compiled.id)
+            correct.append(is_correct)
+
+        return ScoreResult(correct.count(True), len(ids), tuple(ids), tuple(correct), answers)
+
+
+def pack_outcomes(result, answered_at=None, start_time=None):
+    """
+    Compact JSON for a graded submission, in display order:
+
+        [[question_id, answer, flags, seconds], ...]
+
+    flags has bit 0 set for a correct answer and bit 1 for an answered
+    question; seconds is when the answer was last saved, relative to
+    start_time (null when unknown).
+    """
+    answers = result._answers
+    packed = []
+    for qid, ok in zip(result.question_ids, result.correct):
+        key = str(qid)
+        answer = answers.get(key, _MISSING)
+        seconds = None
+        if answer is _MISSING:
+            answer, flags = None, 0
+        else:
+            flags = _ANSWERED | (_CORRECT if ok else 0)
+            if answered_at and start_time and key in answered_at:
+                seconds = int((answered_at[key] - start_time).total_seconds())
+        packed.append([qid, answer, flags, seconds])
+    return json.dumps(packed, separators=(',', ':'))
+
+
+def unpack_outcomes(packed):
+    """Outcome tuples from pack_outcomes() JSON"""
+    return tuple(
+        Outcome(qid, bool(flags & _ANSWERED), answer, bool(flags & _CORRECT), seconds)
+        for qid, answer, flags, seconds in json.loads(packed)
+    )
+
+
+def compile_bank(quiz_data):
+    """Compile a QUIZ_DATA-style dict once into an immutable CompiledBank"""
+    return CompiledBank(quiz_data)
@@ -0,0 +1,40 @@
+"""
+Pluggable persistence for sessions, answers and question banks
+
+The backend is chosen from DATABASE_URL:
+
+    postgres://... / postgresql://...   PostgresStorage (pooled, multi-node)
+    sqlite:///relative.db               SQLiteStorage (WAL file, single node)
+    sqlite:////absolute/path.db
+    memory://                           MemoryStorage (one process, no persistence)
+
+Without DATABASE_URL the app runs on an embedded SQLite file (SQLITE_PATH,
+default quiz.db) instead of failing every request.
+"""
+
+import os
+
+from storage.base import AnswerSet, ItemStats, Storage, Transaction, latest_answers, month_bounds, month_start
+from storage.sqlite import MemoryStorage, SQLiteStorage
+
+__all__ = ['AnswerSet', 'ItemStats', 'Storage', 'Transaction', 'latest_answers', 'month_bounds',
+           'month_start', 'create_storage', 'SQLiteStorage', 'MemoryStorage']
+
+
+def create_storage():
+    """Build the backend selected by DATABASE_URL"""
+    database_url = os.environ.get('DATABASE_URL', '')
+
+    if database_url.startswith(('postgres://', 'postgresql://')):
+        from storage.postgres import PostgresStorage
+        return PostgresStorage()
+    if database_url.startswith('memory:'):
+        return MemoryStorage()
+    if database_url.startswith('sqlite:///'):
+        return SQLiteStorage(database_url[len('sqlite:///'):])
+    if database_url:
+        raise ValueError(f"Unsupported DATABASE_URL scheme: {database_url.split(':', 1)[0]}")
+
+    path = os.environ.get('SQLITE_PATH', 'quiz.db')
+    print(f"⚠️ DATABASE_URL not set, using embedded SQLite database {path}")
+    return SQLiteStorage(path)
@@ -0,0 +1,331 @@
+"""
+Storage interface shared by every backend
+
+A backend hands out transactions; routes do all session and answer
+persistence through the transaction's methods and never see SQL or a
+driver.  The transaction commits when the with-block exits normally and
+rolls back if it raises.  Events passed to publish() are delivered only if
+the transaction commits.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+
+# Item-analysis counter deltas, keyed per bank version (see analytics.py):
+#   banks      {bank_version: [sessions, score_sum, score_sq_sum, total_sum]}
+#   questions  {(bank_version, question_id):
+#                  [attempts, answered, correct, score_sum, score_sq_sum, correct_score_sum]}
+#   options    {(bank_version, question_id, choice): picks}
+ItemStats = namedtuple('ItemStats', 'banks questions options')
+
+# export_completed() filters: (column, operator, filter key)
+EXPORT_FILTERS = (
+    ('start_time', '>=', 'start_from'),
+    ('start_time', '<', 'start_to'),
+    ('score', '>=', 'min_score'),
+    ('score', '<=', 'max_score'),
+)
+
+# search_completed() filters on the history ordering expression and the score
+FINISHED_AT = 'COALESCE(end_time, start_time)'
+HISTORY_FILTERS = (
+    (FINISHED_AT, '>=', 'finished_from'),
+    (FINISHED_AT, '<', 'finished_to'),
+    ('score', '>=', 'min_score'),
+    ('score', '<=', 'max_score'),
+)
+
+# Monthly session partitions kept ready beyond the current month (Postgres)
+PARTITION_MONTHS_AHEAD = 2
+
+
+def month_start(moment, offset=0):
+    """Midnight on the first day of moment's month, shifted by offset months"""
+    month = moment.year * 12 + moment.month - 1 + offset
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def month_bounds(moment, months_ahead=PARTITION_MONTHS_AHEAD):
+    """[(start, end)] of moment's month and of the months_ahead months after it"""
+    return [(month_start(moment, offset), month_start(moment, offset + 1))
+            for offset in range(months_ahead + 1)]
+
+
+def latest_answers(answers):
+    """
+    Reduce [{'question_id', 'answer', 'seq'}] to {question_id: (answer, seq)}.
+
+    Only the highest seq per question survives, so a batch that changed the
+    same answer several times writes it once.
+    """
+    latest = {}
+    for item in answers:
+        question_id = int(item['question_id'])
+        seq = int(item.get('seq') or 0)
+        if question_id not in latest or seq >= latest[question_id][1]:
+            latest[question_id] = (item.get('answer'), seq)
+    return latest
+
+
+class AnswerSet(dict):
+    """{question_id (str): answer} plus {question_id (str): answered_at} in .answered_at"""
+
+    __slots__ = ('answered_at',)
+
+    def __init__(self):
+        super().__init__()
+        self.answered_at = {}
+
+
+class Transaction:
+    """
+    One unit of work against the store.
+
+    Session rows are dicts with access_code, start_time, end_time, completed,
+    score, total_questions, bank_version, question_order (tuple or None),
+    questions_data (legacy JSON copy or None) and results (graded outcomes
+    packed by scoring.pack_outcomes, or None before grading).
+    """
+
+    # -- sessions ----------------------------------------------------------
+
+    def insert_sessions(self, rows):
+        """Insert (code, start_time, bank_version, question_order, total) rows; returns the codes
+        actually inserted (codes that already exist are skipped)"""
+        raise NotImplementedError
+
+    def fetch_session(self, access_code):
+        raise NotImplementedError
+
+    def session_is_open(self, access_code):
+        raise NotImplementedError
+
+    def fetch_submission(self, access_code):
+        """(session row, AnswerSet) for grading a submission, read together;
+        (None, None) if the session does not exist"""
+        raise NotImplementedError
+
+    def complete_session(self, access_code, end_time, score, total, results):
+        """Store the grade and mark the session completed, only if it is still open;
+        True if this call completed it (concurrent callers: exactly one wins)"""
+        raise NotImplementedError
+
+    def claim_session(self, access_code, time_limit):
+        """Mark one open session as completed (end_time = start + time_limit) and return its
+        row; None when it is already completed"""
+        raise NotImplementedError
+
+    def claim_overdue(self, time_limits, default_limit, now, batch_size):
+        """Mark up to batch_size open sessions whose time limit ran out before now as
+        completed (end_time = start + limit) and return their rows.  The limit is
+        time_limits[bank_version], or default_limit for sessions without a known version;
+        concurrent claimers never get the same row"""
+        raise NotImplementedError
+
+    def set_scores(self, scores):
+        """Bulk-write [(access_code, score, total, results)]"""
+        raise NotImplementedError
+
+    def set_bank_version(self, access_codes, bank_version):
+        """Re-pin sessions to another bank version (after a re-grade against it)"""
+        raise NotImplementedError
+
+    def completed_after(self, after_code, limit, bank_version=None, missing_results=False):
+        """Completed sessions with access_code > after_code in code order (keyset batches),
+        optionally only those pinned to bank_version or without stored results"""
+        raise NotImplementedError
+
+    def active_sessions(self, cutoff, limit):
+        """Open sessions started after cutoff, newest first: access_code, start_time,
+        answered_count, bank_version, total_questions"""
+        raise NotImplementedError
+
+    def completed_sessions(self, limit):
+        """Latest completed sessions: access_code, start_time, end_time, score, total_questions"""
+        raise NotImplementedError
+
+    def count_sessions(self):
+        raise NotImplementedError
+
+    def search_completed(self, filters, after, limit):
+        """
+        One page of completed sessions, most recently finished first
+        (finished_at = end_time, or start_time when missing; ties by access_code
+        descending).  filters may hold finished_from / finished_to, min_score /
+        max_score and code_prefix (upper-case letters and digits).  after is the
+        (finished_at, access_code) of the previous page's last row, or None.
+        Rows: access_code, start_time, end_time, finished_at, score,
+        total_questions, bank_version.
+        """
+        raise NotImplementedError
+
+    def export_completed(self, filters, chunk_size):
+        """
+        Iterate completed sessions in start_time order without loading them all:
+        access_code, start_time, end_time, score, total_questions, bank_version,
+        answered_count.  filters may hold start_from / start_to (datetimes,
+        to exclusive) and min_score / max_score; None values are ignored.
+        Rows are fetched chunk_size at a time.
+        """
+        raise NotImplementedError
+
+    # -- partitions and archive ---------------------------------------------
+
+    def session_partitions(self):
+        """[{'name', 'lower', 'upper', 'estimated_rows'}] of quiz_sessions in created_at
+        order (None bounds are open-ended); empty for unpartitioned backends"""
+        raise NotImplementedError
+
+    def ensure_partitions(self, bounds):
+        """Create a partition for every (start, end) range no partition covers yet;
+        returns the names created"""
+        raise NotImplementedError
+
+    def archive_sessions(self, before, batch_size):
+        """
+        Move completed, graded sessions created before `before` into
+        session_archive and delete their answers.  Partitioned backends move
+        (and drop) one whole partition per call, skipping partitions that
+        still hold open or ungraded sessions; others move up to batch_size
+        rows.  Returns (sessions archived, sessions held back); call again
+        until nothing is archived.
+        """
+        raise NotImplementedError
+
+    def fetch_archived(self, access_code):
+        """Archived session as a completed session row (questions_data is None), or None"""
+        raise NotImplementedError
+
+    # -- answers -------------------------------------------------------------
+
+    def fetch_answers(self, access_code):
+        """AnswerSet for one session"""
+        raise NotImplementedError
+
+    def fetch_answers_many(self, access_codes):
+        """{access_code: AnswerSet} for every requested code"""
+        raise NotImplementedError
+
+    def upsert_answers(self, access_code, latest, answered_at):
+        """
+        Write {question_id: (answer, seq)} for an open session.
+
+        A stored answer is only replaced by an equal or newer seq.  The
+        session's answered_count and last_activity are maintained.  Returns
+        (rows written, answered_count after the write); (0, None) if the
+        session is missing or completed.
+        """
+        raise NotImplementedError
+
+    def upsert_answers_many(self, rows):
+        """
+        Write [(access_code, question_id, answer, answered_at, seq)] for any
+        number of sessions in one go, at most one row per access_code and
+        question_id, by the same rules as upsert_answers().  Rows of missing
+        or completed sessions are dropped.  Returns {access_code: (rows
+        written, answered_count)} for the sessions that were written.
+        """
+        raise NotImplementedError
+
+    # -- access codes --------------------------------------------------------
+
+    def reserve_code_block(self):
+        """Number of the next block of access-code counter values; never the same one twice"""
+        raise NotImplementedError
+
+    def setting(self, name, default=None):
+        """
+        Stored value of an application setting, or None.  A missing setting
+        is first stored as default (when given); the first value stored wins.
+        """
+        raise NotImplementedError
+
+    def save_setting(self, name, value):
+        """Store an application setting, replacing any stored value"""
+        raise NotImplementedError
+
+    # -- question banks ------------------------------------------------------
+
+    def load_bank(self, version):
+        """Stored bank JSON text for a version, or None"""
+        raise NotImplementedError
+
+    def save_bank(self, version, bank_data):
+        raise NotImplementedError
+
+    def bank_versions(self):
+        """Every recorded bank version"""
+        raise NotImplementedError
+
+    # -- item statistics -----------------------------------------------------
+
+    def graded_after(self, after_code, limit):
+        """Graded sessions (live and archived) with access_code > after_code in code
+        order: access_code, bank_version, results"""
+        raise NotImplementedError
+
+    def add_item_stats(self, stats, shard):
+        """Add ItemStats deltas to the counters in one shard"""
+        raise NotImplementedError
+
+    def lock_item_stats(self):
+        """Hold off concurrent add_item_stats() until this transaction ends"""
+        raise NotImplementedError
+
+    def read_snapshot(self):
+        """Read everything in this transaction from one snapshot (call before any query)"""
+        raise NotImplementedError
+
+    def item_stats(self, bank_version):
+        """ItemStats totals (summed over shards) for one bank version; all-zero totals are left out"""
+        raise NotImplementedError
+
+    def item_stats_versions(self):
+        """[(bank_version, sessions)] for every version with counted sessions, most sessions first"""
+        raise NotImplementedError
+
+    # -- events --------------------------------------------------------------
+
+    def publish(self, event):
+        raise NotImplementedError
+
+
+class Storage:
+    """A persistence backend: hands out transactions and owns the schema"""
+
+    name = 'base'
+
+    # True when events published in one process reach event hubs in others
+    # (Postgres LISTEN/NOTIFY); embedded backends deliver in-process only
+    cross_process_events = False
+
+    # True when quiz_sessions is split into monthly partitions that need
+    # creating ahead of time (see retention.py)
+    partitioned = False
+
+    def __init__(self):
+        self._event_listeners = []
+
+    @contextmanager
+    def transaction(self, write=True):
+        """Yield a Transaction; write=False lets embedded backends skip the write lock"""
+        raise NotImplementedError
+        yield
+
+    def init_schema(self, bank, quiz_data):
+        """Create or migrate tables and record the current bank"""
+        raise NotImplementedError
+
+    def add_event_listener(self, callback):
+        """Receive committed events in this process (embedded backends)"""
+        self._event_listeners.append(callback)
+
+    def _deliver(self, events):
+        for event in events:
+            for callback in self._event_listeners:
+                callback(event)
+
+    def pool_stats(self):
+        """Connection pool statistics, or None when the backend has no pool"""
+        return None
@@ -0,0 +1,824 @@
+"""
+Postgres backend (pooled psycopg2 connections from db.py)
+
+Events go out with pg_notify on the transaction's own connection, so every
+worker's LISTEN thread sees them once the transaction commits.
+"""
+
+import json
+import re
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+from db import get_db, pool_stats
+from events import publish
+from storage import queries
+from storage.base import (EXPORT_FILTERS, FINISHED_AT, HISTORY_FILTERS, AnswerSet, ItemStats, Storage,
+                          Transaction, month_bounds, month_start)
+from storage.queries import BY_CODE, SESSION_COLUMNS
+
+SCHEMA_LOCK_ID = 72120001
+
+# app_settings entries recording one-off data migrations in init_schema()
+ANSWERS_DATA_MIGRATED = 'migrated_answers_data'
+SNAPSHOTS_MIGRATED = 'migrated_question_snapshots'
+
+_PARTITION_BOUND = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+
+def _session(row):
+    if row is None:
+        return None
+    session = dict(row)
+    if session['question_order'] is not None:
+        session['question_order'] = tuple(session['question_order'])
+    return session
+
+
+def _partition_bound(value):
+    """Datetime from a partition bound literal; None for MINVALUE / MAXVALUE"""
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def _export_filters(filters):
+    """WHERE clause for export_completed(); only set filters become conditions"""
+    conditions = ['completed = TRUE']
+    params = []
+    for column, operator, key in EXPORT_FILTERS:
+        if filters.get(key) is not None:
+            conditions.append(f"{column} {operator} %s")
+            params.append(filters[key])
+    return ' AND '.join(conditions), params
+
+
+class PostgresTransaction(Transaction):
+
+    def __init__(self, cur):
+        self.cur = cur
+
+    # -- sessions ----------------------------------------------------------
+
+    def insert_sessions(self, rows):
+        # Codes are only unique on their own in session_codes; a session row is
+        # written for every code claimed there, in the month of its start_time
+        inserted = execute_values(self.cur, """
+            WITH v (access_code, start_time, bank_version, question_order, total_questions) AS (
+                VALUES %s
+            ),
+            claimed AS (
+                INSERT INTO session_codes (access_code, created_at)
+                SELECT access_code, start_time FROM v
+                ON CONFLICT (access_code) DO NOTHING
+                RETURNING access_code, created_at
+            )
+            INSERT INTO quiz_sessions (access_code, created_at, start_time, bank_version,
+                                       question_order, total_questions)
+            SELECT v.access_code, claimed.created_at, v.start_time, v.bank_version,
+                   v.question_order, v.total_questions
+            FROM v JOIN claimed ON claimed.access_code = v.access_code
+            RETURNING access_code
+        """, rows, template="(%s, %s::timestamp, %s, %s::smallint[], %s)", page_size=1000, fetch=True)
+        return [row['access_code'] for row in inserted]
+
+    def fetch_session(self, access_code):
+        queries.execute(self.cur, queries.SESSION_BY_CODE, (access_code,))
+        return _session(self.cur.fetchone())
+
+    def session_is_open(self, access_code):
+        queries.execute(self.cur, queries.SESSION_IS_OPEN, (access_code,))
+        return self.cur.fetchone() is not None
+
+    def fetch_submission(self, access_code):
+        queries.execute(self.cur, queries.SUBMISSION, (access_code,))
+        rows = self.cur.fetchall()
+        if not rows:
+            return None, None
+        answers = AnswerSet()
+        for row in rows:
+            if row['question_id'] is not None:
+                key = str(row['question_id'])
+                answers[key] = json.loads(row['answer'])
+                answers.answered_at[key] = row['answered_at']
+        session = dict(rows[0])
+        for column in ('question_id', 'answer', 'answered_at'):
+            del session[column]
+        return _session(session), answers
+
+    def complete_session(self, access_code, end_time, score, total, results):
+        queries.execute(self.cur, queries.COMPLETE_SESSION, (end_time, score, total, results, access_code))
+        return self.cur.rowcount > 0
+
+    def claim_session(self, access_code, time_limit):
+        self.cur.execute(f"""
+            UPDATE quiz_sessions
+            SET completed = TRUE, end_time = start_time + make_interval(secs => %s)
+            WHERE {BY_CODE} AND completed = FALSE
+            RETURNING {SESSION_COLUMNS}
+        """, (time_limit, access_code))
+        row = self.cur.fetchone()
+        return _session(row) if row else None
+
+    def claim_overdue(self, time_limits, default_limit, now, batch_size):
+        # Each session runs out on its own bank's limit, and end_time is that
+        # moment, not when the sweep ran.  The shortest limit bounds the scan
+        versions = sorted(time_limits)
+        shortest = min([default_limit, *time_limits.values()])
+        self.cur.execute("""
+            UPDATE quiz_sessions s
+            SET completed = TRUE, end_time = s.start_time + make_interval(secs => o.time_limit)
+            FROM (
+                SELECT q.access_code, q.created_at, COALESCE(l.time_limit, %s) AS time_limit
+                FROM quiz_sessions q
+                LEFT JOIN unnest(%s::varchar[], %s::float8[]) AS l(bank_version, time_limit)
+                       ON l.bank_version = q.bank_version
+                WHERE q.completed = FALSE AND q.start_time < %s
+                  AND q.start_time < %s - make_interval(secs => COALESCE(l.time_limit, %s))
+                ORDER BY q.start_time
+                LIMIT %s
+                FOR UPDATE OF q SKIP LOCKED
+            ) o
+            WHERE s.access_code = o.access_code AND s.created_at = o.created_at
+            RETURNING s.access_code, s.start_time, s.end_time, s.completed, s.score, s.total_questions,
+                      s.bank_version, s.question_order, s.questions_data, s.results
+        """, (default_limit, versions, [time_limits[version] for version in versions],
+              now - timedelta(seconds=shortest), now, default_limit, batch_size))
+        return [_session(row) for row in self.cur.fetchall()]
+
+    def set_scores(self, scores):
+        if not scores:
+            return
+        execute_values(self.cur, """
+            UPDATE quiz_sessions s
+            SET score = v.score, total_questions = v.total, results = v.results
+            FROM (VALUES %s) AS v(access_code, score, total, results)
+            JOIN session_codes c ON c.access_code = v.access_code
+            WHERE s.access_code = c.access_code AND s.created_at = c.created_at
+        """, scores, page_size=len(scores))
+
+    def set_bank_version(self, access_codes, bank_version):
+        self.cur.execute("""
+            UPDATE quiz_sessions SET bank_version = %s
+            WHERE (access_code, created_at) IN (
+                SELECT access_code, created_at FROM session_codes WHERE access_code = ANY(%s)
+            )
+        """, (bank_version, list(access_codes)))
+
+    def completed_after(self, after_code, limit, bank_version=None, missing_results=False):
+        self.cur.execute(f"""
+            SELECT {SESSION_COLUMNS}
+            FROM quiz_sessions
+            WHERE completed = TRUE AND access_code > %s
+              AND (%s::varchar IS NULL OR bank_version = %s)
+              AND (NOT %s OR results IS NULL)
+            ORDER BY access_code
+            LIMIT %s
+        """, (after_code, bank_version, bank_version, missing_results, limit))
+        return [_session(row) for row in self.cur.fetchall()]
+
+    def active_sessions(self, cutoff, limit):
+        queries.execute(self.cur, queries.ACTIVE_SESSIONS, (cutoff, limit))
+        return self.cur.fetchall()
+
+    def completed_sessions(self, limit):
+        queries.execute(self.cur, queries.COMPLETED_SESSIONS, (limit,))
+        return self.cur.fetchall()
+
+    def count_sessions(self):
+        self.cur.execute("SELECT COUNT(*) AS session_count FROM quiz_sessions")
+        return self.cur.fetchone()['session_count']
+
+    def search_completed(self, filters, after, limit):
+        conditions = ['completed = TRUE']
+        params = []
+        for expression, operator, key in HISTORY_FILTERS:
+            if filters.get(key) is not None:
+                conditions.append(f"{expression} {operator} %s")
+                params.append(filters[key])
+        if filters.get('code_prefix'):
+            # Served by idx_quiz_sessions_code_prefix (varchar_pattern_ops)
+            conditions.append("access_code LIKE %s")
+            params.append(filters['code_prefix'] + '%')
+        if after is not None:
+            # Keyset: continue below the previous page's last row, so a deep
+            # page reads as few index entries as the first one
+            conditions.append(f"({FINISHED_AT}, access_code) < (%s, %s)")
+            params.extend(after)
+
+        self.cur.execute(f"""
+            SELECT access_code, start_time, end_time, {FINISHED_AT} AS finished_at,
+                   score, total_questions, bank_version
+            FROM quiz_sessions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {FINISHED_AT} DESC, access_code DESC
+            LIMIT %s
+        """, params + [limit])
+        return self.cur.fetchall()
+
+    # -- partitions and archive ---------------------------------------------
+
+    def session_partitions(self):
+        self.cur.execute("""
+            SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound,
+                   c.reltuples AS estimated_rows
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'quiz_sessions'::regclass
+        """)
+        partitions = []
+        for row in self.cur.fetchall():
+            lower, upper = _PARTITION_BOUND.search(row['bound']).groups()
+            partitions.append({
+                'name': row['name'],
+                'lower': _partition_bound(lower),
+                'upper': _partition_bound(upper),
+                # -1 until the partition is first analyzed
+                'estimated_rows': max(int(row['estimated_rows']), 0)
+            })
+        partitions.sort(key=lambda p: (p['upper'] is None, p['upper'] or datetime.min))
+        return partitions
+
+    def _uncovered(self, bounds):
+        covered = [(p['lower'], p['upper']) for p in self.session_partitions()]
+        return [(start, end) for start, end in bounds
+                if not any((lower is None or lower < end) and (upper is None or start < upper)
+                           for lower, upper in covered)]
+
+    def ensure_partitions(self, bounds):
+        if not self._uncovered(bounds):
+            return []
+        # Workers checking together queue here; the later ones find nothing left to do
+        self.cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+        created = []
+        for start, end in self._uncovered(bounds):
+            name = f"quiz_sessions_p{start:%Y%m}"
+            self.cur.execute(f"""
+                CREATE TABLE {name} PARTITION OF quiz_sessions
+                FOR VALUES FROM (%s) TO (%s)
+            """, (str(start), str(end)))
+            created.append(name)
+        return created
+
+    def archive_sessions(self, before, batch_size):
+        # A whole partition per call: copy its sessions out, then drop it, so
+        # no dead rows are left behind for vacuum
+        held = 0
+        for partition in self.session_partitions():
+            name = partition['name']
+            if partition['upper'] is None or partition['upper'] > before:
+                continue
+            self.cur.execute(f"""
+                SELECT COUNT(*) AS held FROM {name}
+                WHERE NOT (completed AND results IS NOT NULL)
+            """)
+            blocked = self.cur.fetchone()['held']
+            if blocked:
+                held += blocked
+                continue
+
+            self.cur.execute(f"""
+                INSERT INTO session_archive (access_code, created_at, start_time, end_time, score,
+                                             total_questions, bank_version, question_order, results)
+                SELECT access_code, created_at, start_time, end_time, COALESCE(score, 0),
+                       COALESCE(total_questions, 0), bank_version, question_order, results
+                FROM {name}
+                ON CONFLICT (access_code) DO NOTHING
+            """)
+            archived = self.cur.rowcount
+            self.cur.execute(f"DELETE FROM quiz_answers a USING {name} s WHERE a.access_code = s.access_code")
+            self.cur.execute(f"DROP TABLE {name}")
+            if archived:
+                return archived, held
+        return 0, held
+
+    def fetch_archived(self, access_code):
+        self.cur.execute("""
+            SELECT access_code, start_time, end_time, TRUE AS completed, score, total_questions,
+                   bank_version, question_order, NULL AS questions_data, results
+            FROM session_archive WHERE access_code = %s
+        """, (access_code,))
+        return _session(self.cur.fetchone())
+
+    def export_completed(self, filters, chunk_size):
+        where, params = _export_filters(filters)
+        # A named (server-side) cursor: Postgres keeps the result set and each
+        # iteration step fetches the next chunk_size rows
+        with self.cur.connection.cursor(name='session_export') as export:
+            export.itersize = chunk_size
+            export.execute(f"""
+                SELECT access_code, start_time, end_time, score, total_questions,
+                       bank_version, answered_count
+                FROM quiz_sessions
+                WHERE {where}
+                ORDER BY start_time, access_code
+            """, params)
+            yield from export
+
+    # -- answers -------------------------------------------------------------
+
+    def fetch_answers(self, access_code):
+        self.cur.execute("""
+            SELECT question_id, answer, answered_at FROM quiz_answers
+            WHERE access_code = %s
+        """, (access_code,))
+        answers = AnswerSet()
+        for row in self.cur.fetchall():
+            key = str(row['question_id'])
+            answers[key] = json.loads(row['answer'])
+            answers.answered_at[key] = row['answered_at']
+        return answers
+
+    def fetch_answers_many(self, access_codes):
+        answers = {code: AnswerSet() for code in access_codes}
+        if access_codes:
+            self.cur.execute("""
+                SELECT access_code, question_id, answer, answered_at FROM quiz_answers
+                WHERE access_code = ANY(%s)
+            """, (list(access_codes),))
+            for row in self.cur.fetchall():
+                session_answers = answers[row['access_code']]
+                key = str(row['question_id'])
+                session_answers[key] = json.loads(row['answer'])
+                session_answers.answered_at[key] = row['answered_at']
+        return answers
+
+    def upsert_answers(self, access_code, latest, answered_at):
+        written = self.upsert_answers_many([(access_code, question_id, answer, answered_at, seq)
+                                            for question_id, (answer, seq) in latest.items()])
+        return written.get(access_code, (0, None))
+
+    def upsert_answers_many(self, rows):
+        if not rows:
+            return {}
+        access_codes, question_ids, answers, answered_at, seqs = zip(*rows)
+        queries.execute(self.cur, queries.UPSERT_ANSWERS, (
+            list(access_codes), list(question_ids), [json.dumps(answer) for answer in answers],
+            list(answered_at), list(seqs)))
+        return {row['access_code']: (row['saved'], row['answered_count']) for row in self.cur.fetchall()}
+
+    # -- access codes --------------------------------------------------------
+
+    def reserve_code_block(self):
+        # Sequences ignore rollbacks, so a reserved block is never handed out again
+        self.cur.execute("SELECT nextval('access_code_blocks') - 1 AS block")
+        return self.cur.fetchone()['block']
+
+    def setting(self, name, default=None):
+        if default is not None:
+            self.cur.execute("INSERT INTO app_settings (name, value) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                             (name, default))
+        self.cur.execute("SELECT value FROM app_settings WHERE name = %s", (name,))
+        row = self.cur.fetchone()
+        return row['value'] if row else None
+
+    def save_setting(self, name, value):
+        self.cur.execute("""
+            INSERT INTO app_settings (name, value) VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value
+        """, (name, value))
+
+    # -- question banks ------------------------------------------------------
+
+    def load_bank(self, version):
+        self.cur.execute("SELECT bank_data FROM question_banks WHERE version = %s", (version,))
+        row = self.cur.fetchone()
+        return row['bank_data'] if row else None
+
+    def save_bank(self, version, bank_data):
+        self.cur.execute("""
+            INSERT INTO question_banks (version, bank_data) VALUES (%s, %s)
+            ON CONFLICT (version) DO NOTHING
+        """, (version, bank_data))
+
+    def bank_versions(self):
+        self.cur.execute("SELECT version FROM question_banks")
+        return [row['version'] for row in self.cur.fetchall()]
+
+    # -- item statistics -----------------------------------------------------
+
+    def graded_after(self, after_code, limit):
+        self.cur.execute("""
+            (SELECT access_code, bank_version, results FROM quiz_sessions
+             WHERE access_code > %s AND results IS NOT NULL
+             ORDER BY access_code
+             LIMIT %s)
+            UNION ALL
+            (SELECT access_code, bank_version, results FROM session_archive
+             WHERE access_code > %s
+             ORDER BY access_code
+             LIMIT %s)
+            ORDER BY access_code
+            LIMIT %s
+        """, (after_code, limit, after_code, limit, limit))
+        return self.cur.fetchall()
+
+    def add_item_stats(self, stats, shard):
+        # Rows go in key order so concurrent submits lock them in the same
+        # order and cannot deadlock
+        if stats.banks:
+            execute_values(self.cur, """
+                INSERT INTO bank_stats (bank_version, shard, sessions, score_sum, score_sq_sum, total_sum)
+                VALUES %s
+                ON CONFLICT (bank_version, shard) DO UPDATE SET
+                    sessions = bank_stats.sessions + EXCLUDED.sessions,
+                    score_sum = bank_stats.score_sum + EXCLUDED.score_sum,
+                    score_sq_sum = bank_stats.score_sq_sum + EXCLUDED.score_sq_sum,
+                    total_sum = bank_stats.total_sum + EXCLUDED.total_sum
+            """, [(version, shard, *counters) for version, counters in sorted(stats.banks.items())],
+                page_size=1000)
+        if stats.questions:
+            execute_values(self.cur, """
+                INSERT INTO question_stats (bank_version, question_id, shard, attempts, answered, correct,
+                                            score_sum, score_sq_sum, correct_score_sum)
+                VALUES %s
+                ON CONFLICT (bank_version, question_id, shard) DO UPDATE SET
+                    attempts = question_stats.attempts + EXCLUDED.attempts,
+                    answered = question_stats.answered + EXCLUDED.answered,
+                    correct = question_stats.correct + EXCLUDED.correct,
+                    score_sum = question_stats.score_sum + EXCLUDED.score_sum,
+                    score_sq_sum = question_stats.score_sq_sum + EXCLUDED.score_sq_sum,
+                    correct_score_sum = question_stats.correct_score_sum + EXCLUDED.correct_score_sum
+            """, [(version, qid, shard, *counters)
+                  for (version, qid), counters in sorted(stats.questions.items())], page_size=1000)
+        if stats.options:
+            execute_values(self.cur, """
+                INSERT INTO option_stats (bank_version, question_id, choice, shard, picks)
+                VALUES %s
+                ON CONFLICT (bank_version, question_id, choice, shard) DO UPDATE SET
+                    picks = option_stats.picks + EXCLUDED.picks
+            """, [(version, qid, choice, shard, picks)
+                  for (version, qid, choice), picks in sorted(stats.options.items())], page_size=1000)
+
+    def lock_item_stats(self):
+        # Blocks add_item_stats() (ROW EXCLUSIVE) and other rebuilds, not reads
+        self.cur.execute("LOCK TABLE bank_stats, question_stats, option_stats IN SHARE ROW EXCLUSIVE MODE")
+
+    def read_snapshot(self):
+        # READ COMMITTED would give every statement its own snapshot
+        self.cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+
+    def item_stats(self, bank_version):
+        self.cur.execute("""
+            SELECT SUM(sessions) AS sessions, SUM(score_sum) AS score_sum,
+                   SUM(score_sq_sum) AS score_sq_sum, SUM(total_sum) AS total_sum
+            FROM bank_stats WHERE bank_version = %s
+        """, (bank_version,))
+        banks = {bank_version: [int(value) for value in row.values()]
+                 for row in self.cur.fetchall() if row['sessions']}
+        self.cur.execute("""
+            SELECT question_id, SUM(attempts) AS attempts, SUM(answered) AS answered,
+                   SUM(correct) AS correct, SUM(score_sum) AS score_sum,
+                   SUM(score_sq_sum) AS score_sq_sum, SUM(correct_score_sum) AS correct_score_sum
+            FROM question_stats WHERE bank_version = %s
+            GROUP BY question_id
+            HAVING SUM(attempts) > 0
+        """, (bank_version,))
+        questions = {(bank_version, row.pop('question_id')): [int(value) for value in row.values()]
+                     for row in self.cur.fetchall()}
+        self.cur.execute("""
+            SELECT question_id, choice, SUM(picks) AS picks
+            FROM option_stats WHERE bank_version = %s
+            GROUP BY question_id, choice
+            HAVING SUM(picks) > 0
+        """, (bank_version,))
+        options = {(bank_version, row['question_id'], row['choice']): int(row['picks'])
+                   for row in self.cur.fetchall()}
+        return ItemStats(banks, questions, options)
+
+    def item_stats_versions(self):
+        self.cur.execute("""
+            SELECT bank_version, SUM(sessions) AS sessions FROM bank_stats
+            GROUP BY bank_version
+            HAVING SUM(sessions) > 0
+            ORDER BY sessions DESC
+        """)
+        return [(row['bank_version'], int(row['sessions'])) for row in self.cur.fetchall()]
+
+    # -- events --------------------------------------------------------------
+
+    def publish(self, event):
+        publish(self.cur, event)
+
+
+class PostgresStorage(Storage):
+    """Shared Postgres database; the only backend for multi-node deployments"""
+
+    name = 'postgres'
+    cross_process_events = True
+    partitioned = True
+
+    @contextmanager
+    def transaction(self, write=True):
+        with get_db() as conn:
+            cur = conn.cursor()
+            try:
+                yield PostgresTransaction(cur)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+    def pool_stats(self):
+        return pool_stats()
+
+    def init_schema(self, bank, quiz_data):
+        with get_db() as conn:
+            cur = conn.cursor()
+
+            # Serialize schema changes when several workers boot at once
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_ID,))
+
+            # Key/value settings, which also record the data migrations already
+            # done so a boot does not scan quiz_sessions for them again
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS app_settings (
+                    name VARCHAR(50) PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            settings = PostgresTransaction(cur)
+
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS quiz_sessions (
+                    access_code VARCHAR(10) PRIMARY KEY,
+                    start_time TIMESTAMP NOT NULL,
+                    questions_data TEXT NOT NULL,
+                    answers_data TEXT DEFAULT '{}',
+                    completed BOOLEAN DEFAULT FALSE,
+                    end_time TIMESTAMP,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    score INTEGER DEFAULT 0,
+                    total_questions INTEGER DEFAULT 0
+                )
+            """)
+
+            # One row per answered question; answer holds the JSON-encoded
+            # value (option index or text) exactly as the client sent it
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS quiz_answers (
+                    access_code VARCHAR(10) NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    answer TEXT NOT NULL,
+                    answered_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (access_code, question_id)
+                )
+            """)
+
+            # Migrate legacy answers_data blobs, then clear them.  Nothing
+            # writes answers_data any more, so this runs on one boot only
+            if settings.setting(ANSWERS_DATA_MIGRATED) is None:
+                cur.execute("""
+                    INSERT INTO quiz_answers (access_code, question_id, answer)
+                    SELECT s.access_code, a.key::int, a.value::text
+                    FROM quiz_sessions s, json_each(s.answers_data::json) a
+                    WHERE s.answers_data IS NOT NULL AND s.answers_data <> '{}'
+                    ON CONFLICT (access_code, question_id) DO NOTHING
+                """)
+                if cur.rowcount:
+                    print(f"🔁 Migrated {cur.rowcount} answers from answers_data to quiz_answers")
+                cur.execute("""
+                    UPDATE quiz_sessions SET answers_data = NULL
+                    WHERE answers_data IS NOT NULL AND answers_data <> '{}'
+                """)
+                settings.save_setting(ANSWERS_DATA_MIGRATED, datetime.now().isoformat())
+
+            # Client sequence number per answer: last write wins, replays are no-ops
+            cur.execute("""
+                ALTER TABLE quiz_answers ADD COLUMN IF NOT EXISTS seq BIGINT NOT NULL DEFAULT 0
+            """)
+
+            # Sessions reference a bank version plus their question order
+            # instead of carrying a full copy of the bank
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS question_banks (
+                    version VARCHAR(16) PRIMARY KEY,
+                    bank_data TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute("ALTER TABLE quiz_sessions ADD COLUMN IF NOT EXISTS bank_version VARCHAR(16)")
+            cur.execute("ALTER TABLE quiz_sessions ADD COLUMN IF NOT EXISTS question_order SMALLINT[]")
+            cur.execute("ALTER TABLE quiz_sessions ALTER COLUMN questions_data DROP NOT NULL")
+            PostgresTransaction(cur).save_bank(bank.version, json.dumps(quiz_data))
+
+            # Maintained per-session counters so the dashboard never counts answers
+            cur.execute("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'quiz_sessions' AND column_name = 'answered_count'
+            """)
+            if cur.fetchone() is None:
+                cur.execute("ALTER TABLE quiz_sessions ADD COLUMN answered_count INTEGER NOT NULL DEFAULT 0")
+                cur.execute("ALTER TABLE quiz_sessions ADD COLUMN last_activity TIMESTAMP")
+                cur.execute("""
+                    UPDATE quiz_sessions s
+                    SET answered_count = c.answered, last_activity = c.last_activity
+                    FROM (
+                        SELECT access_code, COUNT(*) AS answered, MAX(answered_at) AS last_activity
+                        FROM quiz_answers GROUP BY access_code
+                    ) c
+                    WHERE s.access_code = c.access_code
+                """)
+                print(f"🔁 Backfilled answered_count for {cur.rowcount} sessions")
+
+            # Graded outcomes packed at submit time (scoring.pack_outcomes)
+            cur.execute("ALTER TABLE quiz_sessions ADD COLUMN IF NOT EXISTS results TEXT")
+
+            # Item-analysis counters (analytics.py).  Each submit adds to one of
+            # several shards, so concurrent submits rarely wait on the same row;
+            # readers sum the shards
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS bank_stats (
+                    bank_version VARCHAR(16) NOT NULL,
+                    shard SMALLINT NOT NULL,
+                    sessions BIGINT NOT NULL DEFAULT 0,
+                    score_sum BIGINT NOT NULL DEFAULT 0,
+                    score_sq_sum BIGINT NOT NULL DEFAULT 0,
+                    total_sum BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bank_version, shard)
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS question_stats (
+                    bank_version VARCHAR(16) NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    shard SMALLINT NOT NULL,
+                    attempts BIGINT NOT NULL DEFAULT 0,
+                    answered BIGINT NOT NULL DEFAULT 0,
+                    correct BIGINT NOT NULL DEFAULT 0,
+                    score_sum BIGINT NOT NULL DEFAULT 0,
+                    score_sq_sum BIGINT NOT NULL DEFAULT 0,
+                    correct_score_sum BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bank_version, question_id, shard)
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS option_stats (
+                    bank_version VARCHAR(16) NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    choice VARCHAR(16) NOT NULL,
+                    shard SMALLINT NOT NULL,
+                    picks BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (bank_version, question_id, choice, shard)
+                )
+            """)
+
+            # Access-code counter blocks (see access_codes.py)
+            cur.execute("CREATE SEQUENCE IF NOT EXISTS access_code_blocks")
+
+            # Monthly partitions by created_at (plain tables are converted once),
+            # the code -> created_at map that routes lookups to one partition,
+            # and the compact archive that old partitions are moved into
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS session_codes (
+                    access_code VARCHAR(10) PRIMARY KEY,
+                    created_at TIMESTAMP NOT NULL
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS session_archive (
+                    access_code VARCHAR(10) PRIMARY KEY,
+                    created_at TIMESTAMP NOT NULL,
+                    start_time TIMESTAMP NOT NULL,
+                    end_time TIMESTAMP,
+                    score INTEGER NOT NULL,
+                    total_questions INTEGER NOT NULL,
+                    bank_version VARCHAR(16),
+                    question_order SMALLINT[],
+                    results TEXT NOT NULL
+                )
+            """)
+            if partition_sessions(cur):
+                print("🔁 Converted quiz_sessions to monthly partitions")
+            PostgresTransaction(cur).ensure_partitions(month_bounds(datetime.now()))
+
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_quiz_sessions_completed
+                ON quiz_sessions(completed, start_time)
+            """)
+
+            # Admin history (search_completed): newest finished first, with the
+            # listed columns in the index so pages are index-only scans
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_quiz_sessions_history
+                ON quiz_sessions ((COALESCE(end_time, start_time)) DESC, access_code DESC)
+                INCLUDE (start_time, end_time, score, total_questions, bank_version)
+                WHERE completed = TRUE
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_quiz_sessions_code_prefix
+                ON quiz_sessions (access_code varchar_pattern_ops)
+                WHERE completed = TRUE
+            """)
+
+            # Active-session list: bounded, index-only scan on open sessions only
+            # (it replaces idx_quiz_sessions_active, which lacked the bank columns)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_quiz_sessions_open
+                ON quiz_sessions (start_time DESC)
+                INCLUDE (access_code, answered_count, last_activity, bank_version, total_questions)
+                WHERE completed = FALSE
+            """)
+            cur.execute("DROP INDEX IF EXISTS idx_quiz_sessions_active")
+
+            # Only copies identical to the default bank can be replaced, so
+            # the scan is repeated only when that bank changes
+            if settings.setting(SNAPSHOTS_MIGRATED) != bank.version:
+                migrated = migrate_question_snapshots(cur, bank)
+                if migrated:
+                    print(f"🔁 Migrated {migrated} sessions from questions_data to question_order")
+                settings.save_setting(SNAPSHOTS_MIGRATED, bank.version)
+
+            conn.commit()
+            cur.close()
+
+
+def partition_sessions(cur):
+    """
+    Turn a plain quiz_sessions table into one range-partitioned by created_at.
+
+    Existing rows are not copied: the old table is attached as the partition
+    for everything before the month after its newest row (an empty one is
+    simply dropped), and its indexes are renamed so the partitioned indexes
+    created afterwards adopt them.  Returns True if a conversion happened.
+    """
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = 'quiz_sessions'::regclass")
+    if cur.fetchone()['relkind'] == 'p':
+        return False
+
+    cur.execute("UPDATE quiz_sessions SET created_at = start_time WHERE created_at IS NULL")
+    cur.execute("ALTER TABLE quiz_sessions ALTER COLUMN created_at SET NOT NULL")
+    cur.execute("ALTER TABLE quiz_sessions RENAME TO quiz_sessions_legacy")
+    # The partitioned key is (access_code, created_at); session_codes keeps codes unique
+    cur.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'quiz_sessions_legacy'::regclass AND contype = 'p'
+    """)
+    for row in cur.fetchall():
+        cur.execute(f"ALTER TABLE quiz_sessions_legacy DROP CONSTRAINT {row['conname']}")
+    cur.execute("""
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'quiz_sessions_legacy'::regclass
+    """)
+    for row in cur.fetchall():
+        cur.execute(f"ALTER INDEX {row['relname']} RENAME TO {row['relname'][:55]}_legacy")
+    cur.execute("""
+        INSERT INTO session_codes (access_code, created_at)
+        SELECT access_code, created_at FROM quiz_sessions_legacy
+        ON CONFLICT (access_code) DO NOTHING
+    """)
+
+    cur.execute("""
+        CREATE TABLE quiz_sessions (LIKE quiz_sessions_legacy INCLUDING DEFAULTS)
+        PARTITION BY RANGE (created_at)
+    """)
+    cur.execute("ALTER TABLE quiz_sessions ADD PRIMARY KEY (access_code, created_at)")
+
+    cur.execute("SELECT MAX(created_at) AS newest FROM quiz_sessions_legacy")
+    newest = cur.fetchone()['newest']
+    if newest is None:
+        cur.execute("DROP TABLE quiz_sessions_legacy")
+    else:
+        cur.execute("""
+            ALTER TABLE quiz_sessions ATTACH PARTITION quiz_sessions_legacy
+            FOR VALUES FROM (MINVALUE) TO (%s)
+        """, (str(month_start(newest, 1)),))
+    return True
+
+
+def migrate_question_snapshots(cur, bank, batch_size=500):
+    """Replace legacy questions_data copies that match the current bank by an id order"""
+    migrated = 0
+    last_code = ''
+    while True:
+        cur.execute("""
+            SELECT access_code, questions_data FROM quiz_sessions
+            WHERE question_order IS NULL AND questions_data IS NOT NULL AND access_code > %s
+            ORDER BY access_code
+            LIMIT %s
+        """, (last_code, batch_size))
+        rows = cur.fetchall()
+        if not rows:
+            return migrated
+        last_code = rows[-1]['access_code']
+
+        updates = []
+        for row in rows:
+            questions = json.loads(row['questions_data'])
+            # Only sessions whose copy is identical to the current bank can drop it
+            if all(bank.source.get(q.get('id')) == q for q in questions):
+                updates.append((row['access_code'], bank.version, [q['id'] for q in questions]))
+
+        if updates:
+            execute_values(cur, """
+                UPDATE quiz_sessions s
+                SET bank_version = v.bank_version,
+                    question_order = v.question_order::smallint[],
+                    questions_data = NULL
+                FROM (VALUES %s) AS v(access_code, bank_version, question_order)
+                WHERE s.access_code = v.access_code
+            """, updates)
+            migrated += len(updates)
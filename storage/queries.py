@@ -0,0 +1,169 @@
+"""
+Hot Postgres statements, prepared once per pooled connection
+
+The statements behind nearly every request (session lookup by access code,
+the answer upsert, completion, the dashboard lists) are defined here by
+name.  The first time a pooled connection runs one it sends
+
+    PREPARE session_by_code AS SELECT ... WHERE ... = $1
+
+and from then on only  EXECUTE session_by_code ('AB12CD') , so Postgres
+parses, analyzes and plans each of them once per connection instead of on
+every call (after five executions it may also switch to a cached generic
+plan).  Which names a connection has prepared is kept on the connection
+itself (db.PreparingConnection), so a reconnected or replaced connection
+just prepares again.
+
+Prepared statements belong to a server session.  Behind a pooler in
+transaction mode that does not track them (PgBouncer before 1.21) set
+DB_PREPARE=0, which sends the same statement text every time instead.
+
+Environment:
+    DB_PREPARE    0 = don't use server-side prepared statements (default 1)
+"""
+
+import os
+import re
+
+import psycopg2
+
+DB_PREPARE = os.environ.get('DB_PREPARE', '1') != '0'
+
+# Errors after which a connection's prepared statements can't be trusted:
+# they were dropped (DISCARD ALL, a pooler switching sessions), one we did
+# not record is in the way, or a schema change altered a statement's result
+_STALE_ERRORS = (psycopg2.errors.InvalidSqlStatementName, psycopg2.errors.DuplicatePreparedStatement,
+                 psycopg2.errors.FeatureNotSupported)
+
+
+class Query:
+    """A named statement written with %s placeholders, as for cursor.execute()"""
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+        count = sql.count('%s')
+        numbers = iter(range(1, count + 1))
+        self.prepare_sql = f"PREPARE {name} AS " + re.sub('%s', lambda _: f"${next(numbers)}", sql)
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count else f"EXECUTE {name}"
+
+
+def execute(cur, query, params=()):
+    """Run a Query on cur: prepared on this connection if it isn't yet, then EXECUTEd"""
+    conn = cur.connection
+    prepared = getattr(conn, 'prepared', None)
+    if not DB_PREPARE or prepared is None:
+        cur.execute(query.sql, params)
+        return
+
+    if conn.stale_statements:
+        cur.execute("DEALLOCATE ALL")
+        prepared.clear()
+        conn.stale_statements = False
+    try:
+        if query.name in prepared:
+            cur.execute(query.execute_sql, params)
+        else:
+            # Both in one round trip; the result is the EXECUTE's
+            try:
+                cur.execute(f"{query.prepare_sql};\n{query.execute_sql}", params)
+            except psycopg2.Error:
+                # Whether the PREPARE ran is unknown (it would outlive the
+                # rollback), so the next transaction starts over
+                conn.stale_statements = True
+                raise
+            prepared.add(query.name)
+    except _STALE_ERRORS:
+        # This transaction is lost; the next one on this connection starts over
+        conn.stale_statements = True
+        raise
+
+
+SESSION_COLUMNS = """
+    access_code, start_time, end_time, completed, score, total_questions,
+    bank_version, question_order, questions_data, results
+"""
+
+# quiz_sessions is range-partitioned by created_at (see partition_sessions()),
+# so its key is (access_code, created_at) and a bare access_code lookup would
+# probe every month's index.  session_codes maps each code to its created_at;
+# this condition fetches it first, which prunes the lookup to one partition
+BY_CODE = "(access_code, created_at) = (SELECT access_code, created_at FROM session_codes WHERE access_code = %s)"
+
+SESSION_BY_CODE = Query('session_by_code', f"""
+    SELECT {SESSION_COLUMNS}
+    FROM quiz_sessions
+    WHERE {BY_CODE}
+""")
+
+SESSION_IS_OPEN = Query('session_is_open', f"""
+    SELECT 1 FROM quiz_sessions
+    WHERE {BY_CODE} AND completed = FALSE
+""")
+
+# One round trip: a row per answer (or a single row with NULL answer
+# columns), each carrying the session columns
+SUBMISSION = Query('submission', f"""
+    WITH s AS (
+        SELECT {SESSION_COLUMNS} FROM quiz_sessions WHERE {BY_CODE}
+    )
+    SELECT s.*, a.question_id, a.answer, a.answered_at
+    FROM s LEFT JOIN quiz_answers a ON a.access_code = s.access_code
+""")
+
+# The completed = FALSE condition is the claim: a concurrent submit
+# waits on the row lock, then re-checks it and updates nothing
+COMPLETE_SESSION = Query('complete_session', f"""
+    UPDATE quiz_sessions
+    SET completed = TRUE, end_time = %s, score = %s, total_questions = %s, results = %s
+    WHERE {BY_CODE} AND completed = FALSE
+""")
+
+# Rows arrive as one array per column, so a single answer and a batch of
+# two hundred share one statement.  The join only yields rows while the
+# session exists and is still open; xmax = 0 marks rows that were inserted
+# rather than updated
+UPSERT_ANSWERS = Query('upsert_answers', """
+    WITH upserted AS (
+        INSERT INTO quiz_answers (access_code, question_id, answer, answered_at, seq)
+        SELECT s.access_code, v.question_id, v.answer, v.answered_at, v.seq
+        FROM unnest(%s::varchar[], %s::integer[], %s::text[], %s::timestamp[], %s::bigint[])
+             AS v(access_code, question_id, answer, answered_at, seq)
+        JOIN session_codes c ON c.access_code = v.access_code
+        JOIN quiz_sessions s ON s.access_code = c.access_code AND s.created_at = c.created_at
+                            AND s.completed = FALSE
+        ON CONFLICT (access_code, question_id)
+        DO UPDATE SET answer = EXCLUDED.answer, answered_at = EXCLUDED.answered_at, seq = EXCLUDED.seq
+        WHERE quiz_answers.seq <= EXCLUDED.seq
+        RETURNING access_code, answered_at, (xmax = 0) AS inserted
+    )
+    UPDATE quiz_sessions s
+    SET answered_count = s.answered_count + u.new_answers,
+        last_activity = u.last_activity
+    FROM (
+        SELECT upserted.access_code, c.created_at, COUNT(*) AS saved,
+               COUNT(*) FILTER (WHERE inserted) AS new_answers,
+               MAX(answered_at) AS last_activity
+        FROM upserted JOIN session_codes c ON c.access_code = upserted.access_code
+        GROUP BY upserted.access_code, c.created_at
+    ) u
+    WHERE s.access_code = u.access_code AND s.created_at = u.created_at
+    RETURNING s.access_code, u.saved, s.answered_count
+""")
+
+# Bounded, index-only scan on idx_quiz_sessions_open
+ACTIVE_SESSIONS = Query('active_sessions', """
+    SELECT access_code, start_time, answered_count, bank_version, total_questions
+    FROM quiz_sessions
+    WHERE completed = FALSE AND start_time > %s
+    ORDER BY start_time DESC
+    LIMIT %s
+""")
+
+COMPLETED_SESSIONS = Query('completed_sessions', """
+    SELECT access_code, start_time, end_time, score, total_questions
+    FROM quiz_sessions
+    WHERE completed = TRUE
+    ORDER BY COALESCE(end_time, start_time) DESC
+    LIMIT %s
+""")
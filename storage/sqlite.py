@@ -0,0 +1,705 @@
+"""
+Embedded SQLite backends: a WAL-mode database file and a private in-memory one
+
+SQLiteStorage serves single-node deployments (kiosks, a laptop at a career
+fair) without a database server.  Several gunicorn workers may share the
+file: WAL lets readers run alongside the single writer, and write
+transactions start with BEGIN IMMEDIATE so they queue on busy_timeout
+instead of failing halfway.  Events are delivered to listeners in the
+process that committed them, so the live admin view only sees sessions
+handled by its own worker; run one worker (gevent) for a complete view.
+
+MemoryStorage keeps everything in one process-private in-memory database
+(tests, benchmarks, the dev server).  It must not be used with more than
+one worker, since every process would get its own empty database.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from metrics import record_query
+from storage.base import EXPORT_FILTERS, FINISHED_AT, HISTORY_FILTERS, AnswerSet, ItemStats, Storage, Transaction
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS quiz_sessions (
+        access_code TEXT PRIMARY KEY,
+        start_time TEXT NOT NULL,
+        questions_data TEXT,
+        completed INTEGER NOT NULL DEFAULT 0,
+        end_time TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        score INTEGER DEFAULT 0,
+        total_questions INTEGER DEFAULT 0,
+        bank_version TEXT,
+        question_order TEXT,
+        answered_count INTEGER NOT NULL DEFAULT 0,
+        last_activity TEXT,
+        results TEXT
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_quiz_sessions_completed
+    ON quiz_sessions (completed, start_time);
+
+    CREATE INDEX IF NOT EXISTS idx_quiz_sessions_active
+    ON quiz_sessions (start_time DESC) WHERE completed = 0;
+
+    CREATE INDEX IF NOT EXISTS idx_quiz_sessions_history
+    ON quiz_sessions (COALESCE(end_time, start_time) DESC, access_code DESC) WHERE completed = 1;
+
+    CREATE INDEX IF NOT EXISTS idx_quiz_sessions_created
+    ON quiz_sessions (created_at);
+
+    -- Completed sessions moved out by archive_sessions(): graded results
+    -- only, no answers and no bank copy
+    CREATE TABLE IF NOT EXISTS session_archive (
+        access_code TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT,
+        score INTEGER NOT NULL,
+        total_questions INTEGER NOT NULL,
+        bank_version TEXT,
+        question_order TEXT,
+        results TEXT NOT NULL
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS quiz_answers (
+        access_code TEXT NOT NULL,
+        question_id INTEGER NOT NULL,
+        answer TEXT NOT NULL,
+        answered_at TEXT NOT NULL,
+        seq INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (access_code, question_id)
+    ) WITHOUT ROWID;
+
+    -- Single-row counter behind reserve_code_block(), and key/value settings
+    CREATE TABLE IF NOT EXISTS code_blocks (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        next_block INTEGER NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS app_settings (
+        name TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS question_banks (
+        version TEXT PRIMARY KEY,
+        bank_data TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+
+    CREATE TABLE IF NOT EXISTS bank_stats (
+        bank_version TEXT NOT NULL,
+        shard INTEGER NOT NULL,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        score_sum INTEGER NOT NULL DEFAULT 0,
+        score_sq_sum INTEGER NOT NULL DEFAULT 0,
+        total_sum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (bank_version, shard)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS question_stats (
+        bank_version TEXT NOT NULL,
+        question_id INTEGER NOT NULL,
+        shard INTEGER NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        answered INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        score_sum INTEGER NOT NULL DEFAULT 0,
+        score_sq_sum INTEGER NOT NULL DEFAULT 0,
+        correct_score_sum INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (bank_version, question_id, shard)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS option_stats (
+        bank_version TEXT NOT NULL,
+        question_id INTEGER NOT NULL,
+        choice TEXT NOT NULL,
+        shard INTEGER NOT NULL,
+        picks INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (bank_version, question_id, choice, shard)
+    ) WITHOUT ROWID;
+"""
+
+SESSION_COLUMNS = """
+    access_code, start_time, end_time, completed, score, total_questions,
+    bank_version, question_order, questions_data, results
+"""
+
+# Columns added after the first embedded schema: (table, column, definition)
+ADDED_COLUMNS = (
+    ('quiz_sessions', 'results', 'TEXT'),
+)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+def _ts(value):
+    """datetime -> sortable ISO text (timestamps are stored as TEXT)"""
+    return value.isoformat(sep=' ', timespec='microseconds') if value is not None else None
+
+
+def _dt(value):
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _session(row):
+    if row is None:
+        return None
+    session = dict(row)
+    session['start_time'] = _dt(session['start_time'])
+    session['end_time'] = _dt(session['end_time'])
+    session['completed'] = bool(session['completed'])
+    if session['question_order'] is not None:
+        session['question_order'] = tuple(json.loads(session['question_order']))
+    return session
+
+
+def _placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def _export_filters(filters):
+    """WHERE clause for export_completed(); only set filters become conditions"""
+    conditions = ['completed = 1']
+    params = []
+    for column, operator, key in EXPORT_FILTERS:
+        value = filters.get(key)
+        if value is not None:
+            conditions.append(f"{column} {operator} ?")
+            params.append(_ts(value) if isinstance(value, datetime) else value)
+    return ' AND '.join(conditions), params
+
+
+class SQLiteTransaction(Transaction):
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.events = []
+
+    def _execute(self, sql, params=()):
+        started = time.perf_counter()
+        try:
+            return self.conn.execute(sql, params)
+        finally:
+            record_query(time.perf_counter() - started)
+
+    def _executemany(self, sql, rows):
+        started = time.perf_counter()
+        try:
+            return self.conn.executemany(sql, rows)
+        finally:
+            record_query(time.perf_counter() - started)
+
+    # -- sessions ----------------------------------------------------------
+
+    def insert_sessions(self, rows):
+        inserted = []
+        for code, start_time, bank_version, question_order, total in rows:
+            cur = self._execute("""
+                INSERT INTO quiz_sessions (access_code, created_at, start_time, bank_version,
+                                           question_order, total_questions)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (access_code) DO NOTHING
+            """, (code, _ts(start_time), _ts(start_time), bank_version, json.dumps(list(question_order)), total))
+            if cur.rowcount:
+                inserted.append(code)
+        return inserted
+
+    def fetch_session(self, access_code):
+        cur = self._execute(f"SELECT {SESSION_COLUMNS} FROM quiz_sessions WHERE access_code = ?",
+                            (access_code,))
+        return _session(cur.fetchone())
+
+    def session_is_open(self, access_code):
+        cur = self._execute("SELECT 1 FROM quiz_sessions WHERE access_code = ? AND completed = 0",
+                            (access_code,))
+        return cur.fetchone() is not None
+
+    def fetch_submission(self, access_code):
+        # In-process reads: no round trip to save by combining them
+        session = self.fetch_session(access_code)
+        if session is None:
+            return None, None
+        return session, self.fetch_answers(access_code)
+
+    def complete_session(self, access_code, end_time, score, total, results):
+        cur = self._execute("""
+            UPDATE quiz_sessions
+            SET completed = 1, end_time = ?, score = ?, total_questions = ?, results = ?
+            WHERE access_code = ? AND completed = 0
+        """, (_ts(end_time), score, total, results, access_code))
+        return cur.rowcount > 0
+
+    def claim_session(self, access_code, time_limit):
+        row = self._execute(f"SELECT {SESSION_COLUMNS} FROM quiz_sessions WHERE access_code = ? AND completed = 0",
+                            (access_code,)).fetchone()
+        if row is None:
+            return None
+        session = _session(row)
+        session['completed'] = True
+        session['end_time'] = session['start_time'] + timedelta(seconds=time_limit)
+        self._execute("UPDATE quiz_sessions SET completed = 1, end_time = ? WHERE access_code = ?",
+                      (_ts(session['end_time']), access_code))
+        return session
+
+    def claim_overdue(self, time_limits, default_limit, now, batch_size):
+        # The write transaction already excludes other claimers.  Each session
+        # runs out on its own bank's limit; the shortest one bounds the scan
+        shortest = min([default_limit, *time_limits.values()])
+        cur = self._execute(f"""
+            SELECT {SESSION_COLUMNS}, COALESCE(l.value, ?) AS time_limit
+            FROM quiz_sessions LEFT JOIN json_each(?) l ON l.key = bank_version
+            WHERE completed = 0 AND start_time < ?
+              AND julianday(start_time) + COALESCE(l.value, ?) / 86400.0 < julianday(?)
+            ORDER BY start_time
+            LIMIT ?
+        """, (default_limit, json.dumps(time_limits), _ts(now - timedelta(seconds=shortest)),
+              default_limit, _ts(now), batch_size))
+        sessions = []
+        for row in cur.fetchall():
+            time_limit = row.pop('time_limit')
+            session = _session(row)
+            session['completed'] = True
+            session['end_time'] = session['start_time'] + timedelta(seconds=time_limit)
+            sessions.append(session)
+        self._executemany("UPDATE quiz_sessions SET completed = 1, end_time = ? WHERE access_code = ?",
+                          [(_ts(s['end_time']), s['access_code']) for s in sessions])
+        return sessions
+
+    def set_scores(self, scores):
+        self._executemany("""
+            UPDATE quiz_sessions SET score = ?, total_questions = ?, results = ?
+            WHERE access_code = ?
+        """, [(score, total, results, code) for code, score, total, results in scores])
+
+    def set_bank_version(self, access_codes, bank_version):
+        self._executemany("UPDATE quiz_sessions SET bank_version = ? WHERE access_code = ?",
+                          [(bank_version, code) for code in access_codes])
+
+    def completed_after(self, after_code, limit, bank_version=None, missing_results=False):
+        cur = self._execute(f"""
+            SELECT {SESSION_COLUMNS} FROM quiz_sessions
+            WHERE completed = 1 AND access_code > ?
+              AND (? IS NULL OR bank_version = ?)
+              AND (NOT ? OR results IS NULL)
+            ORDER BY access_code
+            LIMIT ?
+        """, (after_code, bank_version, bank_version, missing_results, limit))
+        return [_session(row) for row in cur.fetchall()]
+
+    def active_sessions(self, cutoff, limit):
+        cur = self._execute("""
+            SELECT access_code, start_time, answered_count, bank_version, total_questions
+            FROM quiz_sessions
+            WHERE completed = 0 AND start_time > ?
+            ORDER BY start_time DESC
+            LIMIT ?
+        """, (_ts(cutoff), limit))
+        return [dict(row, start_time=_dt(row['start_time'])) for row in cur.fetchall()]
+
+    def completed_sessions(self, limit):
+        cur = self._execute("""
+            SELECT access_code, start_time, end_time, score, total_questions
+            FROM quiz_sessions
+            WHERE completed = 1
+            ORDER BY COALESCE(end_time, start_time) DESC
+            LIMIT ?
+        """, (limit,))
+        return [dict(row, start_time=_dt(row['start_time']), end_time=_dt(row['end_time']))
+                for row in cur.fetchall()]
+
+    def count_sessions(self):
+        return self._execute("SELECT COUNT(*) AS session_count FROM quiz_sessions").fetchone()['session_count']
+
+    def search_completed(self, filters, after, limit):
+        conditions = ['completed = 1']
+        params = []
+        for expression, operator, key in HISTORY_FILTERS:
+            value = filters.get(key)
+            if value is not None:
+                conditions.append(f"{expression} {operator} ?")
+                params.append(_ts(value) if isinstance(value, datetime) else value)
+        prefix = filters.get('code_prefix')
+        if prefix:
+            # A range on the primary key (LIKE is case-insensitive and skips the
+            # index); the unary + keeps idx_quiz_sessions_completed out of the way
+            conditions[0] = '+completed = 1'
+            conditions.append("access_code >= ? AND access_code < ?")
+            params.extend([prefix, prefix + '~'])
+        if after is not None:
+            # (finished_at, access_code) < after, spelled out with a plain bound
+            # on finished_at so SQLite seeks into the index instead of scanning it
+            conditions.append(f"{FINISHED_AT} <= ? AND ({FINISHED_AT} < ? OR access_code < ?)")
+            params.extend([_ts(after[0]), _ts(after[0]), after[1]])
+        # Without ANALYZE statistics the planner prefers idx_quiz_sessions_completed
+        # and sorts every completed row
+        index = '' if prefix else 'INDEXED BY idx_quiz_sessions_history'
+
+        cur = self._execute(f"""
+            SELECT access_code, start_time, end_time, {FINISHED_AT} AS finished_at,
+                   score, total_questions, bank_version
+            FROM quiz_sessions {index}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {FINISHED_AT} DESC, access_code DESC
+            LIMIT ?
+        """, params + [limit])
+        return [dict(row, start_time=_dt(row['start_time']), end_time=_dt(row['end_time']),
+                     finished_at=_dt(row['finished_at'])) for row in cur.fetchall()]
+
+    # -- partitions and archive ---------------------------------------------
+
+    def session_partitions(self):
+        return []
+
+    def ensure_partitions(self, bounds):
+        return []
+
+    def archive_sessions(self, before, batch_size):
+        # No partitions to drop: rows move in batches, found by idx_quiz_sessions_created
+        cur = self._execute("""
+            SELECT access_code FROM quiz_sessions
+            WHERE created_at < ? AND completed = 1 AND results IS NOT NULL
+            LIMIT ?
+        """, (_ts(before), batch_size))
+        codes = [(row['access_code'],) for row in cur.fetchall()]
+        self._executemany("""
+            INSERT INTO session_archive (access_code, created_at, start_time, end_time, score,
+                                         total_questions, bank_version, question_order, results)
+            SELECT access_code, created_at, start_time, end_time, COALESCE(score, 0),
+                   COALESCE(total_questions, 0), bank_version, question_order, results
+            FROM quiz_sessions WHERE access_code = ?
+            ON CONFLICT (access_code) DO NOTHING
+        """, codes)
+        self._executemany("DELETE FROM quiz_answers WHERE access_code = ?", codes)
+        self._executemany("DELETE FROM quiz_sessions WHERE access_code = ?", codes)
+
+        held = self._execute("""
+            SELECT COUNT(*) AS held FROM quiz_sessions
+            WHERE created_at < ? AND NOT (completed = 1 AND results IS NOT NULL)
+        """, (_ts(before),)).fetchone()['held']
+        return len(codes), held
+
+    def fetch_archived(self, access_code):
+        cur = self._execute("""
+            SELECT access_code, start_time, end_time, 1 AS completed, score, total_questions,
+                   bank_version, question_order, NULL AS questions_data, results
+            FROM session_archive WHERE access_code = ?
+        """, (access_code,))
+        return _session(cur.fetchone())
+
+    def export_completed(self, filters, chunk_size):
+        where, params = _export_filters(filters)
+        # SQLite steps through the result lazily; the read transaction keeps
+        # the snapshot stable while writers carry on in the WAL
+        cur = self._execute(f"""
+            SELECT access_code, start_time, end_time, score, total_questions,
+                   bank_version, answered_count
+            FROM quiz_sessions
+            WHERE {where}
+            ORDER BY start_time, access_code
+        """, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            for row in rows:
+                row['start_time'] = _dt(row['start_time'])
+                row['end_time'] = _dt(row['end_time'])
+                yield row
+
+    # -- answers -------------------------------------------------------------
+
+    def fetch_answers(self, access_code):
+        return self.fetch_answers_many([access_code])[access_code]
+
+    def fetch_answers_many(self, access_codes):
+        answers = {code: AnswerSet() for code in access_codes}
+        if access_codes:
+            cur = self._execute(f"""
+                SELECT access_code, question_id, answer, answered_at FROM quiz_answers
+                WHERE access_code IN ({_placeholders(access_codes)})
+            """, list(access_codes))
+            for row in cur.fetchall():
+                session_answers = answers[row['access_code']]
+                key = str(row['question_id'])
+                session_answers[key] = json.loads(row['answer'])
+                session_answers.answered_at[key] = _dt(row['answered_at'])
+        return answers
+
+    def upsert_answers(self, access_code, latest, answered_at):
+        written = self.upsert_answers_many([(access_code, question_id, answer, answered_at, seq)
+                                            for question_id, (answer, seq) in latest.items()])
+        return written.get(access_code, (0, None))
+
+    def upsert_answers_many(self, rows):
+        by_session = {}
+        for row in rows:
+            by_session.setdefault(row[0], []).append(row)
+
+        written = {}
+        for access_code, session_rows in by_session.items():
+            if not self.session_is_open(access_code):
+                continue
+
+            question_ids = [row[1] for row in session_rows]
+            cur = self._execute(f"""
+                SELECT question_id FROM quiz_answers
+                WHERE access_code = ? AND question_id IN ({_placeholders(question_ids)})
+            """, [access_code] + question_ids)
+            existing = {row['question_id'] for row in cur.fetchall()}
+
+            cur = self._executemany("""
+                INSERT INTO quiz_answers (access_code, question_id, answer, answered_at, seq)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (access_code, question_id)
+                DO UPDATE SET answer = excluded.answer, answered_at = excluded.answered_at, seq = excluded.seq
+                WHERE quiz_answers.seq <= excluded.seq
+            """, [(access_code, question_id, json.dumps(answer), _ts(answered_at), seq)
+                  for _, question_id, answer, answered_at, seq in session_rows])
+            saved = cur.rowcount
+            if not saved:
+                continue
+
+            cur = self._execute("""
+                UPDATE quiz_sessions
+                SET answered_count = answered_count + ?, last_activity = ?
+                WHERE access_code = ?
+                RETURNING answered_count
+            """, (len(set(question_ids) - existing), _ts(max(row[3] for row in session_rows)), access_code))
+            written[access_code] = (saved, cur.fetchone()['answered_count'])
+        return written
+
+    # -- access codes --------------------------------------------------------
+
+    def reserve_code_block(self):
+        cur = self._execute("""
+            INSERT INTO code_blocks (id, next_block) VALUES (1, 1)
+            ON CONFLICT (id) DO UPDATE SET next_block = next_block + 1
+            RETURNING next_block - 1 AS block
+        """)
+        return cur.fetchone()['block']
+
+    def setting(self, name, default=None):
+        if default is not None:
+            self._execute("INSERT INTO app_settings (name, value) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                          (name, default))
+        row = self._execute("SELECT value FROM app_settings WHERE name = ?", (name,)).fetchone()
+        return row['value'] if row else None
+
+    def save_setting(self, name, value):
+        self._execute("""
+            INSERT INTO app_settings (name, value) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET value = excluded.value
+        """, (name, value))
+
+    # -- question banks ------------------------------------------------------
+
+    def load_bank(self, version):
+        row = self._execute("SELECT bank_data FROM question_banks WHERE version = ?", (version,)).fetchone()
+        return row['bank_data'] if row else None
+
+    def bank_versions(self):
+        return [row['version'] for row in self._execute("SELECT version FROM question_banks").fetchall()]
+
+    def save_bank(self, version, bank_data):
+        self._execute("INSERT INTO question_banks (version, bank_data) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                      (version, bank_data))
+
+    # -- item statistics -----------------------------------------------------
+
+    def graded_after(self, after_code, limit):
+        cur = self._execute("""
+            SELECT * FROM (
+                SELECT access_code, bank_version, results FROM quiz_sessions
+                WHERE access_code > ? AND results IS NOT NULL
+                ORDER BY access_code
+                LIMIT ?
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT access_code, bank_version, results FROM session_archive
+                WHERE access_code > ?
+                ORDER BY access_code
+                LIMIT ?
+            )
+            ORDER BY access_code
+            LIMIT ?
+        """, (after_code, limit, after_code, limit, limit))
+        return cur.fetchall()
+
+    def add_item_stats(self, stats, shard):
+        # Rows go in key order so concurrent writers lock them in the same order
+        self._executemany("""
+            INSERT INTO bank_stats (bank_version, shard, sessions, score_sum, score_sq_sum, total_sum)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (bank_version, shard) DO UPDATE SET
+                sessions = sessions + excluded.sessions,
+                score_sum = score_sum + excluded.score_sum,
+                score_sq_sum = score_sq_sum + excluded.score_sq_sum,
+                total_sum = total_sum + excluded.total_sum
+        """, [(version, shard, *counters) for version, counters in sorted(stats.banks.items())])
+        self._executemany("""
+            INSERT INTO question_stats (bank_version, question_id, shard, attempts, answered, correct,
+                                        score_sum, score_sq_sum, correct_score_sum)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (bank_version, question_id, shard) DO UPDATE SET
+                attempts = attempts + excluded.attempts,
+                answered = answered + excluded.answered,
+                correct = correct + excluded.correct,
+                score_sum = score_sum + excluded.score_sum,
+                score_sq_sum = score_sq_sum + excluded.score_sq_sum,
+                correct_score_sum = correct_score_sum + excluded.correct_score_sum
+        """, [(version, qid, shard, *counters) for (version, qid), counters in sorted(stats.questions.items())])
+        self._executemany("""
+            INSERT INTO option_stats (bank_version, question_id, choice, shard, picks)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (bank_version, question_id, choice, shard) DO UPDATE SET
+                picks = picks + excluded.picks
+        """, [(version, qid, choice, shard, picks)
+              for (version, qid, choice), picks in sorted(stats.options.items())])
+
+    def lock_item_stats(self):
+        # Write transactions already exclude each other
+        pass
+
+    def read_snapshot(self):
+        # A WAL read transaction already sees one snapshot from its first read
+        pass
+
+    def item_stats(self, bank_version):
+        cur = self._execute("""
+            SELECT SUM(sessions) AS sessions, SUM(score_sum) AS score_sum,
+                   SUM(score_sq_sum) AS score_sq_sum, SUM(total_sum) AS total_sum
+            FROM bank_stats WHERE bank_version = ?
+        """, (bank_version,))
+        banks = {bank_version: list(row.values()) for row in cur.fetchall() if row['sessions']}
+        cur = self._execute("""
+            SELECT question_id, SUM(attempts) AS attempts, SUM(answered) AS answered,
+                   SUM(correct) AS correct, SUM(score_sum) AS score_sum,
+                   SUM(score_sq_sum) AS score_sq_sum, SUM(correct_score_sum) AS correct_score_sum
+            FROM question_stats WHERE bank_version = ?
+            GROUP BY question_id
+            HAVING SUM(attempts) > 0
+        """, (bank_version,))
+        questions = {(bank_version, row.pop('question_id')): list(row.values()) for row in cur.fetchall()}
+        cur = self._execute("""
+            SELECT question_id, choice, SUM(picks) AS picks
+            FROM option_stats WHERE bank_version = ?
+            GROUP BY question_id, choice
+            HAVING SUM(picks) > 0
+        """, (bank_version,))
+        options = {(bank_version, row['question_id'], row['choice']): row['picks'] for row in cur.fetchall()}
+        return ItemStats(banks, questions, options)
+
+    def item_stats_versions(self):
+        cur = self._execute("""
+            SELECT bank_version, SUM(sessions) AS sessions FROM bank_stats
+            GROUP BY bank_version
+            HAVING SUM(sessions) > 0
+            ORDER BY sessions DESC
+        """)
+        return [(row['bank_version'], row['sessions']) for row in cur.fetchall()]
+
+    # -- events --------------------------------------------------------------
+
+    def publish(self, event):
+        self.events.append(event)
+
+
+class SQLiteStorage(Storage):
+    """SQLite database file in WAL mode, one connection per thread"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, busy_timeout=10.0):
+        super().__init__()
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = _dict_row
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL + NORMAL: a commit is durable once checkpointed; a crash can lose
+        # only the last few transactions, never corrupt the file
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _connection(self):
+        # Connections are per thread and never cross a fork
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.conn = self._connect()
+            self._local.pid = pid
+            self._local.tx = None
+        return self._local.conn
+
+    @contextmanager
+    def transaction(self, write=True):
+        conn = self._connection()
+        if self._local.tx is not None:
+            # Nested use in the same thread joins the outer transaction
+            yield self._local.tx
+            return
+
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        tx = self._local.tx = SQLiteTransaction(conn)
+        try:
+            yield tx
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.tx = None
+        self._deliver(tx.events)
+
+    def init_schema(self, bank, quiz_data):
+        # Every statement is IF NOT EXISTS, so workers booting together are harmless
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        with self.transaction() as tx:
+            for table, column, definition in ADDED_COLUMNS:
+                columns = {row['name'] for row in tx.conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    tx.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        with self.transaction() as tx:
+            tx.save_bank(bank.version, json.dumps(quiz_data))
+
+
+class MemoryStorage(SQLiteStorage):
+    """Process-private in-memory SQLite database; transactions are serialized by a lock"""
+
+    name = 'memory'
+
+    def __init__(self):
+        super().__init__(':memory:')
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def _connection(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            self._local.pid = pid
+            self._local.tx = None
+        if self._conn is None:
+            self._conn = sqlite3.connect(':memory:', isolation_level=None, check_same_thread=False)
+            self._conn.row_factory = _dict_row
+        return self._conn
+
+    @contextmanager
+    def transaction(self, write=True):
+        with self._lock:
+            with super().transaction(write) as tx:
+                yield tx
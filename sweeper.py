@@ -0,0 +1,137 @@
+"""
+Background expiry sweeper
+
+Sessions past their bank's time limit are expired in set-based batches instead of one
+row at a time when a candidate happens to reopen the quiz.  Each batch:
+
+    1. claims up to batch_size overdue open sessions (on Postgres one
+       UPDATE with FOR UPDATE SKIP LOCKED, so concurrent sweepers never collide),
+    2. loads the answers of all claimed sessions with one query,
+    3. grades them in Python and writes every score and packed result with
+       one UPDATE, adding the batch to the item statistics in one go.
+
+A session found overdue when its candidate reopens the quiz goes through
+the same grading with expire_session().
+
+Run it with  flask expire-sessions  (cron / Heroku scheduler), or in-process
+by setting SWEEPER_INTERVAL (seconds) so every worker sweeps periodically.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+import analytics
+import answer_log
+from cache import SESSION_CACHE
+from metrics import SCORING_SECONDS
+from scoring import pack_outcomes
+
+SWEEPER_INTERVAL = int(os.environ.get('SWEEPER_INTERVAL', 0))
+
+
+def expire_batch(tx, time_limits, resolve_questions, batch_size):
+    """
+    Expire and grade one batch of overdue sessions; returns the expired codes.
+    time_limits(tx) gives ({bank version: seconds}, limit for sessions without one).
+    """
+    limits, default_limit = time_limits(tx)
+    # Claiming closes the sessions, so buffered answers have to land first
+    answer_log.apply_pending(tx)
+    sessions = tx.claim_overdue(limits, default_limit, datetime.now(), batch_size)
+    return _grade_expired(tx, sessions, resolve_questions)
+
+
+def expire_session(tx, access_code, time_limit, resolve_questions):
+    """Expire and grade one overdue session (found on page load); False if it was already closed"""
+    answer_log.apply_pending(tx, [access_code])
+    session = tx.claim_session(access_code, time_limit)
+    if session is None:
+        return False
+    _grade_expired(tx, [session], resolve_questions)
+    return True
+
+
+def _grade_expired(tx, sessions, resolve_questions):
+    """Grade claimed sessions, store their scores and item statistics; returns their codes"""
+    if not sessions:
+        return []
+
+    codes = [session['access_code'] for session in sessions]
+    answers = tx.fetch_answers_many(codes)
+
+    scores = []
+    graded = []
+    with SCORING_SECONDS.time('sweeper'):
+        for session in sessions:
+            bank, questions = resolve_questions(tx, session)
+            session_answers = answers[session['access_code']]
+            result = bank.score(questions, session_answers)
+            scores.append((session['access_code'], result.score, result.total,
+                           pack_outcomes(result, session_answers.answered_at, session['start_time'])))
+            graded.append((session['bank_version'], result.outcomes))
+
+    tx.set_scores(scores)
+    analytics.record(tx, graded)
+    tx.publish({'type': 'expired', 'codes': codes})
+    return codes
+
+
+def sweep(store, time_limits, resolve_questions, batch_size=500):
+    """Expire every overdue session, committing per batch; returns a report dict"""
+    started = time.monotonic()
+    expired = 0
+    batches = 0
+
+    while True:
+        with store.transaction() as tx:
+            codes = expire_batch(tx, time_limits, resolve_questions, batch_size)
+        SESSION_CACHE.invalidate(*codes)
+        count = len(codes)
+        if count:
+            expired += count
+            batches += 1
+        if count < batch_size:
+            break
+
+    return {
+        'success': True,
+        'expired': expired,
+        'batches': batches,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+_thread = None
+_thread_pid = None
+_thread_lock = threading.Lock()
+
+
+def ensure_sweeper(store, time_limits, resolve_questions, interval=SWEEPER_INTERVAL):
+    """
+    Start this worker's periodic sweeper thread once (no-op when interval is 0).
+    time_limits is called for every batch, so reloaded banks take effect.
+    """
+    global _thread, _thread_pid
+    if interval <= 0:
+        return
+    pid = os.getpid()
+    if _thread is not None and _thread_pid == pid:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                report = sweep(store, time_limits, resolve_questions)
+                if report.get('expired'):
+                    print(f"🧹 Expired {report['expired']} sessions in {report['seconds']}s")
+            except Exception as e:
+                print(f"❌ Sweeper error: {str(e)}")
+
+    with _thread_lock:
+        if _thread is None or _thread_pid != pid:
+            _thread = threading.Thread(target=run, name='expiry-sweeper', daemon=True)
+            _thread_pid = pid
+            _thread.start()
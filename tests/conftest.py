@@ -0,0 +1,40 @@
+import os
+
+import pytest
+
+from storage import SQLiteStorage
+
+# The app builds its store and answer log at import time: in-memory SQLite,
+# answers written directly, no background sweeper
+os.environ['DATABASE_URL'] = 'memory://'
+os.environ.pop('ANSWER_LOG_DIR', None)
+os.environ.pop('SWEEPER_INTERVAL', None)
+
+
+@pytest.fixture
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def bank(app_module):
+    return app_module.REGISTRY.get().bank
+
+
+@pytest.fixture
+def fresh_store(app_module, tmp_path, monkeypatch):
+    """An empty SQLite database behind the app, for tests that look at every row"""
+    store = SQLiteStorage(str(tmp_path / 'quiz.db'))
+    monkeypatch.setattr(app_module, 'STORE', store)
+    app_module.init_database()
+    return store
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'slow: starts real servers; deselect with -m "not slow"')
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+import pytest
+
+import access_codes
+from access_codes import CODE_BLOCK_SIZE, CodeAllocator
+from storage import SQLiteStorage
+from storage.sqlite import SCHEMA
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv('ACCESS_CODE_KEY', 'test-key')
+    store = SQLiteStorage(str(tmp_path / 'quiz.db'))
+    store._connection().executescript(SCHEMA)
+    return store
+
+
+def test_codes_are_unique_across_blocks(store):
+    codes = CodeAllocator(store).take(CODE_BLOCK_SIZE * 2 + 10)
+    assert len(set(codes)) == len(codes)
+    assert all(len(code) == access_codes.CODE_LENGTH for code in codes)
+
+
+def test_rolled_back_work_does_not_release_the_block(store):
+    # As in create_sessions(): codes first, then the insert, which fails here
+    codes = CodeAllocator(store).take(3)
+    with pytest.raises(RuntimeError):
+        with store.transaction() as tx:
+            tx.insert_sessions([(code, datetime.now(), None, [1], 1) for code in codes])
+            raise RuntimeError('insert failed')
+
+    # Another worker reserving next must get a different block
+    second = CodeAllocator(store)
+    assert not set(second.take(CODE_BLOCK_SIZE)) & set(codes)
+    with store.transaction(write=False) as tx:
+        assert tx.conn.execute("SELECT next_block FROM code_blocks").fetchone()['next_block'] >= 2
@@ -0,0 +1,50 @@
+import random
+from datetime import datetime, timedelta
+
+import analytics
+import sweeper
+
+
+def counters(store, bank):
+    with store.transaction(write=False) as tx:
+        return tx.item_stats(bank.version)
+
+
+def graded_sessions(app_module, client, bank, count):
+    """Submit `count` sessions with random answers, plus one left to the sweeper"""
+    rng = random.Random(17)
+    codes = app_module.create_sessions(count + 1, bank)
+    for code in codes:
+        client.post('/submit_answers', json={'access_code': code, 'answers': [
+            {'question_id': question.id, 'answer': rng.randrange(4), 'seq': 1}
+            for question in bank.questions if rng.random() < 0.8
+        ]})
+    for code in codes[:-1]:
+        client.post('/submit_quiz', json={'access_code': code})
+    with app_module.STORE.transaction() as tx:
+        tx.conn.execute("UPDATE quiz_sessions SET start_time = ? WHERE access_code = ?",
+                        ((datetime.now() - timedelta(seconds=bank.time_limit + 60)).isoformat(sep=' '), codes[-1]))
+    sweeper.sweep(app_module.STORE, app_module.time_limits, app_module.session_questions)
+
+
+def test_rebuild_matches_the_incremental_counters(app_module, client, bank, fresh_store):
+    graded_sessions(app_module, client, bank, 12)
+    incremental = counters(fresh_store, bank)
+    assert incremental.banks[bank.version][0] == 13
+
+    analytics.rebuild(fresh_store, batch_size=5)
+
+    assert counters(fresh_store, bank) == incremental
+
+
+def test_rebuild_repairs_lost_counters(app_module, client, bank, fresh_store):
+    graded_sessions(app_module, client, bank, 6)
+    incremental = counters(fresh_store, bank)
+    with fresh_store.transaction() as tx:
+        tx.conn.execute("DELETE FROM question_stats")
+        tx.conn.execute("DELETE FROM option_stats")
+    assert counters(fresh_store, bank) != incremental
+
+    analytics.rebuild(fresh_store)
+
+    assert counters(fresh_store, bank) == incremental
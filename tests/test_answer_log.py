@@ -0,0 +1,120 @@
+import json
+import os
+
+import pytest
+
+import answer_log as answer_log_module
+from answer_log import AnswerLog
+
+
+@pytest.fixture
+def answer_log(app_module, tmp_path, monkeypatch):
+    log = AnswerLog(str(tmp_path / 'answers'), flush_ms=60000)
+    monkeypatch.setattr(app_module, 'ANSWER_LOG', log)
+    monkeypatch.setattr(answer_log_module, 'ANSWER_LOG', log)
+    log.start(app_module.STORE)
+    return log
+
+
+def answer(client, code, question, value, seq):
+    return client.post('/submit_answers', json={
+        'access_code': code, 'answers': [{'question_id': question.id, 'answer': value, 'seq': seq}],
+    }).get_json()
+
+
+def stored_answers(app_module, code):
+    with app_module.STORE.transaction(write=False) as tx:
+        return tx.fetch_answers_many([code])[code]
+
+
+def test_logged_answers_are_acknowledged_as_logged(app_module, client, bank, answer_log):
+    code, = app_module.create_sessions(1, bank)
+    result = answer(client, code, bank.questions[0], 1, 1)
+    assert result['success'] and result['logged'] == 1 and 'saved' not in result
+
+    assert answer_log.flush() == 1
+    assert stored_answers(app_module, code) == {str(bank.questions[0].id): 1}
+
+
+def test_answer_after_another_worker_closed_the_session_is_refused(app_module, client, bank, answer_log):
+    code, = app_module.create_sessions(1, bank)
+    assert client.get(f'/quiz/{code}').status_code == 200   # cached as open in this worker
+    assert answer(client, code, bank.questions[0], 1, 1)['success']
+
+    # Completed elsewhere: only the database knows
+    with app_module.STORE.transaction() as tx:
+        answer_log.apply_pending(tx, [code])
+        tx.claim_session(code, bank.time_limit)
+    assert not app_module.SESSION_CACHE.get(code)['completed']
+
+    assert not answer(client, code, bank.questions[0], 2, 2)['success']
+    answer_log.flush()
+    assert stored_answers(app_module, code) == {str(bank.questions[0].id): 1}
+
+
+def test_flush_counts_answers_for_closed_sessions_as_dropped(app_module, bank, answer_log):
+    code, = app_module.create_sessions(1, bank)
+    with app_module.STORE.transaction() as tx:
+        tx.claim_session(code, bank.time_limit)
+    answer_log.append(code, {bank.questions[0].id: (1, 1)}, app_module.datetime.now())
+
+    answer_log.flush()
+    assert answer_log.stats()['dropped_answers'] == 1
+    assert stored_answers(app_module, code) == {}
+
+
+def dead_worker_segment(log, name, batches):
+    """A segment as a killed worker leaves it: complete lines, no lock held"""
+    path = os.path.join(log.directory, f'answers-{name}.log')
+    with open(path, 'w') as f:
+        for code, answered_at, answers in batches:
+            f.write(json.dumps([code, answered_at.isoformat(), answers]) + '\n')
+    return path
+
+
+def test_restarted_worker_replays_a_crashed_workers_segment(app_module, bank, answer_log):
+    code, = app_module.create_sessions(1, bank)
+    first, second = bank.questions[0].id, bank.questions[1].id
+    path = dead_worker_segment(answer_log, '99999-1-1', [
+        (code, app_module.datetime.now(), [[first, 1, 1]]),
+        (code, app_module.datetime.now(), [[first, 2, 2], [second, 0, 2]]),
+    ])
+
+    restarted = AnswerLog(answer_log.directory, flush_ms=60000)
+    restarted.start(app_module.STORE)
+
+    assert not os.path.exists(path)
+    assert stored_answers(app_module, code) == {str(first): 2, str(second): 0}
+
+
+def test_submit_grades_answers_still_in_the_log(app_module, client, bank, answer_log):
+    code, = app_module.create_sessions(1, bank)
+    question = bank.questions[0]
+    assert answer(client, code, question, bank.source[question.id]['correct'], 1)['logged'] == 1
+    assert stored_answers(app_module, code) == {}
+
+    result = client.post('/submit_quiz', json={'access_code': code}).get_json()
+
+    assert result['success'] and result['score'] == 1
+    assert stored_answers(app_module, code) == {str(question.id): bank.source[question.id]['correct']}
+
+
+def test_replaying_a_segment_again_changes_nothing(app_module, client, bank, answer_log):
+    code, = app_module.create_sessions(1, bank)
+    first, second = bank.questions[0].id, bank.questions[1].id
+    batches = [(code, app_module.datetime.now(), [[first, 1, 1], [second, 1, 1]])]
+    dead_worker_segment(answer_log, '99999-1-1', batches)
+    answer_log.flush()
+    # The candidate changes an answer after the first replay
+    answer(client, code, bank.questions[0], 3, 2)
+    answer_log.flush()
+    expected = stored_answers(app_module, code)
+
+    # The same segment turns up again (e.g. a copy restored from backup)
+    dead_worker_segment(answer_log, '99999-1-1', batches)
+    answer_log.flush()
+
+    assert stored_answers(app_module, code) == expected == {str(first): 3, str(second): 1}
+    with app_module.STORE.transaction(write=False) as tx:
+        assert [row['answered_count'] for row in tx.active_sessions(app_module.datetime(2000, 1, 1), 100000)
+                if row['access_code'] == code] == [2]
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+from storage import SQLiteStorage
+from storage.sqlite import SCHEMA
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStorage(str(tmp_path / 'quiz.db'))
+    store._connection().executescript(SCHEMA)
+    with store.transaction() as tx:
+        tx.insert_sessions([(code, datetime.now(), 'v1', [1, 2, 3], 3) for code in ('OPEN01', 'OPEN02', 'DONE01')])
+        tx.complete_session('DONE01', datetime.now(), 0, 3, None)
+    return store
+
+
+def upsert(store, code, latest):
+    with store.transaction() as tx:
+        return tx.upsert_answers(code, latest, datetime.now())
+
+
+def stored(store, code):
+    with store.transaction(write=False) as tx:
+        row = tx.conn.execute("SELECT answered_count FROM quiz_sessions WHERE access_code = ?", (code,)).fetchone()
+        return dict(tx.fetch_answers_many([code])[code]), row['answered_count']
+
+
+def test_older_seq_does_not_overwrite_a_newer_answer(store):
+    upsert(store, 'OPEN01', {1: ('b', 5)})
+    upsert(store, 'OPEN01', {1: ('a', 4)})
+    assert stored(store, 'OPEN01') == ({'1': 'b'}, 1)
+
+
+def test_answered_count_counts_only_new_questions(store):
+    assert upsert(store, 'OPEN01', {1: ('a', 1), 2: ('a', 1)}) == (2, 2)
+    assert upsert(store, 'OPEN01', {2: ('b', 2), 3: ('a', 2)}) == (2, 3)
+    assert stored(store, 'OPEN01') == ({'1': 'a', '2': 'b', '3': 'a'}, 3)
+
+
+def test_answers_to_a_completed_session_are_rejected(store):
+    assert upsert(store, 'DONE01', {1: ('a', 1)}) == (0, None)
+    assert stored(store, 'DONE01') == ({}, 0)
+
+
+def upsert_many(store, rows):
+    now = datetime.now()
+    with store.transaction() as tx:
+        return tx.upsert_answers_many([(code, question_id, answer, now, seq)
+                                       for code, question_id, answer, seq in rows])
+
+
+def test_replayed_batch_changes_nothing(store):
+    batch = [('OPEN01', 1, 'a', 3), ('OPEN01', 2, 'b', 3), ('OPEN02', 1, 'c', 7)]
+    upsert_many(store, batch)
+    upsert_many(store, [('OPEN01', 1, 'z', 4)])
+
+    written = upsert_many(store, batch)
+
+    assert written['OPEN01'][1] == 2 and written['OPEN02'][1] == 1
+    assert stored(store, 'OPEN01') == ({'1': 'z', '2': 'b'}, 2)
+    assert stored(store, 'OPEN02') == ({'1': 'c'}, 1)
+
+
+def test_batch_skips_completed_sessions(store):
+    written = upsert_many(store, [('OPEN01', 1, 'a', 1), ('DONE01', 1, 'a', 1)])
+    assert set(written) == {'OPEN01'}
+    assert stored(store, 'DONE01') == ({}, 0)
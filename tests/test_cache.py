@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import cache
+import sweeper
+from cache import TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    entries = TTLCache(maxsize=10, ttl=30)
+    entries.set('A', 1)
+
+    clock.now += 29
+    assert entries.get('A') == 1
+    clock.now += 2
+    assert entries.get('A') is None
+    assert entries.stats()['size'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    entries = TTLCache(maxsize=2, ttl=30)
+    entries.set('A', 1)
+    entries.set('B', 2)
+    entries.get('A')
+    entries.set('C', 3)
+
+    assert entries.get('B') is None
+    assert entries.get('A') == 1 and entries.get('C') == 3
+    assert entries.stats()['evictions'] == 1
+
+
+def test_stats_count_hits_misses_and_invalidations():
+    entries = TTLCache(maxsize=10, ttl=30)
+    entries.set('A', 1)
+    entries.get('A')
+    entries.get('B')
+    entries.invalidate('A', 'B')
+
+    stats = entries.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (1, 1, 1)
+    assert stats['hit_ratio'] == 0.5
+
+
+def test_cache_stats_route_reports_page_loads(app_module, client, bank):
+    code, = app_module.create_sessions(1, bank)
+    before = client.get('/cache_stats').get_json()['session_cache']
+    client.get(f'/quiz/{code}')
+    client.get(f'/quiz/{code}')
+
+    after = client.get('/cache_stats').get_json()['session_cache']
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 1
+
+
+def test_submit_invalidates_the_cached_session(app_module, client, bank):
+    code, = app_module.create_sessions(1, bank)
+    assert client.get(f'/quiz/{code}').status_code == 200
+    assert app_module.SESSION_CACHE.get(code) is not None
+
+    client.post('/submit_quiz', json={'access_code': code})
+
+    assert app_module.SESSION_CACHE.get(code) is None
+    assert client.get(f'/quiz/{code}').status_code == 410
+
+
+def backdate(app_module, code, seconds):
+    with app_module.STORE.transaction() as tx:
+        tx.conn.execute("UPDATE quiz_sessions SET start_time = ? WHERE access_code = ?",
+                        ((datetime.now() - timedelta(seconds=seconds)).isoformat(sep=' '), code))
+
+
+def test_page_load_expiry_invalidates_the_cached_session(app_module, client, bank):
+    code, = app_module.create_sessions(1, bank)
+    backdate(app_module, code, bank.time_limit + 60)
+    assert client.get(f'/quiz/{code}').status_code == 410
+
+    assert app_module.SESSION_CACHE.get(code) is None
+    with app_module.STORE.transaction(write=False) as tx:
+        assert tx.fetch_session(code)['completed']
+
+
+def test_sweeper_expiry_invalidates_the_cached_session(app_module, client, bank):
+    code, = app_module.create_sessions(1, bank)
+    assert client.get(f'/quiz/{code}').status_code == 200
+    backdate(app_module, code, bank.time_limit + 60)
+
+    sweeper.sweep(app_module.STORE, app_module.time_limits, app_module.session_questions)
+
+    assert app_module.SESSION_CACHE.get(code) is None
+    assert client.get(f'/quiz/{code}').status_code == 410
@@ -0,0 +1,65 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def sessions(app_module, bank, fresh_store):
+    """20 completed sessions, two a day from 2026-03-01, scoring 0..19"""
+    codes = app_module.create_sessions(20, bank)
+    rows = []
+    for i, code in enumerate(codes):
+        start = datetime(2026, 3, 1, 9, 0) + timedelta(days=i // 2, hours=i % 2)
+        end = start + timedelta(minutes=20)
+        rows.append((start.isoformat(sep=' ', timespec='microseconds'),
+                     end.isoformat(sep=' ', timespec='microseconds'), i, code))
+    with fresh_store.transaction() as tx:
+        tx.conn.executemany("""
+            UPDATE quiz_sessions SET completed = 1, start_time = ?, end_time = ?, score = ?, total_questions = 25
+            WHERE access_code = ?
+        """, rows)
+    return {i: code for i, code in enumerate(codes)}
+
+
+def test_filters_select_the_right_rows(client, sessions):
+    response = client.get('/admin/export/csv?from=2026-03-03&to=2026-03-07&min_score=6&max_score=11')
+
+    records = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    # Days 3-7 hold scores 4..13; the score range keeps 6..11
+    assert sorted(int(record['score']) for record in records) == list(range(6, 12))
+    assert {record['access_code'] for record in records} == {sessions[i] for i in range(6, 12)}
+    assert all(record['duration_seconds'] == '1200' for record in records)
+
+
+def test_to_datetime_is_exclusive(client, sessions):
+    response = client.get('/admin/export/csv?from=2026-03-01&to=2026-03-02T09:00:00')
+    records = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert {record['access_code'] for record in records} == {sessions[0], sessions[1]}
+
+
+def test_jsonl_has_one_record_per_line(client, sessions):
+    response = client.get('/admin/export/jsonl?min_score=15')
+
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(record['score'] for record in records) == list(range(15, 20))
+    assert all(record['total_questions'] == 25 and record['percentage'] == round(record['score'] / 25 * 100, 1)
+               for record in records)
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'jsonl'])
+def test_gzip_export_decompresses_to_the_plain_export(client, sessions, output_format):
+    plain = client.get(f'/admin/export/{output_format}')
+    packed = client.get(f'/admin/export/{output_format}', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in plain.headers
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(packed.data) == plain.data
+
+
+def test_unknown_format_is_rejected(client):
+    assert client.get('/admin/export/xml').status_code == 404
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+
+def stamp(moment):
+    return moment.isoformat(sep=' ', timespec='microseconds')
+
+
+def completed_sessions(app_module, bank, store, count, finished):
+    """`count` completed sessions; finished(i) gives the i-th one's end_time"""
+    codes = app_module.create_sessions(count, bank)
+    with store.transaction() as tx:
+        tx.conn.executemany("""
+            UPDATE quiz_sessions SET completed = 1, start_time = ?, end_time = ?, score = ?, total_questions = 25
+            WHERE access_code = ?
+        """, [(stamp(finished(i) - timedelta(minutes=30)), stamp(finished(i)), i % 26, code)
+              for i, code in enumerate(codes)])
+    return codes
+
+
+def all_pages(client, query=''):
+    rows, cursor, pages = [], None, 0
+    while pages < 100:
+        url = '/admin/history?format=json&page_size=4' + query + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        rows.extend(page['sessions'])
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            return rows, pages
+
+
+def test_paging_returns_every_row_once_across_equal_timestamps(app_module, client, bank, fresh_store):
+    # Three sessions finish at each moment, so pages end between equal keys
+    base = datetime(2026, 3, 2, 12, 0)
+    codes = completed_sessions(app_module, bank, fresh_store, 30, lambda i: base + timedelta(minutes=i // 3))
+
+    rows, pages = all_pages(client)
+
+    assert pages == 8
+    assert sorted(row['access_code'] for row in rows) == sorted(codes)
+    keys = [(row['finished_at'], row['access_code']) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_paging_keeps_the_filters(app_module, client, bank, fresh_store):
+    base = datetime(2026, 3, 2, 12, 0)
+    completed_sessions(app_module, bank, fresh_store, 30, lambda i: base + timedelta(days=i // 10))
+
+    rows, _ = all_pages(client, '&from=2026-03-03&to=2026-03-03&min_score=12')
+
+    assert sorted(row['score'] for row in rows) == list(range(12, 20))
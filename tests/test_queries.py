@@ -0,0 +1,78 @@
+import psycopg2
+import pytest
+
+from storage import queries
+from storage.queries import Query
+
+LOOKUP = Query('session_by_code', "SELECT 1 FROM quiz_sessions WHERE access_code = %s")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.prepared = set()
+        self.stale_statements = False
+
+
+class FakeCursor:
+    """Records statements; raises the queued errors, one per execute()"""
+
+    def __init__(self):
+        self.connection = FakeConnection()
+        self.statements = []
+        self.errors = []
+
+    def execute(self, sql, params=()):
+        self.statements.append(sql)
+        if self.errors:
+            error = self.errors.pop(0)
+            if error is not None:
+                raise error
+
+
+@pytest.fixture
+def cur(monkeypatch):
+    monkeypatch.setattr(queries, 'DB_PREPARE', True)
+    return FakeCursor()
+
+
+def test_statement_is_prepared_once_per_connection(cur):
+    queries.execute(cur, LOOKUP, ('AB12CD',))
+    queries.execute(cur, LOOKUP, ('EF34GH',))
+
+    assert cur.statements == [
+        "PREPARE session_by_code AS SELECT 1 FROM quiz_sessions WHERE access_code = $1;\n"
+        "EXECUTE session_by_code (%s)",
+        "EXECUTE session_by_code (%s)",
+    ]
+    assert cur.connection.prepared == {'session_by_code'}
+
+
+def test_failed_prepare_is_not_recorded_and_starts_over(cur):
+    cur.errors = [psycopg2.errors.UniqueViolation()]
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        queries.execute(cur, LOOKUP, ('AB12CD',))
+    assert cur.connection.prepared == set() and cur.connection.stale_statements
+
+    queries.execute(cur, LOOKUP, ('AB12CD',))
+
+    assert cur.statements[1:] == ["DEALLOCATE ALL", LOOKUP.prepare_sql + ";\n" + LOOKUP.execute_sql]
+    assert cur.connection.prepared == {'session_by_code'} and not cur.connection.stale_statements
+
+
+def test_dropped_statement_is_prepared_again(cur):
+    queries.execute(cur, LOOKUP, ('AB12CD',))
+    # e.g. a pooler ran DISCARD ALL on the server session
+    cur.errors = [psycopg2.errors.InvalidSqlStatementName()]
+    with pytest.raises(psycopg2.errors.InvalidSqlStatementName):
+        queries.execute(cur, LOOKUP, ('AB12CD',))
+
+    queries.execute(cur, LOOKUP, ('AB12CD',))
+
+    assert cur.statements[2:] == ["DEALLOCATE ALL", LOOKUP.prepare_sql + ";\n" + LOOKUP.execute_sql]
+    assert cur.connection.prepared == {'session_by_code'}
+
+
+def test_plain_statements_without_prepare(cur, monkeypatch):
+    monkeypatch.setattr(queries, 'DB_PREPARE', False)
+    queries.execute(cur, LOOKUP, ('AB12CD',))
+    assert cur.statements == [LOOKUP.sql]
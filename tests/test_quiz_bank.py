@@ -0,0 +1,52 @@
+import gzip
+import json
+
+import pytest
+
+from scoring import PUBLIC_QUESTION_FIELDS
+
+ENCODINGS = {'identity': {}, 'gzip': {'Accept-Encoding': 'gzip'}}
+
+
+def payload(response):
+    body = gzip.decompress(response.data) if response.headers.get('Content-Encoding') == 'gzip' else response.data
+    return json.loads(body)
+
+
+@pytest.mark.parametrize('encoding', sorted(ENCODINGS))
+def test_payload_has_no_answer_keys(client, bank, encoding):
+    response = client.get(f'/quiz_bank/{bank.version}.json', headers=ENCODINGS[encoding])
+
+    assert response.status_code == 200
+    questions = payload(response)['questions']
+    assert [question['id'] for question in questions] == [question.id for question in bank.questions]
+    assert all(set(question) <= set(PUBLIC_QUESTION_FIELDS) for question in questions)
+    assert not any('correct' in question for question in questions)
+
+
+@pytest.mark.parametrize('encoding', sorted(ENCODINGS))
+def test_matching_etag_gets_304_per_encoding(client, bank, encoding):
+    headers = ENCODINGS[encoding]
+    first = client.get(f'/quiz_bank/{bank.version}.json', headers=headers)
+    etag = first.headers['ETag']
+
+    again = client.get(f'/quiz_bank/{bank.version}.json', headers=dict(headers, **{'If-None-Match': etag}))
+
+    assert again.status_code == 304 and not again.data
+    assert again.headers['ETag'] == etag
+    assert 'immutable' in again.headers['Cache-Control']
+
+
+def test_etag_of_the_other_encoding_gets_the_full_body(client, bank):
+    gzip_etag = client.get(f'/quiz_bank/{bank.version}.json', headers=ENCODINGS['gzip']).headers['ETag']
+    plain_etag = client.get(f'/quiz_bank/{bank.version}.json').headers['ETag']
+    assert gzip_etag != plain_etag
+
+    # A cache holding the gzip body must not have it revalidated for a plain client
+    plain = client.get(f'/quiz_bank/{bank.version}.json', headers={'If-None-Match': gzip_etag})
+    assert plain.status_code == 200 and 'Content-Encoding' not in plain.headers
+    assert payload(plain)['version'] == bank.version
+
+
+def test_unknown_version_is_404(client):
+    assert client.get('/quiz_bank/nope.json').status_code == 404
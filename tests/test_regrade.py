@@ -0,0 +1,59 @@
+import copy
+import json
+
+from scoring import compile_bank
+
+
+def answer(client, code, question_id, value):
+    client.post('/submit_answers', json={
+        'access_code': code, 'answers': [{'question_id': question_id, 'answer': value, 'seq': 1}],
+    })
+
+
+def session(store, code):
+    with store.transaction(write=False) as tx:
+        return tx.fetch_session(code)
+
+
+def test_from_version_regrades_against_the_current_bank_and_repins(app_module, client, bank, fresh_store):
+    # The old version had a wrong key for the first question
+    first = bank.questions[0].id
+    data = copy.deepcopy(app_module.REGISTRY.get().data)
+    key = data['questions'][0]['correct']
+    data['questions'][0]['correct'] = (key + 1) % len(data['questions'][0]['options'])
+    old = compile_bank(data)
+    with fresh_store.transaction() as tx:
+        tx.save_bank(old.version, json.dumps(data))
+
+    code, = app_module.create_sessions(1, old)
+    answer(client, code, first, key)
+    assert client.post('/submit_quiz', json={'access_code': code}).get_json()['score'] == 0
+
+    result = app_module.app.test_cli_runner().invoke(args=['regrade', '--from-version', old.version])
+    report = json.loads(result.output.strip().splitlines()[-1])
+
+    assert (report['regraded'], report['changed']) == (1, 1)
+    regraded = session(fresh_store, code)
+    assert regraded['bank_version'] == bank.version and regraded['score'] == 1
+    assert client.get(f'/results/{code}').status_code == 200
+
+
+def test_missing_only_grades_only_sessions_without_results(app_module, client, bank, fresh_store):
+    graded, missing = app_module.create_sessions(2, bank)
+    for code in (graded, missing):
+        answer(client, code, bank.questions[0].id, bank.source[bank.questions[0].id]['correct'])
+    client.post('/submit_quiz', json={'access_code': graded})
+    with fresh_store.transaction() as tx:
+        # A stored score that a full regrade would correct
+        tx.conn.execute("UPDATE quiz_sessions SET score = 7 WHERE access_code = ?", (graded,))
+        # Expired on page load by a release that stored no results
+        tx.conn.execute("UPDATE quiz_sessions SET completed = 1, end_time = start_time WHERE access_code = ?",
+                        (missing,))
+
+    result = app_module.app.test_cli_runner().invoke(args=['regrade', '--missing-only'])
+    report = json.loads(result.output.strip().splitlines()[-1])
+
+    assert report['regraded'] == 1
+    assert session(fresh_store, graded)['score'] == 7
+    backfilled = session(fresh_store, missing)
+    assert backfilled['score'] == 1 and backfilled['results'] is not None
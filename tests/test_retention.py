@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+import retention
+
+
+def test_archive_moves_old_sessions_and_results_still_render(app_module, client, bank, fresh_store):
+    codes = app_module.create_sessions(4, bank)
+    for code in codes:
+        client.post('/submit_answers', json={'access_code': code, 'answers': [
+            {'question_id': bank.questions[0].id, 'answer': 0, 'seq': 1}]})
+        client.post('/submit_quiz', json={'access_code': code})
+    old, recent = codes[:3], codes[3:]
+    with fresh_store.transaction() as tx:
+        tx.conn.executemany("UPDATE quiz_sessions SET created_at = ? WHERE access_code = ?",
+                            [((datetime.now() - timedelta(days=250)).isoformat(sep=' '), code) for code in old])
+    pages = {code: client.get(f'/results/{code}').data for code in codes}
+
+    report = retention.archive(fresh_store, app_module.time_limits, app_module.session_questions, 6, batch_size=2)
+
+    assert report['archived'] == 3 and report['batches'] == 2
+    with fresh_store.transaction(write=False) as tx:
+        live = {row['access_code'] for row in tx.conn.execute("SELECT access_code FROM quiz_sessions")}
+        archived = {row['access_code'] for row in tx.conn.execute("SELECT access_code FROM session_archive")}
+    assert live == set(recent) and archived == set(old)
+    for code in codes:
+        response = client.get(f'/results/{code}')
+        assert response.status_code == 200 and response.data == pages[code]
@@ -0,0 +1,32 @@
+import copy
+import json
+import os
+
+from scoring import compile_bank
+
+BANK_FILE = os.path.join(os.path.dirname(__file__), '..', 'banks', 'accounting.json')
+
+
+def load_bank():
+    with open(BANK_FILE) as f:
+        data = json.load(f)
+    return data, compile_bank(data)
+
+
+def test_bank_questions_graded_with_bank_key():
+    data, bank = load_bank()
+    question = next(q for q in data['questions'] if q.get('type') != 'text_input')
+    result = bank.score(bank.ordered([question['id']]), {str(question['id']): question['correct']})
+    assert result.correct == (True,)
+
+
+def test_stored_copy_graded_with_its_own_key():
+    data, bank = load_bank()
+    question = next(q for q in data['questions'] if q.get('type') != 'text_input')
+    stored = copy.deepcopy(question)
+    stored['correct'] = (question['correct'] + 1) % len(question['options'])
+
+    result = bank.score([stored], {str(stored['id']): stored['correct']})
+    assert result.correct == (True,)
+    result = bank.score([stored], {str(stored['id']): question['correct']})
+    assert result.correct == (False,)
@@ -0,0 +1,23 @@
+import argparse
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('gunicorn')
+pytest.importorskip('gevent')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import bench_slow_clients  # noqa: E402
+
+
+@pytest.mark.slow
+def test_gevent_workers_serve_fast_requests_past_slow_clients(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'quiz.db'))
+    # More trickling clients than a sync worker pool could hold
+    args = argparse.Namespace(slow=20, slow_seconds=5, fast=30, fast_timeout=2.0, workers=2)
+
+    report = bench_slow_clients.run('gevent', args)
+
+    assert report['timeouts'] == 0
+    assert report['p95_ms'] < 500
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+
+def submit(client, code):
+    return client.post('/submit_quiz', json={'access_code': code}).get_json()
+
+
+def answer_all(client, code, bank):
+    client.post('/submit_answers', json={'access_code': code, 'answers': [
+        {'question_id': question.id, 'answer': 0, 'seq': 1} for question in bank.questions
+    ]})
+
+
+def graded_sessions(app_module, bank):
+    with app_module.STORE.transaction(write=False) as tx:
+        return dict(tx.item_stats_versions()).get(bank.version, 0)
+
+
+def test_second_submit_returns_the_stored_score(app_module, client, bank):
+    code, = app_module.create_sessions(1, bank)
+    answer_all(client, code, bank)
+    before = graded_sessions(app_module, bank)
+
+    first = submit(client, code)
+    second = submit(client, code)
+
+    assert first['success'] and not first['already_completed']
+    assert second['success'] and second['already_completed']
+    assert (second['score'], second['total'], second['percentage']) == \
+        (first['score'], first['total'], first['percentage'])
+    assert graded_sessions(app_module, bank) == before + 1
+
+
+def test_submit_after_page_load_expiry_returns_the_expiry_grade(app_module, client, bank):
+    code, = app_module.create_sessions(1, bank)
+    answer_all(client, code, bank)
+    with app_module.STORE.transaction() as tx:
+        tx.conn.execute("UPDATE quiz_sessions SET start_time = ? WHERE access_code = ?",
+                        ((datetime.now() - timedelta(seconds=bank.time_limit + 60)).isoformat(sep=' '), code))
+    app_module.SESSION_CACHE.invalidate(code)
+    before = graded_sessions(app_module, bank)
+
+    assert client.get(f'/quiz/{code}').status_code == 410
+    with app_module.STORE.transaction(write=False) as tx:
+        stored = tx.fetch_session(code)
+    result = submit(client, code)
+
+    assert result['success'] and result['already_completed']
+    assert result['score'] == stored['score'] and result['total'] == stored['total_questions']
+    assert graded_sessions(app_module, bank) == before + 1
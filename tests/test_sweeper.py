@@ -0,0 +1,83 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+import sweeper
+from storage import SQLiteStorage
+from storage.sqlite import SCHEMA
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStorage(str(tmp_path / 'quiz.db'))
+    store._connection().executescript(SCHEMA)
+    return store
+
+
+def test_sessions_expire_on_their_own_banks_time_limit(store):
+    started = datetime.now() - timedelta(minutes=20)
+    with store.transaction() as tx:
+        tx.insert_sessions([
+            ('SHORT1', started, 'short-v1', [1], 1),
+            ('LONG01', started, 'long-v1', [1], 1),
+            ('LEGACY', started, None, [1], 1),
+        ])
+
+    with store.transaction() as tx:
+        claimed = tx.claim_overdue({'short-v1': 600, 'long-v1': 3600}, 900, datetime.now(), 10)
+
+    end_times = {session['access_code']: session['end_time'] for session in claimed}
+    assert set(end_times) == {'SHORT1', 'LEGACY'}
+    assert end_times['SHORT1'] - started == timedelta(seconds=600)
+    assert end_times['LEGACY'] - started == timedelta(seconds=900)
+    with store.transaction(write=False) as tx:
+        assert tx.session_is_open('LONG01')
+        assert tx.fetch_session('SHORT1')['end_time'] == end_times['SHORT1']
+
+
+def overdue_sessions(store, bank, count):
+    started = datetime.now() - timedelta(seconds=bank.time_limit + 60)
+    codes = [f'OVER{i:02d}' for i in range(count)]
+    order = [question.id for question in bank.questions]
+    with store.transaction() as tx:
+        tx.insert_sessions([(code, started, bank.version, order, len(order)) for code in codes])
+        tx.upsert_answers_many([(code, order[0], 0, started, 1) for code in codes])
+    return codes, started
+
+
+def test_overdue_sessions_are_graded_with_stored_results(store, app_module, bank):
+    codes, started = overdue_sessions(store, bank, 3)
+    with store.transaction() as tx:
+        tx.insert_sessions([('FRESH1', datetime.now(), bank.version, [bank.questions[0].id], 1)])
+
+    report = sweeper.sweep(store, app_module.time_limits, app_module.session_questions, batch_size=2)
+
+    assert report['expired'] == 3 and report['batches'] == 2
+    with store.transaction(write=False) as tx:
+        assert tx.session_is_open('FRESH1')
+        answers = tx.fetch_answers_many(codes)
+        for code in codes:
+            session = tx.fetch_session(code)
+            expected = bank.score(bank.ordered(session['question_order']), answers[code])
+            assert session['completed'] and session['results'] is not None
+            assert (session['score'], session['total_questions']) == (expected.score, expected.total)
+            assert session['end_time'] == started + timedelta(seconds=bank.time_limit)
+
+
+def test_concurrent_sweeps_count_each_session_once(store, app_module, bank):
+    codes, _ = overdue_sessions(store, bank, 40)
+    reports = []
+
+    def run():
+        reports.append(sweeper.sweep(store, app_module.time_limits, app_module.session_questions, batch_size=5))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(report['expired'] for report in reports) == len(codes)
+    with store.transaction(write=False) as tx:
+        assert dict(tx.item_stats_versions())[bank.version] == len(codes)